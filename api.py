@@ -0,0 +1,327 @@
+"""Headless ingest and query API over the document services.
+
+Requests are scoped to the tenant named in the X-Tenant-ID header
+(default: "default"). Ingest requests are queued as background jobs
+(tracked in a SQLite job store shared by all workers) and answered
+immediately with a job ID.
+Queries run in the threadpool so the event loop keeps serving other
+clients; /query/stream streams the answer as newline-delimited JSON.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Callable, Dict, Iterator, List, Optional
+
+from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from services.async_database import AsyncDatabaseService
+from services.context_builder import ScoredChunk
+from services.database import DatabaseService
+from services.ingestion import process_single_file, process_url, process_zip
+from services.job_store import JobStore
+from services.llm_service import LLMService
+from services.metrics import MetricsRegistry
+from services.query_service import QueryResult, QueryService
+from services.spooling import SpooledFile
+from services.vector_store import get_vector_store
+from utils.constants import (ALLOWED_EXTENSIONS, CRAWL_MAX_PAGES,
+                             DEFAULT_TENANT, ERROR_MESSAGES,
+                             INGEST_JOB_WORKERS, MAX_FILE_SIZE,
+                             SPOOL_DIRECTORY)
+from utils.validators import validate_query, validate_tenant_id, validate_url
+
+UPLOAD_READ_SIZE = 1024 * 1024
+
+
+class QueryRequest(BaseModel):
+    query: str
+    # Topic for summary queries (defaults to the query's subject)
+    topic: Optional[str] = None
+    # HNSW search breadth for this query (defaults to HNSW_SEARCH_EF)
+    search_ef: Optional[int] = Field(None, ge=1, le=1000)
+
+
+class UrlIngestRequest(BaseModel):
+    url: Optional[str] = None
+    # Resume a checkpointed crawl instead of starting a new one
+    crawl_id: Optional[str] = None
+    # Pages fetched by this run (defaults to CRAWL_MAX_PAGES)
+    max_pages: int = Field(CRAWL_MAX_PAGES, ge=1)
+
+
+def get_database_service() -> Optional[DatabaseService]:
+    # Document metadata and summaries need PostgreSQL; run without it otherwise
+    if "PGDATABASE" not in os.environ:
+        return None
+    try:
+        return DatabaseService()
+    except Exception as e:
+        logging.warning(f"Database unavailable, summaries are disabled: "
+                        f"{str(e)}")
+        return None
+
+
+async def get_async_database_service() -> Optional[AsyncDatabaseService]:
+    try:
+        database = AsyncDatabaseService()
+        await database.open()
+        return database
+    except Exception as e:
+        logging.warning(f"Async database pool unavailable, summary lookups "
+                        f"will use threads: {str(e)}")
+        return None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.vector_store = get_vector_store()
+    app.state.llm_service = LLMService()
+    try:
+        MetricsRegistry().start_exporters()
+    except Exception as e:
+        logging.error(f"Error starting metrics exporters: {str(e)}")
+    # Ingest jobs run in worker threads on the blocking service; request
+    # handlers use the async pool
+    app.state.database = get_database_service()
+    app.state.async_database = await get_async_database_service(
+    ) if app.state.database is not None else None
+    app.state.query_service = QueryService(app.state.vector_store,
+                                           app.state.llm_service,
+                                           app.state.database,
+                                           app.state.async_database)
+    app.state.jobs = JobStore()
+    app.state.jobs.fail_interrupted_jobs()
+    app.state.executor = ThreadPoolExecutor(max_workers=INGEST_JOB_WORKERS,
+                                            thread_name_prefix="ingest")
+    yield
+    app.state.executor.shutdown(wait=False, cancel_futures=True)
+    app.state.jobs.close()
+    if app.state.async_database is not None:
+        await app.state.async_database.close()
+
+
+app = FastAPI(title="Document Processing API", lifespan=lifespan)
+
+
+def _run_job(job_id: str, func: Callable, *args):
+    jobs = app.state.jobs
+    jobs.update_job(job_id, 'running')
+    try:
+        result = func(*args)
+        jobs.update_job(job_id, 'completed', result=result)
+    except Exception as e:
+        logging.error(f"Ingest job {job_id} failed: {str(e)}")
+        jobs.update_job(job_id, 'failed', error=str(e))
+
+
+def _submit_job(tenant_id: str, kind: str, source: str, func: Callable,
+                *args) -> Dict:
+    job_id = app.state.jobs.create_job(kind, source, tenant_id)
+    app.state.executor.submit(_run_job, job_id, func, *args)
+    return {"job_id": job_id, "status": "queued"}
+
+
+def _ingest_upload(path: str, filename: str, tenant_id: str):
+    """Job body for an uploaded file spooled to path"""
+    try:
+        services = (app.state.vector_store, app.state.llm_service,
+                    app.state.database)
+        if filename.lower().endswith('.zip'):
+            with open(path, 'rb') as file:
+                return {"chunks": process_zip(file, *services, tenant_id)}
+        # Parsed from the spool file in place; removed below
+        upload = SpooledFile(path, filename, os.path.getsize(path),
+                             owned=False)
+        return {
+            "chunks": {
+                filename: process_single_file(upload, *services, tenant_id)
+            }
+        }
+    finally:
+        os.remove(path)
+
+
+def _ingest_url(url: Optional[str], crawl_id: Optional[str],
+                tenant_id: str, max_pages: int):
+    """Job body for a website crawl"""
+    return {
+        "crawl_id":
+        process_url(url, app.state.vector_store, app.state.llm_service,
+                    crawl_id, tenant_id, max_pages)
+    }
+
+
+def _serialize_documents(documents: List[ScoredChunk]) -> List[Dict]:
+    return [{
+        "content": result.document.page_content,
+        "metadata": result.document.metadata,
+        "score": result.score
+    } for result in documents]
+
+
+def _serialize_result(result: QueryResult) -> Dict:
+    return {
+        "route": asdict(result.route),
+        "queries": result.queries,
+        "answer": result.answer,
+        "summaries": result.summaries,
+        "documents": _serialize_documents(result.documents),
+    }
+
+
+def _check_tenant(tenant_id: str):
+    is_valid, error_msg = validate_tenant_id(tenant_id)
+    if not is_valid:
+        raise HTTPException(status_code=422, detail=error_msg)
+
+
+def _check_query(request: QueryRequest):
+    is_valid, error_msg = validate_query(request.query)
+    if not is_valid:
+        raise HTTPException(status_code=422, detail=error_msg)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/health/database")
+async def database_health():
+    if app.state.async_database is None:
+        return {"configured": False}
+    return {"configured": True, **await app.state.async_database.health()}
+
+
+@app.post("/ingest/file", status_code=202)
+async def ingest_file(file: UploadFile = File(...),
+                      tenant_id: str = Header(DEFAULT_TENANT,
+                                              alias="X-Tenant-ID")):
+    _check_tenant(tenant_id)
+    filename = os.path.basename(file.filename or "")
+    if filename.lower().split('.')[-1] not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=415,
+                            detail=ERROR_MESSAGES['file_type'])
+
+    # Spool to disk: the upload is closed once this request returns
+    fd, path = tempfile.mkstemp(suffix=f"-{filename}", dir=SPOOL_DIRECTORY)
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            while data := await file.read(UPLOAD_READ_SIZE):
+                size += len(data)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(status_code=413,
+                                        detail=ERROR_MESSAGES['file_size'])
+                spool.write(data)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    kind = 'zip' if filename.lower().endswith('.zip') else 'file'
+    return _submit_job(tenant_id, kind, filename, _ingest_upload, path,
+                       filename, tenant_id)
+
+
+@app.post("/ingest/url", status_code=202)
+async def ingest_url(request: UrlIngestRequest,
+                     tenant_id: str = Header(DEFAULT_TENANT,
+                                             alias="X-Tenant-ID")):
+    _check_tenant(tenant_id)
+    if request.crawl_id is None:
+        is_valid, error_msg = validate_url(request.url or "")
+        if not is_valid:
+            raise HTTPException(status_code=422, detail=error_msg)
+    return _submit_job(tenant_id, 'url', request.url or request.crawl_id,
+                       _ingest_url, request.url, request.crawl_id, tenant_id,
+                       request.max_pages)
+
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 50,
+                    tenant_id: str = Header(DEFAULT_TENANT,
+                                            alias="X-Tenant-ID")):
+    return await run_in_threadpool(app.state.jobs.list_jobs, limit,
+                                   tenant_id)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str,
+                  tenant_id: str = Header(DEFAULT_TENANT,
+                                          alias="X-Tenant-ID")):
+    job = await run_in_threadpool(app.state.jobs.get_job, job_id, tenant_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID")
+    return job
+
+
+@app.get("/tenant")
+async def tenant_stats(tenant_id: str = Header(DEFAULT_TENANT,
+                                               alias="X-Tenant-ID")):
+    _check_tenant(tenant_id)
+    return await run_in_threadpool(app.state.vector_store.tenant_stats,
+                                   tenant_id)
+
+
+@app.delete("/tenant/documents")
+async def clear_tenant(tenant_id: str = Header(DEFAULT_TENANT,
+                                               alias="X-Tenant-ID")):
+    _check_tenant(tenant_id)
+    await run_in_threadpool(app.state.vector_store.clear_data, tenant_id)
+    return {"status": "cleared"}
+
+
+@app.post("/query")
+async def query(request: QueryRequest,
+                tenant_id: str = Header(DEFAULT_TENANT, alias="X-Tenant-ID")):
+    _check_tenant(tenant_id)
+    _check_query(request)
+    result = await app.state.query_service.aanswer(request.query,
+                                                   request.topic, tenant_id,
+                                                   request.search_ef)
+    return _serialize_result(result)
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest,
+                       tenant_id: str = Header(DEFAULT_TENANT,
+                                               alias="X-Tenant-ID")):
+    _check_tenant(tenant_id)
+    _check_query(request)
+    query_service = app.state.query_service
+    route = query_service.route(request.query)
+    summaries = await query_service.afind_summaries(route, request.topic,
+                                                    tenant_id)
+
+    def events() -> Iterator[Dict]:
+        yield {"type": "route", "route": asdict(route)}
+        if summaries:
+            yield {"type": "summaries", "summaries": summaries}
+            return
+        yield from query_service.stream_retrieved_answer(
+            request.query, route, tenant_id, request.search_ef)
+
+    def lines() -> Iterator[str]:
+        # Sync generators are iterated in the threadpool by Starlette
+        try:
+            for event in events():
+                if event["type"] == "sources":
+                    event = {
+                        **event, "documents":
+                        _serialize_documents(event["documents"])
+                    }
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            logging.error(f"Streaming query failed: {str(e)}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,167 @@
+"""Recall@k vs latency calibration for the HNSW index parameters.
+
+Run from the repository root, with the same environment as the app:
+
+    python -m benchmarks.ann_calibration --tenant default --sample 20000
+
+Embeddings are sampled from the tenant's live index (VECTOR_BACKEND) and
+a few are held out as queries. Exact search over the sample gives the
+ground truth; an HNSW index is then built for every (M, construction ef)
+pair in the grid and queried at every search ef, reporting recall@k,
+per-query latency and build time. The recommendation is the fastest
+setting that reaches --target-recall, to be set as HNSW_M,
+HNSW_CONSTRUCTION_EF and HNSW_SEARCH_EF. Pass --embeddings path.npy to
+calibrate on a saved (N, dim) array instead.
+"""
+import argparse
+import json
+import os
+import time
+
+import hnswlib
+import numpy as np
+
+from utils.constants import (CONTEXT_CANDIDATES, DEFAULT_TENANT,
+                             HNSW_CONSTRUCTION_EF, HNSW_M, HNSW_SEARCH_EF)
+
+# Chroma's defaults, used when the configuration leaves them unset
+DEFAULT_M = 16
+DEFAULT_CONSTRUCTION_EF = 100
+DEFAULT_SEARCH_EF = 10
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> list:
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def recall(found: list, truth: list) -> float:
+    return float(np.mean([len(f & t) / len(t) for f, t in zip(found, truth)]))
+
+
+def build_index(corpus: np.ndarray, m: int,
+                construction_ef: int) -> hnswlib.Index:
+    # Unit vectors rank the same under l2 and cosine; l2 is Chroma's space
+    index = hnswlib.Index(space="l2", dim=corpus.shape[1])
+    index.init_index(max_elements=len(corpus),
+                     ef_construction=construction_ef,
+                     M=m)
+    index.add_items(corpus, np.arange(len(corpus)), num_threads=-1)
+    return index
+
+
+def evaluate(index: hnswlib.Index, queries: np.ndarray, truth: list,
+             k: int, search_ef: int) -> dict:
+    index.set_ef(search_ef)
+    index.set_num_threads(1)
+    found = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        labels, _ = index.knn_query(query, k=k)
+        latencies.append(time.perf_counter() - start)
+        found.append(set(labels[0]))
+    return {
+        "search_ef": search_ef,
+        "recall": round(recall(found, truth), 4),
+        "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "query_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+    }
+
+
+def load_sample(args) -> np.ndarray:
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype(np.float32)
+        rng = np.random.default_rng(args.seed)
+        if len(vectors) > args.sample:
+            vectors = vectors[rng.choice(len(vectors), args.sample,
+                                         replace=False)]
+        return vectors
+    from services.vector_store import get_vector_store
+    return get_vector_store().sample_embeddings(args.tenant, args.sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--embeddings", help="(N, dim) .npy file to use")
+    parser.add_argument("--sample", type=int, default=50000,
+                        help="embeddings sampled from the index")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="sampled embeddings held out as queries")
+    parser.add_argument("--k", type=int, default=CONTEXT_CANDIDATES)
+    parser.add_argument("--m", type=int, nargs="*", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="*",
+                        default=[64, 100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="*",
+                        default=[10, 20, 40, 80, 160, 320])
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = normalize(load_sample(args))
+    if len(vectors) <= args.queries + args.k:
+        raise SystemExit(f"Only {len(vectors)} embeddings in the sample; "
+                         f"need more than {args.queries + args.k}")
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_top_k(corpus, queries, args.k)
+
+    current = (HNSW_M or DEFAULT_M,
+               HNSW_CONSTRUCTION_EF or DEFAULT_CONSTRUCTION_EF,
+               HNSW_SEARCH_EF or DEFAULT_SEARCH_EF)
+    # hnswlib searches with max(ef, k)
+    search_efs = sorted(
+        {max(ef, args.k)
+         for ef in args.search_ef + [current[2]]})
+
+    results = []
+    for m in sorted(set(args.m + [current[0]])):
+        for construction_ef in sorted(
+                set(args.construction_ef + [current[1]])):
+            start = time.perf_counter()
+            index = build_index(corpus, m, construction_ef)
+            build_seconds = round(time.perf_counter() - start, 2)
+            for search_ef in search_efs:
+                row = {
+                    "m": m,
+                    "construction_ef": construction_ef,
+                    "build_seconds": build_seconds,
+                    **evaluate(index, queries, truth, args.k, search_ef),
+                }
+                row["current"] = (m, construction_ef) == current[:2] and \
+                    search_ef == max(current[2], args.k)
+                results.append(row)
+                print(json.dumps(row), flush=True)
+
+    meeting = [row for row in results if row["recall"] >= args.target_recall]
+    recommended = min(meeting,
+                      key=lambda row: (row["query_p50_ms"],
+                                       row["build_seconds"]),
+                      default=None)
+    print(
+        json.dumps(
+            {
+                "benchmark": "ann_calibration",
+                "source": args.embeddings or
+                f"{os.environ.get('VECTOR_BACKEND', 'chroma')}:{args.tenant}",
+                "vectors": len(corpus),
+                "queries": len(queries),
+                "dimension": corpus.shape[1],
+                "k": args.k,
+                "target_recall": args.target_recall,
+                "current": next(
+                    (row for row in results if row["current"]), None),
+                "recommended": recommended,
+            },
+            indent=2))
+
+
+if __name__ == "__main__":
+    main()
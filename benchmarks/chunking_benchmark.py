@@ -0,0 +1,88 @@
+"""Chunking throughput benchmark.
+
+Run from the repository root:
+
+    python -m benchmarks.chunking_benchmark --sizes 1 4 16
+"""
+import argparse
+import json
+import random
+import time
+
+from services.chunking import PAGE_BREAK, TextChunker
+from utils.constants import PARALLEL_CHUNK_THRESHOLD
+
+WORDS = ("data", "system", "vector", "query", "document", "process", "model",
+         "index", "result", "search", "token", "page", "report", "value",
+         "customer", "product", "agent", "context", "summary", "table")
+
+
+def make_document(size_mb: float, seed: int = 0) -> str:
+    """Build a synthetic document mixing headings, paragraphs, tables and pages"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    length = 0
+    section = 0
+    while length < target:
+        section += 1
+        block = [f"## Section {section}"]
+        for _ in range(rng.randint(2, 6)):
+            sentences = [
+                " ".join(rng.choice(WORDS)
+                         for _ in range(rng.randint(6, 18))).capitalize() + "."
+                for _ in range(rng.randint(2, 8))
+            ]
+            block.append(" ".join(sentences))
+        if section % 3 == 0:
+            block.append("| id | name | value |")
+            block.extend(f"| {i} | {rng.choice(WORDS)} | {rng.random():.4f} |"
+                         for i in range(rng.randint(5, 30)))
+        text = "\n\n".join(block)
+        if section % 5 == 0:
+            text += PAGE_BREAK
+        parts.append(text)
+        length += len(text) + 2
+    return "\n\n".join(parts)
+
+
+def run(size_mb: float, max_workers: int, repeat: int) -> dict:
+    text = make_document(size_mb)
+    chunker = TextChunker(max_workers=max_workers)
+    # Warm up tokenizer caches (and the process pool when parallel)
+    chunker.split_text(text[:PARALLEL_CHUNK_THRESHOLD] * 2)
+    timings = []
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = chunker.split_text(text)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "size_mb": size_mb,
+        "workers": max_workers,
+        "chunks": len(chunks),
+        "seconds": round(best, 4),
+        "mb_per_sec": round(size_mb / best, 3),
+        "chunks_per_sec": round(len(chunks) / best, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16],
+                        help="document sizes in MB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4],
+                        help="process pool sizes to compare (1 = in-process)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = [
+        run(size, workers, args.repeat) for size in args.sizes
+        for workers in args.workers
+    ]
+    print(json.dumps({"benchmark": "chunking", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
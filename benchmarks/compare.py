@@ -0,0 +1,63 @@
+"""Compare two benchmark reports and flag regressions.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.1
+
+Metrics ending in _per_sec are better when higher; latency, memory and
+the other numeric metrics are better when lower. Exits with status 1 if
+any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+# Counts describe the workload rather than its performance
+IGNORED_METRICS = ("ingest_docs", "ingest_batch_docs", "crawl_pages",
+                   "queries")
+
+
+def higher_is_better(name: str) -> bool:
+    return name.endswith("_per_sec")
+
+
+def compare(base: Dict, head: Dict,
+            threshold: float) -> List[Tuple[str, float, float, float, bool]]:
+    rows = []
+    for name, base_value in base.items():
+        head_value = head.get(name)
+        if name in IGNORED_METRICS or \
+                not isinstance(base_value, (int, float)) or \
+                not isinstance(head_value, (int, float)) or base_value == 0:
+            continue
+        change = (head_value - base_value) / abs(base_value)
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, base_value, head_value, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    rows = compare(base["metrics"], head["metrics"], args.threshold)
+    print(f"{'metric':<24}{'base':>12}{'head':>12}{'change':>10}")
+    for name, base_value, head_value, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<24}{base_value:>12}{head_value:>12}"
+              f"{change:>+10.1%}{flag}")
+    if base.get("config") != head.get("config"):
+        print("warning: reports were produced with different settings")
+    sys.exit(1 if any(row[4] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Offline end-to-end benchmark: ingest, crawl and query.
+
+OpenAI is replaced by deterministic fakes (benchmarks.fakes) and the
+crawl targets a local synthetic site (benchmarks.site), so results are
+comparable across commits. Without network access tiktoken's
+cl100k_base file must already be cached (see TIKTOKEN_CACHE_DIR).
+Run from the repository root:
+
+    python -m benchmarks.end_to_end --output head.json
+    python -m benchmarks.compare base.json head.json
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+# bench_ingest_batch ingests the same files again; a tenant of its own
+# keeps the ingest registry from skipping them as already indexed
+BATCH_TENANT = "benchmark-batch"
+
+QUERY_FORMS = (
+    "What does the {a} say about the {b}?",
+    "{a} {b}",
+    "Compare the {a} and the {b} results",
+    "How did the {a} {b} change over time, and why?",
+    "Give me a summary of the {a} documents",
+)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def bench_ingest(paths: List[str], vector_store, llm_service) -> Dict:
+    from services.ingestion import process_single_file
+
+    per_type = defaultdict(list)
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            file = io.BytesIO(f.read())
+        file.name = os.path.basename(path)
+        file_start = time.perf_counter()
+        process_single_file(file, vector_store, llm_service)
+        per_type[path.rsplit(".", 1)[-1]].append(time.perf_counter() -
+                                                 file_start)
+    elapsed = time.perf_counter() - start
+    return {
+        "ingest_docs": len(paths),
+        "ingest_docs_per_sec": round(len(paths) / elapsed, 3),
+        "ingest_seconds_by_type": {
+            file_type: round(sum(times) / len(times), 4)
+            for file_type, times in sorted(per_type.items())
+        },
+    }
+
+
+def bench_ingest_batch(paths: List[str], vector_store, llm_service) -> Dict:
+    """All files through one pipeline, so the stages overlap"""
+    from services.ingest_pipeline import IngestPipeline
+
+    start = time.perf_counter()
+    with IngestPipeline(vector_store, llm_service) as pipeline:
+        for path in paths:
+            with open(path, "rb") as f:
+                file = io.BytesIO(f.read())
+            file.name = os.path.basename(path)
+            pipeline.submit_file(file, BATCH_TENANT)
+    elapsed = time.perf_counter() - start
+    ingested = [source for source in pipeline.sources if not source.duplicate]
+    return {
+        "ingest_batch_docs": len(ingested),
+        "ingest_batch_docs_per_sec": round(len(ingested) / elapsed, 3),
+        "ingest_stages": pipeline.stats(),
+    }
+
+
+def bench_crawl(pages: int, workdir: str, vector_store, llm_service) -> Dict:
+    from benchmarks.site import SyntheticSite
+    from services.crawl_state import CrawlStateStore
+    from services.web_scraper import WebScraperService
+
+    with SyntheticSite(pages) as site:
+        scraper = WebScraperService(max_pages=pages,
+                                    rate_limit=0,
+                                    state_store=CrawlStateStore(
+                                        os.path.join(workdir, "crawl.db")))
+        start = time.perf_counter()
+        crawled = scraper.crawl_website(site.url, vector_store, llm_service)
+        elapsed = time.perf_counter() - start
+    return {
+        "crawl_pages": len(crawled),
+        "crawl_pages_per_sec": round(len(crawled) / elapsed, 3),
+    }
+
+
+def bench_query(count: int, vector_store, llm_service) -> Dict:
+    from benchmarks.chunking_benchmark import WORDS
+    from utils.constants import CONTEXT_CANDIDATES
+
+    rng = random.Random(0)
+    queries = [
+        rng.choice(QUERY_FORMS).format(a=rng.choice(WORDS),
+                                       b=rng.choice(WORDS))
+        for _ in range(count)
+    ]
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        route = llm_service.query_router.route(query)
+        queries_string = llm_service.create_similar_queries(
+            query) if route.expand else query
+        results = vector_store.search_with_scores(queries_string,
+                                                  top_k=CONTEXT_CANDIDATES)
+        llm_service.pass_vector_results_as_context(results, query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "queries": count,
+        "query_p50_ms": round(percentile(latencies, 0.50), 3),
+        "query_p95_ms": round(percentile(latencies, 0.95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files-per-type", type=int, default=2)
+    parser.add_argument("--scale", type=int, default=1,
+                        help="fixture size multiplier")
+    parser.add_argument("--pages", type=int, default=100,
+                        help="pages in the synthetic site")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--embedding-latency", type=float, default=0.0,
+                        help="simulated seconds per embedding call")
+    parser.add_argument("--chat-latency", type=float, default=0.0,
+                        help="simulated seconds per chat call")
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the temporary working directory")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    # Service configuration is read from the environment at import time,
+    # so point stores at a scratch directory before importing services
+    workdir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(workdir, "chroma")
+    os.environ["CRAWL_STATE_PATH"] = os.path.join(workdir, "crawl_state.db")
+    os.environ["INGEST_REGISTRY_PATH"] = os.path.join(workdir, "ingested.db")
+
+    from benchmarks import fakes
+    from benchmarks.fixtures import build_corpus
+    fakes.install(args.embedding_latency, args.chat_latency)
+    from services.llm_service import LLMService
+    from services.vector_store import get_vector_store
+
+    try:
+        vector_store = get_vector_store()
+        llm_service = LLMService()
+        paths = build_corpus(os.path.join(workdir, "corpus"),
+                             args.files_per_type, args.scale)
+
+        metrics = {}
+        metrics.update(bench_ingest(paths, vector_store, llm_service))
+        metrics.update(bench_ingest_batch(paths, vector_store, llm_service))
+        metrics.update(
+            bench_crawl(args.pages, workdir, vector_store, llm_service))
+        metrics.update(bench_query(args.queries, vector_store, llm_service))
+        metrics["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "end_to_end",
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "keep")
+        },
+        "metrics": metrics,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Deterministic offline stand-ins for the OpenAI chat and embedding models.
+
+install() patches them into services.llm_service and services.vector_store,
+so LLMService and VectorStoreService run unchanged without network access.
+"""
+import hashlib
+import os
+import re
+import time
+from typing import Iterator, List, Optional
+from unittest import mock
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+DEFAULT_DIMENSIONS = 1536
+
+
+class FakeEmbeddings(Embeddings):
+    """Signed feature hashing of words into a unit vector
+
+    Texts sharing words get similar vectors, so retrieval behaves
+    plausibly. latency simulates the API round trip per call.
+    """
+    latency = 0.0
+
+    def __init__(self, dimensions: Optional[int] = None, **kwargs):
+        self.dimensions = dimensions or DEFAULT_DIMENSIONS
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"),
+                                     digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeChatModel:
+    """Echoes the last words of the prompt, with token usage metadata"""
+    latency = 0.0
+    output_words = 60
+
+    def __init__(self, **kwargs):
+        self.model = kwargs.get("model")
+
+    def invoke(self, llm_input, config=None) -> AIMessage:
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = llm_input if isinstance(llm_input, str) else str(llm_input)
+        words = prompt.split()
+        content = " ".join(words[-self.output_words:])
+        return AIMessage(content=content,
+                         usage_metadata={
+                             "input_tokens": len(words),
+                             "output_tokens": min(len(words),
+                                                  self.output_words),
+                             "total_tokens": len(words) +
+                             min(len(words), self.output_words),
+                         })
+
+    def stream(self, llm_input, config=None) -> Iterator[AIMessageChunk]:
+        message = self.invoke(llm_input, config)
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            yield AIMessageChunk(content=word if i == 0 else " " + word)
+        yield AIMessageChunk(content="",
+                             usage_metadata=message.usage_metadata)
+
+
+def install(embedding_latency: float = 0.0,
+            chat_latency: float = 0.0) -> List:
+    """Patch the fakes in; returns the started patchers"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    FakeEmbeddings.latency = embedding_latency
+    FakeChatModel.latency = chat_latency
+    patchers = [
+        mock.patch("services.llm_service.ChatOpenAI", FakeChatModel),
+        mock.patch("services.vector_store.OpenAIEmbeddings", FakeEmbeddings),
+    ]
+    for patcher in patchers:
+        patcher.start()
+    return patchers
@@ -0,0 +1,163 @@
+"""Synthetic fixture corpora, one generator per FileHandlerFactory type."""
+import csv
+import io
+import json
+import os
+import random
+from typing import Callable, Dict, List
+from xml.sax.saxutils import escape
+
+import docx
+import fitz  # PyMuPDF
+from PIL import Image
+
+from benchmarks.chunking_benchmark import WORDS
+from services.file_handler import FileHandlerFactory
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS)
+                    for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+
+def paragraphs(rng: random.Random, count: int) -> List[str]:
+    return [
+        " ".join(sentence(rng) for _ in range(rng.randint(3, 8)))
+        for _ in range(count)
+    ]
+
+
+def _records(rng: random.Random, count: int) -> List[Dict]:
+    return [{
+        "id": i,
+        "name": rng.choice(WORDS),
+        "category": rng.choice(WORDS),
+        "value": round(rng.random() * 1000, 2),
+        "notes": sentence(rng),
+    } for i in range(count)]
+
+
+def write_txt(path: str, rng: random.Random, scale: int):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs(rng, 20 * scale)))
+
+
+def write_md(path: str, rng: random.Random, scale: int):
+    sections = []
+    for section in range(4 * scale):
+        sections.append(f"## Section {section + 1}")
+        sections.extend(paragraphs(rng, 5))
+        sections.append("- " + "\n- ".join(sentence(rng) for _ in range(4)))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(sections))
+
+
+def write_html(path: str, rng: random.Random, scale: int):
+    body = "".join(f"<h2>Section {i + 1}</h2><p>{escape(text)}</p>"
+                   for i, text in enumerate(paragraphs(rng, 20 * scale)))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<html><head><title>Fixture</title>"
+                f"<script>var x = 1;</script></head>"
+                f"<body><nav>Home | About</nav>{body}</body></html>")
+
+
+def write_rtf(path: str, rng: random.Random, scale: int):
+    body = "\\par\n".join(paragraphs(rng, 20 * scale))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\\rtf1\\ansi{\\fonttbl\\f0\\fswiss Helvetica;}\\f0\\pard\n"
+                f"{body}\\par\n}}")
+
+
+def write_json(path: str, rng: random.Random, scale: int):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"records": _records(rng, 200 * scale)}, f)
+
+
+def write_xml(path: str, rng: random.Random, scale: int):
+    items = "".join(
+        "<record>" + "".join(f"<{key}>{escape(str(value))}</{key}>"
+                             for key, value in record.items()) + "</record>"
+        for record in _records(rng, 200 * scale))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<?xml version='1.0'?><records>{items}</records>")
+
+
+def write_csv(path: str, rng: random.Random, scale: int):
+    records = _records(rng, 500 * scale)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def write_pdf(path: str, rng: random.Random, scale: int):
+    pdf = fitz.open()
+    for _ in range(5 * scale):
+        page = pdf.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800),
+                            "\n\n".join(paragraphs(rng, 4)),
+                            fontsize=10)
+    pdf.save(path)
+    pdf.close()
+
+
+def write_docx(path: str, rng: random.Random, scale: int):
+    document = docx.Document()
+    for section in range(4 * scale):
+        document.add_heading(f"Section {section + 1}", level=2)
+        for text in paragraphs(rng, 5):
+            document.add_paragraph(text)
+    document.save(path)
+
+
+def _write_image(path: str, rng: random.Random, image_format: str):
+    image = Image.new("RGB", (256, 256),
+                      tuple(rng.randint(0, 255) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+
+
+def write_png(path: str, rng: random.Random, scale: int):
+    _write_image(path, rng, "PNG")
+
+
+def write_jpeg(path: str, rng: random.Random, scale: int):
+    _write_image(path, rng, "JPEG")
+
+
+WRITERS: Dict[str, Callable[[str, random.Random, int], None]] = {
+    "txt": write_txt,
+    "md": write_md,
+    "html": write_html,
+    "htm": write_html,
+    "rtf": write_rtf,
+    "json": write_json,
+    "xml": write_xml,
+    "csv": write_csv,
+    "pdf": write_pdf,
+    "docx": write_docx,
+    "png": write_png,
+    "jpg": write_jpeg,
+    "jpeg": write_jpeg,
+}
+
+
+def build_corpus(directory: str,
+                 files_per_type: int = 2,
+                 scale: int = 1,
+                 seed: int = 0) -> List[str]:
+    """Write fixtures for every supported file type; returns their paths"""
+    missing = set(FileHandlerFactory._handlers) - set(WRITERS)
+    if missing:
+        raise ValueError(f"No fixture writer for: {', '.join(sorted(missing))}")
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for file_type in sorted(FileHandlerFactory._handlers):
+        for index in range(files_per_type):
+            path = os.path.join(directory, f"fixture_{index}.{file_type}")
+            WRITERS[file_type](path, rng, scale)
+            paths.append(path)
+    return paths
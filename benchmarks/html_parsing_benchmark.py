@@ -0,0 +1,129 @@
+"""HTML parsing benchmark: legacy BeautifulSoup passes vs the shared lxml layer.
+
+Run from the repository root over a directory of saved pages:
+
+    python -m benchmarks.html_parsing_benchmark --pages path/to/pages
+
+Without --pages a synthetic corpus is generated.
+"""
+import argparse
+import json
+import random
+import re
+import time
+from pathlib import Path
+from typing import List
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from services.html_extraction import PAGE_REMOVED_TAGS, parse_html
+
+WORDS = ("crawler", "parser", "content", "article", "vector", "search",
+         "product", "customer", "pricing", "feature", "release", "support")
+
+
+def make_page(index: int, rng: random.Random) -> str:
+    paragraphs = "\n".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 60)))}</p>"
+        for _ in range(rng.randint(10, 60)))
+    links = "\n".join(f'<li><a href="/page/{rng.randint(0, 10000)}">link</a></li>'
+                      for _ in range(rng.randint(20, 150)))
+    return f"""<!DOCTYPE html><html><head><title>Page {index}</title>
+<meta name="description" content="Synthetic page {index}">
+<style>body {{ color: red; }}</style><script>var x = {index};</script></head>
+<body><nav><ul>{links}</ul></nav>
+<main><h1>Heading {index}</h1>{paragraphs}</main>
+<footer><p>Footer text for page {index}</p></footer></body></html>"""
+
+
+def load_pages(directory: str) -> List[str]:
+    return [
+        path.read_text(encoding="utf-8", errors="ignore")
+        for path in sorted(Path(directory).rglob("*.htm*"))
+    ]
+
+
+def legacy_scrape(html: str, url: str) -> dict:
+    """The pre-lxml scrape_url parsing path, kept for comparison"""
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(list(PAGE_REMOVED_TAGS)):
+        element.decompose()
+    main_content = soup.find("main") or soup.find("article") or soup.find(
+        "div", class_=re.compile(r"content|main|article"))
+    scope = main_content or soup
+    content = [
+        p.get_text()
+        for p in scope.find_all(["p", "h1", "h2", "h3", "h4", "h5", "h6"])
+    ]
+    links = {urljoin(url, a["href"]) for a in soup.find_all("a", href=True)}
+    title_tag = soup.find("title")
+    description_tag = soup.find("meta", attrs={"name": "description"})
+    return {
+        "content": content,
+        "links": links,
+        "title": title_tag.text.strip() if title_tag else "",
+        "description": description_tag.get("content", "")
+        if description_tag else "",
+    }
+
+
+def shared_scrape(html: str, url: str) -> dict:
+    page = parse_html(html,
+                      base_url=url,
+                      remove_tags=PAGE_REMOVED_TAGS,
+                      collect_text=False)
+    return {
+        "content": page.blocks,
+        "links": set(page.links),
+        "title": page.title,
+        "description": page.description,
+    }
+
+
+def time_parser(parser, pages: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            parser(page, "https://example.com/")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", help="directory of saved .html pages")
+    parser.add_argument("--synthetic", type=int, default=200,
+                        help="number of synthetic pages without --pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = load_pages(args.pages)
+    else:
+        rng = random.Random(0)
+        pages = [make_page(i, rng) for i in range(args.synthetic)]
+    total_mb = sum(len(page.encode("utf-8")) for page in pages) / 1024 / 1024
+
+    results = {}
+    for name, func in (("bs4_html_parser", legacy_scrape),
+                       ("lxml_single_pass", shared_scrape)):
+        seconds = time_parser(func, pages, args.repeat)
+        results[name] = {
+            "seconds": round(seconds, 4),
+            "pages_per_sec": round(len(pages) / seconds, 1),
+            "mb_per_sec": round(total_mb / seconds, 3),
+        }
+    results["speedup"] = round(results["bs4_html_parser"]["seconds"] /
+                               results["lxml_single_pass"]["seconds"], 2)
+    print(json.dumps({
+        "benchmark": "html_parsing",
+        "pages": len(pages),
+        "corpus_mb": round(total_mb, 3),
+        "results": results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Recall vs memory benchmark for embedding storage precision.
+
+Run from the repository root:
+
+    python -m benchmarks.quantization_benchmark --vectors 100000
+
+Pass --embeddings path.npy (an (N, dim) float32 array of real embeddings)
+for representative numbers; synthetic clustered vectors are used
+otherwise. Dimension truncation is only meaningful for real
+text-embedding-3 vectors, which are trained to be truncated.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services.quantization import QuantizedIndex
+from utils.constants import QUANTIZED_RESCORE_FACTOR
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around a few hundred cluster centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, count // 500), dimension))
+    labels = rng.integers(0, len(centres), count)
+    noise = rng.standard_normal((count, dimension)) * 0.6
+    return normalize(centres[labels] + noise).astype(np.float32)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> list:
+    scores = queries @ corpus.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def recall(found: list, truth: list) -> float:
+    return float(np.mean([len(f & t) / len(t) for f, t in zip(found, truth)]))
+
+
+def evaluate_truncation(corpus, queries, truth, dimension, k):
+    reduced = normalize(corpus[:, :dimension])
+    reduced_queries = normalize(queries[:, :dimension])
+    start = time.perf_counter()
+    scores = reduced_queries @ reduced.T
+    found = [set(np.argsort(-row)[:k]) for row in scores]
+    elapsed = time.perf_counter() - start
+    return {
+        "method": f"float32@{dimension}",
+        "bytes_per_vector": dimension * 4,
+        "recall": round(recall(found, truth), 4),
+        "query_ms": round(elapsed / len(queries) * 1000, 3),
+    }
+
+
+def evaluate_quantized(corpus, queries, truth, method, k, rescore_factor):
+    with tempfile.TemporaryDirectory() as directory:
+        index = QuantizedIndex(method, os.path.join(directory, "index.npz"),
+                               corpus.shape[1])
+        index.add([str(i) for i in range(len(corpus))], corpus)
+        found = []
+        start = time.perf_counter()
+        for query in queries:
+            found.append({
+                int(chunk_id)
+                for chunk_id, _, _ in index.search(query, k, rescore_factor)
+            })
+        elapsed = time.perf_counter() - start
+        memory_bytes = index.memory_bytes
+        index.delete()
+    label = method if rescore_factor <= 1 else \
+        f"{method}+rescore x{rescore_factor}"
+    return {
+        "method": label,
+        "bytes_per_vector": round(memory_bytes / len(corpus), 2),
+        "recall": round(recall(found, truth), 4),
+        "query_ms": round(elapsed / len(queries) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--embeddings", help="(N, dim) .npy file to use")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", type=int, nargs="*",
+                        default=[512, 256],
+                        help="truncated dimensions to compare")
+    parser.add_argument("--rescore-factor", type=int,
+                        default=QUANTIZED_RESCORE_FACTOR)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = normalize(np.load(args.embeddings).astype(np.float32))
+    else:
+        vectors = make_vectors(args.vectors + args.queries, args.dimension)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_top_k(corpus, queries, args.k)
+
+    results = [
+        evaluate_truncation(corpus, queries, truth, corpus.shape[1], args.k)
+    ]
+    results.extend(
+        evaluate_truncation(corpus, queries, truth, dimension, args.k)
+        for dimension in args.dimensions if dimension < corpus.shape[1])
+    for method in ("int8", "binary"):
+        results.append(
+            evaluate_quantized(corpus, queries, truth, method, args.k, 1))
+        results.append(
+            evaluate_quantized(corpus, queries, truth, method, args.k,
+                               args.rescore_factor))
+    print(
+        json.dumps(
+            {
+                "benchmark": "quantization",
+                "vectors": len(corpus),
+                "dimension": corpus.shape[1],
+                "k": args.k,
+                "results": results
+            },
+            indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Local synthetic website for crawl benchmarks.
+
+Serves linked pages, a robots.txt (with a disallowed section and a
+Sitemap line) and a sitemap.xml covering part of the site, from a
+ThreadingHTTPServer on a free localhost port. Pages and the sitemap also
+link to a URL with a malformed port, which crawlers must skip.
+"""
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+from benchmarks.fixtures import paragraphs
+
+LINKS_PER_PAGE = 5
+
+
+class SyntheticSite:
+
+    def __init__(self, pages: int = 200, seed: int = 0):
+        self.pages = pages
+        self.seed = seed
+        self._server = None
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def render_page(self, number: int) -> str:
+        rng = random.Random(self.seed * 100003 + number)
+        # The next-page link keeps every page reachable from the start page
+        links = [(number + 1) % self.pages] + \
+            [rng.randrange(self.pages) for _ in range(LINKS_PER_PAGE - 1)]
+        anchors = "".join(f'<a href="/page/{link}?utm_source=bench">'
+                          f'Page {link}</a> ' for link in links)
+        anchors += f'<a href="/private/{number}">Private</a> '
+        # Crawlers must skip links they cannot parse
+        anchors += f'<a href="http://{self.host}:abc/page/{number}">Broken</a>'
+        body = "".join(f"<p>{escape(text)}</p>"
+                       for text in paragraphs(rng, 5))
+        return (f"<html><head><title>Page {number}</title>"
+                f'<meta name="description" content="Synthetic page {number}">'
+                f"</head><body><nav><a href=\"/\">Home</a></nav><main>"
+                f"<h1>Page {number}</h1>{body}<p>Related: {anchors}</p></main>"
+                f"<footer>Footer text</footer></body></html>")
+
+    def render_robots(self) -> str:
+        return (f"User-agent: *\nDisallow: /private/\n"
+                f"Sitemap: {self.url}sitemap.xml\n")
+
+    def render_sitemap(self) -> str:
+        entries = "".join(
+            f"<url><loc>{self.url}page/{number}</loc>"
+            f"<priority>{0.9 if number % 10 == 0 else 0.5}</priority>"
+            f"<lastmod>2024-01-{number % 28 + 1:02d}</lastmod></url>"
+            for number in range(0, self.pages, 2))
+        entries += f"<url><loc>http://{self.host}:abc/</loc></url>"
+        return ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns='
+                f'"http://www.sitemaps.org/schemas/sitemap/0.9">{entries}'
+                "</urlset>")
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                content_type = "text/html; charset=utf-8"
+                if path in ("/", "/page/0"):
+                    body = site.render_page(0)
+                elif path == "/robots.txt":
+                    body = site.render_robots()
+                    content_type = "text/plain"
+                elif path == "/sitemap.xml":
+                    body = site.render_sitemap()
+                    content_type = "application/xml"
+                elif path.startswith("/page/") and \
+                        path[6:].isdigit() and int(path[6:]) < site.pages:
+                    body = site.render_page(int(path[6:]))
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> 'SyntheticSite':
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
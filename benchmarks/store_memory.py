@@ -0,0 +1,143 @@
+"""Resident memory per chunk of a Chroma tenant, by EMBEDDING_QUANTIZATION.
+
+For each method, one process writes --chunks random unit vectors into a
+fresh store; a second process opens it, runs a few searches and reports
+how much its resident memory grew, divided by the chunk count. A
+one-chunk tenant is searched first, so library loading is not counted.
+Anonymous memory (heap, loaded indexes) is reported apart from pages of
+memory-mapped files, which the kernel can reclaim. Run from the
+repository root:
+
+    python -m benchmarks.store_memory --chunks 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+METHODS = ("none", "int8", "binary")
+
+
+WARMUP_TENANT = "warmup"
+
+
+def resident_bytes() -> dict:
+    """Anonymous and file-backed resident memory (Linux)"""
+    resident = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                resident[key] = int(value.split()[0]) * 1024
+    return resident
+
+
+def build(chunks: int, batch_size: int = 1000):
+    from langchain_core.documents import Document
+
+    from benchmarks.quantization_benchmark import make_vectors
+    from services.vector_store import VectorStoreService
+    from utils.constants import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL_DIMENSIONS
+
+    store = VectorStoreService()
+    dimensions = EMBEDDING_DIMENSIONS or EMBEDDING_MODEL_DIMENSIONS
+    store.write_embedded([Document(page_content="warmup",
+                                   metadata={"chunk_index": 0})],
+                         make_vectors(1, dimensions).tolist(),
+                         tenant_id=WARMUP_TENANT)
+    store.persist(WARMUP_TENANT)
+    for start in range(0, chunks, batch_size):
+        count = min(batch_size, chunks - start)
+        store.write_embedded([
+            Document(page_content=f"chunk {start + i}",
+                     metadata={"chunk_index": start + i})
+            for i in range(count)
+        ], make_vectors(count, dimensions, seed=start).tolist())
+    store.persist()
+
+
+def measure(chunks: int, queries: int = 5) -> dict:
+    from services.vector_store import VectorStoreService
+
+    store = VectorStoreService()
+    store.search_with_scores("chunk", tenant_id=WARMUP_TENANT)
+    baseline = resident_bytes()
+    start = time.perf_counter()
+    for _ in range(queries):
+        store.search_with_scores("chunk")
+    elapsed = time.perf_counter() - start
+    resident = resident_bytes()
+    anonymous = resident["RssAnon"] - baseline["RssAnon"]
+    mapped = resident["RssFile"] - baseline["RssFile"]
+    return {
+        "anonymous_mb": round(anonymous / 1024 / 1024, 1),
+        "bytes_per_chunk": round(anonymous / chunks),
+        "mapped_bytes_per_chunk": round(mapped / chunks),
+        "query_ms": round(elapsed / queries * 1000, 2),
+    }
+
+
+def run_phase(phase: str, method: str, chunks: int, directory: str) -> str:
+    env = {
+        **os.environ,
+        "CHROMA_PERSIST_DIRECTORY": directory,
+        "EMBEDDING_QUANTIZATION": method,
+        "INGEST_REGISTRY_PATH": os.path.join(directory, "ingested.db"),
+    }
+    return subprocess.run([
+        sys.executable, "-m", "benchmarks.store_memory", "--phase", phase,
+        "--chunks",
+        str(chunks)
+    ],
+                          env=env,
+                          check=True,
+                          capture_output=True,
+                          text=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--methods", nargs="*", default=list(METHODS))
+    parser.add_argument("--phase", choices=("build", "measure"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        from benchmarks import fakes
+        fakes.install()
+        if args.phase == "build":
+            build(args.chunks)
+        else:
+            print(json.dumps(measure(args.chunks)))
+        return
+
+    results = []
+    for method in args.methods:
+        with tempfile.TemporaryDirectory(prefix="store-memory-") as directory:
+            start = time.perf_counter()
+            run_phase("build", method, args.chunks, directory)
+            build_seconds = time.perf_counter() - start
+            result = json.loads(
+                run_phase("measure", method, args.chunks,
+                          directory).strip().splitlines()[-1])
+            results.append({
+                "method": method,
+                "build_s": round(build_seconds, 1),
+                **result
+            })
+    print(
+        json.dumps(
+            {
+                "benchmark": "store_memory",
+                "chunks": args.chunks,
+                "results": results
+            },
+            indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import streamlit as st
+from services.metrics import MetricsRegistry
+from services.rate_limiter import RateGovernor
+from services.tracing import Tracer, span_tree
+
+
+def render_diagnostics(vector_store=None):
+    st.header("Diagnostics")
+
+    metrics = MetricsRegistry()
+    rows = metrics.snapshot()
+
+    st.subheader("OpenAI Rate Governor")
+    st.json(RateGovernor().stats())
+
+    if vector_store is not None:
+        st.subheader("Tenants")
+        tenant_rows = [
+            vector_store.tenant_stats(tenant_id)
+            for tenant_id in vector_store.list_tenants()
+        ]
+        if tenant_rows:
+            st.dataframe(tenant_rows, use_container_width=True)
+        else:
+            st.info("No tenant collections yet")
+
+    # Set by this session's last upload (components.file_upload)
+    report = st.session_state.get("last_ingest_report")
+    stages = report.stages if report is not None else []
+    if stages:
+        st.subheader("Last Ingest Run")
+        st.dataframe(stages, use_container_width=True)
+        bottleneck = min(stages, key=lambda row: row["capacity_chunks_per_sec"]
+                         or float("inf"))
+        st.caption(f"Bottleneck stage: {bottleneck['stage']} "
+                   f"({bottleneck['capacity_chunks_per_sec']} chunks/s)")
+        if report.files:
+            st.dataframe(report.files, use_container_width=True)
+
+    tracer = Tracer()
+    traces = tracer.recent_traces()
+    if traces:
+        st.subheader("Recent Traces")
+        labels = {
+            f"{root.name} ({root.duration * 1000:.0f} ms, "
+            f"{root.trace_id[:8]})": root.trace_id
+            for root in traces
+        }
+        selected = st.selectbox("Trace", list(labels))
+        st.dataframe(span_tree(tracer.trace(labels[selected])),
+                     use_container_width=True)
+        if tracer.path:
+            st.caption(f"All spans are in {tracer.path}; convert them for "
+                       "Perfetto with `python -m services.tracing chrome "
+                       f"{tracer.path} trace.json`")
+
+    st.subheader("LLM and Embedding Calls")
+    if not rows:
+        st.info("No LLM or embedding calls recorded yet")
+        return
+
+    st.dataframe(rows, use_container_width=True)
+
+    slowest = max(rows, key=lambda row: row["p95_ms"])
+    st.caption(f"Slowest stage at p95: {slowest['operation']} "
+               f"({slowest['p95_ms']} ms)")
+
+    with st.expander("Prometheus metrics"):
+        st.code(metrics.render_prometheus(), language="text")
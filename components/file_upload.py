@@ -1,42 +1,54 @@
+from typing import Dict, List, Tuple
+
 import streamlit as st
-import zipfile
-import io
-from typing import BinaryIO, List
 from utils.validators import validate_file, validate_url
 from services.file_handler import FileHandlerFactory
-from services.web_scraper import WebScraperService, crawl_website
-import time
-
-
-def process_single_file(file: BinaryIO, vector_store, llm_service) -> None:
-    # Get file handler
-    file_type = file.name.split('.')[-1].lower()
-    handler = FileHandlerFactory.get_handler(file_type)
-
-    # Extract text content
-    text_content = handler.extract_text(file, llm_service)
-
-    # Get timestamp now
-    timestamp = time.time()
-
-    # Add to vector store
-    vector_store.add_documents(text=text_content,
-                               metadata={
-                                   "filename": file.name,
-                                   "file_type": file_type,
-                                   "created_at": timestamp
-                               })
-
-
-def process_url(url: str, vector_store, llm_service) -> None:
-    web_scraper = WebScraperService()
-    scraped_results = web_scraper.crawl_website(url, vector_store, llm_service)
-
-    for result in scraped_results:
-        print(result)
-
-
-def render_file_upload(vector_store, llm_service):
+from services.ingest_pipeline import IngestReport
+from services.ingestion import process_single_file, process_url, process_zip
+from utils.constants import (CRAWL_MAX_PAGES, MAX_FILE_SIZE_MB,
+                             UI_MAX_UPLOAD_MB)
+
+
+def _outcome_message(timings: List[Dict]) -> str:
+    skipped = [row["source"] for row in timings if row["duplicate"]]
+    if not skipped:
+        return "File(s) processed successfully!"
+    if len(skipped) == len(timings):
+        return "Skipped: already indexed (same contents as an earlier upload)"
+    return (f"File(s) processed successfully! Skipped {len(skipped)} "
+            f"already indexed: {', '.join(skipped)}")
+
+
+def _process_upload(uploaded_file, vector_store, llm_service,
+                    database) -> Tuple[bool, str, List[Dict]]:
+    """Validate and ingest an upload; returns (succeeded, message,
+    per-file stage timings)"""
+    is_valid, error_msg = validate_file(uploaded_file)
+    if not is_valid:
+        return False, error_msg, []
+
+    report = IngestReport()
+    # Shown in this session's Diagnostics tab
+    st.session_state["last_ingest_report"] = report
+    try:
+        if uploaded_file.name.endswith('.zip'):
+            process_zip(uploaded_file,
+                        vector_store,
+                        llm_service,
+                        database,
+                        report=report)
+        else:
+            process_single_file(uploaded_file,
+                                vector_store,
+                                llm_service,
+                                database,
+                                report=report)
+        return True, _outcome_message(report.files), report.files
+    except Exception as e:
+        return False, f"Error during processing: {str(e)}", report.files
+
+
+def render_file_upload(vector_store, llm_service, database=None):
     st.header("Add Documents")
 
     # Add Clear Data button
@@ -54,33 +66,32 @@ def render_file_upload(vector_store, llm_service):
         uploaded_file = st.file_uploader(
             "Choose a file",
             type=list(FileHandlerFactory._handlers.keys()) + ['zip'],
-            help="Upload documents to process")
+            help=f"Upload documents to process (up to {UI_MAX_UPLOAD_MB} MB "
+            f"here; the API's POST /ingest/file takes files up to "
+            f"{MAX_FILE_SIZE_MB} MB without holding them in memory)")
 
         if uploaded_file:
-            # Validate file
-            is_valid, error_msg = validate_file(uploaded_file)
-            if not is_valid:
-                st.error(error_msg)
-                return
-
-            try:
-                if uploaded_file.name.endswith('.zip'):
-                    with zipfile.ZipFile(uploaded_file) as z:
-                        for filename in z.namelist():
-                            if filename.endswith('/'):  # Skip directories
-                                continue
-                            with z.open(filename) as f:
-                                file_content = io.BytesIO(f.read())
-                                file_content.name = filename
-                                process_single_file(file_content, vector_store,
-                                                    llm_service)
-                else:
-                    process_single_file(uploaded_file, vector_store,
-                                        llm_service)
-
-                st.success("File(s) processed successfully!")
-            except Exception as e:
-                st.error(f"Error during processing: {str(e)}")
+            # Every widget interaction reruns this script with the file
+            # still in the uploader; process each upload once per session
+            # and replay its outcome afterwards
+            processed = st.session_state.setdefault("processed_uploads", {})
+            outcome = processed.get(uploaded_file.file_id)
+            if outcome is None:
+                outcome = _process_upload(uploaded_file, vector_store,
+                                          llm_service, database)
+                processed[uploaded_file.file_id] = outcome
+            succeeded, message, timings = outcome
+            if succeeded and timings and all(row["duplicate"]
+                                             for row in timings):
+                st.info(message)
+            elif succeeded:
+                st.success(message)
+            else:
+                st.error(message)
+            if timings:
+                with st.expander("Stage timings"):
+                    # Seconds each file spent in each pipeline stage
+                    st.dataframe(timings, use_container_width=True)
 
     with url_tab:
         url_input = st.text_input(
@@ -88,15 +99,30 @@ def render_file_upload(vector_store, llm_service):
             help="Enter web page root URL to scrape and process",
             placeholder="https://example.com")
 
+        resume_id = st.text_input(
+            "Resume crawl ID (optional)",
+            help="Continue an interrupted crawl from its last checkpoint")
+
+        max_pages = st.number_input(
+            "Maximum pages",
+            min_value=1,
+            value=CRAWL_MAX_PAGES,
+            help="Pages to fetch in this run; resume the crawl to fetch more")
+
         if st.button("Process URLs", type="primary"):
 
-            if not url_input:
+            if not url_input and not resume_id:
                 st.error("Please enter a URL")
                 return
 
             try:
                 with st.spinner("Processing URLs..."):
-                    process_url(url_input, vector_store, llm_service)
-                st.success(f"Successfully processed {url_input} URLs!")
+                    crawl_id = process_url(url_input,
+                                           vector_store,
+                                           llm_service,
+                                           resume_id or None,
+                                           max_pages=int(max_pages))
+                st.success(f"Successfully processed {url_input} URLs! "
+                           f"(crawl ID: {crawl_id})")
             except Exception as e:
                 st.error(f"Error processing URLs: {str(e)}")
@@ -1,23 +1,45 @@
 import streamlit as st
+from dataclasses import asdict
 from services.llm_service import LLMService
+from services.query_service import QueryService
 from services.vector_store import VectorStoreService
 from utils.validators import validate_query
-from components.results_display import render_results, render_result
+from utils.query_templates import QUERY_TEMPLATES
+from components.results_display import (render_results, render_result,
+                                        render_summaries)
 
 
 # TODO: Change this so it rewords the query using an LLM, finds similar vectors, get unique vectors then pass this as context to the langchain LLM
 def render_query_interface(vector_store: VectorStoreService,
-                           llm_service: LLMService):
+                           llm_service: LLMService,
+                           database=None):
     st.header("Query Documents")
 
-    # Single query input field
-    query = st.text_area(
-        "Enter your query",
-        height=100,
-        help="Ask any question about your documents",
-        placeholder=
-        "e.g., 'What are the main topics discussed in the documents?' or 'Find technical specifications for the project'"
-    )
+    template_key = st.selectbox(
+        "Query template",
+        options=[None] + list(QUERY_TEMPLATES.keys()),
+        format_func=lambda key: "Free-form" if key is None else
+        QUERY_TEMPLATES[key].name)
+
+    template_params = {}
+    if template_key is not None:
+        template = QUERY_TEMPLATES[template_key]
+        st.caption(template.description)
+        for param in template.parameters:
+            template_params[param] = st.text_input(
+                param.replace('_', ' ').capitalize(),
+                key=f"template_{template_key}_{param}")
+        query = template.format_query(template_params) if all(
+            template_params.values()) else ""
+    else:
+        # Single query input field
+        query = st.text_area(
+            "Enter your query",
+            height=100,
+            help="Ask any question about your documents",
+            placeholder=
+            "e.g., 'What are the main topics discussed in the documents?' or 'Find technical specifications for the project'"
+        )
 
     # Search button with loading state
     if st.button("Search", type="primary"):
@@ -25,24 +47,35 @@ def render_query_interface(vector_store: VectorStoreService,
             st.error("Please enter a valid query")
             return
 
+        query_service = QueryService(vector_store, llm_service, database)
+        route = query_service.route(query)
+
+        # Summary queries: serve precomputed ingest-time summaries
+        summaries = query_service.find_summaries(route,
+                                                 template_params.get('topic'))
+        if summaries:
+            render_summaries(summaries)
+            return
+
         with st.spinner("Analyzing query and searching documents..."):
             try:
-                # Create similar queries
-                queries_string = llm_service.create_similar_queries(query)
-
-                # Get relevant documents with corrected parameter name
-                vector_results = vector_store.search(queries_string, top_k=5)
-                #vector_results = vector_store.get_all_documents()
+                queries_string, scored_results = query_service.retrieve(
+                    query, route)
+                vector_results = [result.document for result in scored_results]
 
                 # Use vector results to pass as context to the LLM
                 final_result = llm_service.pass_vector_results_as_context(
-                    vector_results, query)
+                    scored_results, query)
 
                 # Display results
                 st.success("Search completed!")
                 # render_results(queries_string, vector_results)
                 render_result(final_result)
-                render_results({queries_string}, vector_results)
+                render_results(
+                    {
+                        "route": asdict(route),
+                        "queries": queries_string
+                    }, vector_results)
             except Exception as e:
                 st.error(f"An error occurred during search: {str(e)}")
                 st.stop()
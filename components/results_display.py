@@ -21,4 +21,10 @@ def render_results(query_analysis, vector_results):
 
 def render_result(result):
     st.subheader("Result")
-    st.text(result)
\ No newline at end of file
+    st.text(result)
+
+def render_summaries(summaries):
+    st.subheader("Document Summaries")
+    for document in summaries:
+        with st.expander(f"Document: {document['filename']}", expanded=True):
+            st.markdown(document['summary'])
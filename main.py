@@ -1,8 +1,12 @@
+import os
 import streamlit as st
 from components.file_upload import render_file_upload
 from components.query_interface import render_query_interface
-from services.vector_store import VectorStoreService
+from components.diagnostics import render_diagnostics
+from services.vector_store import get_vector_store
 from services.llm_service import LLMService
+from services.metrics import MetricsRegistry
+from services.database import DatabaseService
 
 st.set_page_config(page_title="Document Processing System",
                    page_icon="📄",
@@ -10,11 +14,24 @@ st.set_page_config(page_title="Document Processing System",
                    initial_sidebar_state="expanded")
 
 
+@st.cache_resource
+def get_database_service():
+    # Document metadata and summaries need PostgreSQL; run without it otherwise
+    if "PGDATABASE" not in os.environ:
+        return None
+    try:
+        return DatabaseService()
+    except Exception as e:
+        st.warning(f"Database unavailable, summaries are disabled: {str(e)}")
+        return None
+
+
 def initialize_services():
     try:
         # Initialize services using singleton pattern
-        vector_store = VectorStoreService()
+        vector_store = get_vector_store()
         llm_service = LLMService()
+        MetricsRegistry().start_exporters()
         return vector_store, llm_service
     except Exception as e:
         st.error(f"Error initializing services: {str(e)}")
@@ -25,6 +42,7 @@ def main():
     vector_store, llm_service = initialize_services()
     if not vector_store or not llm_service:
         st.stop()
+    database = get_database_service()
 
     st.subheader("Hey YC")
     st.write("This is a very basic generic RAG system. An actual MVP will be ready to showcase the below by end of November. It will work something like...")
@@ -41,13 +59,16 @@ def main():
 
     st.write("This approach brings AI integration into reach without the typical complexity.")
 
-    tabs = st.tabs(["Document Upload", "Query Documents"])
+    tabs = st.tabs(["Document Upload", "Query Documents", "Diagnostics"])
 
     with tabs[0]:
-        render_file_upload(vector_store, llm_service)
+        render_file_upload(vector_store, llm_service, database)
 
     with tabs[1]:
-        render_query_interface(vector_store, llm_service)
+        render_query_interface(vector_store, llm_service, database)
+
+    with tabs[2]:
+        render_diagnostics(vector_store)
 
 
 if __name__ == "__main__":
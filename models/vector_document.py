@@ -1,14 +1,52 @@
 import json
-from typing import List, Dict, Any
+import struct
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+import numpy as np
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_VERSION = 1
+_DOCUMENT_MAGIC = b"VDOC"
+_BATCH_MAGIC = b"VDBT"
+# magic, version, dimension, id length, metadata length
+_DOCUMENT_HEADER = struct.Struct("<4sBIII")
+# magic, version, count, dimension, JSON block length
+_BATCH_HEADER = struct.Struct("<4sBIII")
+_FLOAT32 = np.dtype("<f4")
+
+
+def _padding(offset: int) -> int:
+    """Bytes needed to align the float32 payload to 4 bytes"""
+    return -offset % 4
+
+
+def _check_header(magic: bytes, version: int, expected: bytes):
+    if magic != expected:
+        raise ValueError(f"Not a {expected.decode()} buffer")
+    if version != _VERSION:
+        raise ValueError(f"Unsupported {expected.decode()} version: {version}")
 
 
 class VectorDocument:
+    """An embedding with its id and metadata, stored as a float32 array
+
+    The binary format is a small header, the UTF-8 id and JSON metadata,
+    then the raw little-endian float32 vector. from_bytes returns a
+    read-only vector that is a view over the input buffer (no copy).
+    """
+    __slots__ = ("id", "vector", "metadata")
 
-    def __init__(self, id: str, vector: List[float], metadata: Dict[str, Any]):
+    def __init__(self, id: str, vector: Union[Sequence[float], np.ndarray],
+                 metadata: Dict[str, Any]):
         self.id = id
-        self.vector = vector
+        self.vector = np.asarray(vector, dtype=np.float32)
         self.metadata = metadata
 
+    @property
+    def dimension(self) -> int:
+        return self.vector.shape[0]
+
     @classmethod
     def from_json(cls, json_str: str) -> 'VectorDocument':
         """Create a VectorDocument from a JSON string"""
@@ -21,6 +59,105 @@ class VectorDocument:
         """Convert the document to a JSON string"""
         return json.dumps({
             'id': self.id,
-            'vector': self.vector,
+            'vector': self.vector.tolist(),
             'metadata': self.metadata
         })
+
+    def to_bytes(self) -> bytes:
+        """Serialize to the compact binary format"""
+        id_bytes = self.id.encode("utf-8")
+        metadata_bytes = json.dumps(self.metadata).encode("utf-8")
+        header = _DOCUMENT_HEADER.pack(_DOCUMENT_MAGIC, _VERSION,
+                                       self.dimension, len(id_bytes),
+                                       len(metadata_bytes))
+        offset = len(header) + len(id_bytes) + len(metadata_bytes)
+        return b"".join((header, id_bytes, metadata_bytes,
+                         b"\0" * _padding(offset),
+                         self.vector.astype(_FLOAT32, copy=False).tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data: Buffer) -> 'VectorDocument':
+        """Deserialize from the binary format without copying the vector"""
+        view = memoryview(data)
+        magic, version, dimension, id_length, metadata_length = \
+            _DOCUMENT_HEADER.unpack_from(view)
+        _check_header(magic, version, _DOCUMENT_MAGIC)
+        offset = _DOCUMENT_HEADER.size
+        doc_id = bytes(view[offset:offset + id_length]).decode("utf-8")
+        offset += id_length
+        metadata = json.loads(bytes(view[offset:offset + metadata_length]))
+        offset += metadata_length
+        offset += _padding(offset)
+        vector = np.frombuffer(view, dtype=_FLOAT32, count=dimension,
+                               offset=offset)
+        return cls(id=doc_id, vector=vector, metadata=metadata)
+
+
+class VectorDocumentBatch:
+    """N embeddings held in one contiguous (N, dimension) float32 matrix"""
+    __slots__ = ("ids", "matrix", "metadatas")
+
+    def __init__(self, ids: List[str], matrix: np.ndarray,
+                 metadatas: List[Dict[str, Any]]):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(ids) or \
+                len(ids) != len(metadatas):
+            raise ValueError("ids, matrix rows and metadatas must match")
+        self.ids = ids
+        self.matrix = matrix
+        self.metadatas = metadatas
+
+    @classmethod
+    def from_documents(
+            cls, documents: Sequence[VectorDocument]) -> 'VectorDocumentBatch':
+        if not documents:
+            return cls([], np.empty((0, 0), dtype=np.float32), [])
+        return cls([doc.id for doc in documents],
+                   np.stack([doc.vector for doc in documents]),
+                   [doc.metadata for doc in documents])
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> VectorDocument:
+        """Document whose vector is a view of the batch row"""
+        return VectorDocument(self.ids[index], self.matrix[index],
+                              self.metadatas[index])
+
+    def __iter__(self) -> Iterator[VectorDocument]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_bytes(self) -> bytes:
+        """Serialize ids and metadata as one JSON block, then the matrix"""
+        block = json.dumps({
+            "ids": self.ids,
+            "metadatas": self.metadatas
+        }).encode("utf-8")
+        header = _BATCH_HEADER.pack(_BATCH_MAGIC, _VERSION, len(self),
+                                    self.dimension, len(block))
+        offset = len(header) + len(block)
+        return b"".join((header, block, b"\0" * _padding(offset),
+                         np.ascontiguousarray(self.matrix,
+                                              dtype=_FLOAT32).tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data: Buffer) -> 'VectorDocumentBatch':
+        """Deserialize; the matrix is a read-only view over data"""
+        view = memoryview(data)
+        magic, version, count, dimension, block_length = \
+            _BATCH_HEADER.unpack_from(view)
+        _check_header(magic, version, _BATCH_MAGIC)
+        offset = _BATCH_HEADER.size
+        block = json.loads(bytes(view[offset:offset + block_length]))
+        offset += block_length
+        offset += _padding(offset)
+        matrix = np.frombuffer(view,
+                               dtype=_FLOAT32,
+                               count=count * dimension,
+                               offset=offset).reshape(count, dimension)
+        return cls(block["ids"], matrix, block["metadatas"])
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from services.database import SEARCH_SUMMARIES_SQL, connection_params
+from utils.constants import (DEFAULT_TENANT, PG_POOL_MAX_SIZE,
+                             PG_POOL_MIN_SIZE, PG_PREPARE_STATEMENTS)
+
+
+class QueryStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+
+class AsyncDatabaseService:
+    """Non-blocking reads of the documents table (psycopg 3)
+
+    Serves the API's summary lookups without tying up a thread per
+    query; statements are server-side prepared on first use. Ingest
+    writes documents through DatabaseService from the pipeline's worker
+    threads. Connections are checked before they are handed out, so a
+    restarted server costs a reconnect rather than a failed request. The
+    tables are created by DatabaseService.
+    """
+
+    def __init__(self,
+                 min_size: int = PG_POOL_MIN_SIZE,
+                 max_size: int = PG_POOL_MAX_SIZE,
+                 max_retries: int = 3,
+                 prepare: bool = PG_PREPARE_STATEMENTS):
+        self.max_retries = max_retries
+        self.prepare = prepare
+        kwargs = connection_params()
+        if not prepare:
+            # Prepared statements live on a server connection, which
+            # transaction-mode PgBouncer does not pin
+            kwargs["prepare_threshold"] = None
+        self.pool = AsyncConnectionPool(
+            "",
+            min_size=min_size,
+            max_size=max_size,
+            check=AsyncConnectionPool.check_connection,
+            kwargs=kwargs,
+            open=False)
+        self._stats: Dict[str, QueryStats] = {}
+
+    async def open(self):
+        await self.pool.open(wait=True)
+
+    async def close(self):
+        await self.pool.close()
+
+    @asynccontextmanager
+    async def _timed(self, name: str):
+        stats = self._stats.setdefault(name, QueryStats())
+        start = time.perf_counter()
+        try:
+            yield stats
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.calls += 1
+            stats.seconds += time.perf_counter() - start
+
+    async def _run(self, name: str, operation):
+        """Run operation(conn) in a transaction, retrying dropped
+        connections"""
+        last_error = None
+        async with self._timed(name) as stats:
+            for attempt in range(self.max_retries):
+                try:
+                    async with self.pool.connection() as conn:
+                        return await operation(conn)
+                except psycopg.OperationalError as e:
+                    last_error = e
+                    stats.retries += 1
+                    await asyncio.sleep(0.1 * (attempt + 1))
+                except Exception as e:
+                    raise Exception(f"Database error: {str(e)}")
+        raise Exception(f"Max retries exceeded. Last error: {str(last_error)}")
+
+    async def search_summaries(
+            self,
+            term: str,
+            limit: int = 20,
+            tenant_id: str = DEFAULT_TENANT) -> List[Dict[str, Any]]:
+        pattern = f"%{term}%"
+
+        async def operation(conn):
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    SEARCH_SUMMARIES_SQL,
+                    (pattern, pattern, DEFAULT_TENANT, tenant_id, limit),
+                    prepare=self.prepare)
+                return await cur.fetchall()
+
+        try:
+            return await self._run('search_summaries', operation)
+        except Exception as e:
+            raise Exception(f"Error searching summaries: {str(e)}")
+
+    async def health(self) -> Dict[str, Any]:
+        """Round trip latency plus pool and per-query statistics"""
+        start = time.perf_counter()
+        try:
+            async with self.pool.connection(timeout=5.0) as conn:
+                await conn.execute("SELECT 1")
+            healthy = True
+        except Exception as e:
+            logging.warning(f"Database health check failed: {str(e)}")
+            healthy = False
+        return {
+            "healthy": healthy,
+            "ping_ms": round((time.perf_counter() - start) * 1000, 2),
+            "pool": self.pool.get_stats(),
+            "queries": self.stats(),
+        }
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{
+            "query": name,
+            "calls": stats.calls,
+            "errors": stats.errors,
+            "retries": stats.retries,
+            "avg_ms": round(stats.seconds / stats.calls * 1000, 2)
+            if stats.calls else 0.0,
+        } for name, stats in sorted(self._stats.items())]
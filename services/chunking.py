@@ -0,0 +1,155 @@
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from utils.constants import (CHUNK_ENCODING, CHUNK_OVERLAP, CHUNK_SIZE,
+                             CHUNK_WORKERS, PARALLEL_CHUNK_SEGMENT_SIZE,
+                             PARALLEL_CHUNK_THRESHOLD)
+
+PAGE_BREAK = "\f"
+
+# Structural boundaries, strongest first: markdown headings, page breaks
+# (handlers join pages with PAGE_BREAK), paragraphs, lines (which is also
+# where table rows end), sentences and finally words.
+STRUCTURAL_SEPARATORS = [
+    r"\n(?=#{1,6} )",
+    PAGE_BREAK,
+    r"\n\n",
+    r"\n",
+    r"(?<=[.!?]) ",
+    r" ",
+    r"",
+]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = CHUNK_ENCODING) -> tiktoken.Encoding:
+    """Return a process-wide cached tiktoken encoding"""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text: str, encoding_name: str = CHUNK_ENCODING) -> int:
+    """Count tokens in text using the cached encoding"""
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=16)
+def get_text_splitter(chunk_size: int, chunk_overlap: int,
+                      encoding_name: str) -> RecursiveCharacterTextSplitter:
+    """Return a cached structure-aware splitter measuring length in tokens"""
+    encoding = get_encoding(encoding_name)
+    return RecursiveCharacterTextSplitter(
+        separators=STRUCTURAL_SEPARATORS,
+        is_separator_regex=True,
+        keep_separator=True,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=lambda text: len(
+            encoding.encode(text, disallowed_special=())))
+
+
+def _split_segment(args) -> List[str]:
+    """Process pool entry point: split one segment of a large text"""
+    segment, chunk_size, chunk_overlap, encoding_name = args
+    return get_text_splitter(chunk_size, chunk_overlap,
+                             encoding_name).split_text(segment)
+
+
+def _segment_text(text: str, segment_size: int) -> List[str]:
+    """Cut text into roughly segment_size pieces on structural boundaries"""
+    segments = []
+    start = 0
+    while start < len(text):
+        end = start + segment_size
+        if end >= len(text):
+            segments.append(text[start:])
+            break
+        cut = -1
+        for boundary in (PAGE_BREAK, "\n\n", "\n"):
+            cut = text.rfind(boundary, start + segment_size // 2, end)
+            if cut != -1:
+                break
+        if cut == -1:
+            cut = end
+        segments.append(text[start:cut])
+        start = cut
+    return segments
+
+
+def _shutdown_executor():
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+
+
+atexit.register(_shutdown_executor)
+
+
+def get_process_pool(
+        max_workers: int = CHUNK_WORKERS) -> ProcessPoolExecutor:
+    """Return the shared process pool for CPU-bound ingest work"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn keeps workers independent of the threads the app is running
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = max_workers
+        return _executor
+
+
+class TextChunker:
+    """Token-aware, structure-aware text splitter shared by all services"""
+
+    def __init__(self,
+                 chunk_size: int = CHUNK_SIZE,
+                 chunk_overlap: int = CHUNK_OVERLAP,
+                 encoding_name: str = CHUNK_ENCODING,
+                 parallel_threshold: int = PARALLEL_CHUNK_THRESHOLD,
+                 max_workers: int = CHUNK_WORKERS):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding_name = encoding_name
+        self.parallel_threshold = parallel_threshold
+        self.max_workers = max_workers
+
+    @property
+    def splitter(self) -> RecursiveCharacterTextSplitter:
+        return get_text_splitter(self.chunk_size, self.chunk_overlap,
+                                 self.encoding_name)
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.encoding_name)
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunks, fanning large texts out to a process pool"""
+        if len(text) < self.parallel_threshold or self.max_workers <= 1:
+            return self.splitter.split_text(text)
+
+        segments = _segment_text(text, PARALLEL_CHUNK_SEGMENT_SIZE)
+        args = [(segment, self.chunk_size, self.chunk_overlap,
+                 self.encoding_name) for segment in segments]
+        try:
+            executor = get_process_pool(self.max_workers)
+            chunks = []
+            for segment_chunks in executor.map(_split_segment, args):
+                chunks.extend(segment_chunks)
+            return chunks
+        except Exception as e:
+            logging.warning(
+                f"Parallel chunking failed, splitting in-process: {str(e)}")
+            return self.splitter.split_text(text)
+
@@ -0,0 +1,129 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from services.chunking import TextChunker
+from utils.constants import CONTEXT_MMR_LAMBDA, CONTEXT_TOKEN_BUDGET
+
+# Overlap lengths (in characters) considered when merging neighbours
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 2000
+
+
+@dataclass
+class ScoredChunk:
+    document: Document
+    # Similarity to the query, higher is better
+    score: float
+    embedding: Optional[List[float]] = None
+
+
+def _merge_overlapping(first: str, second: str) -> str:
+    """Join two neighbouring chunks, dropping the text they share"""
+    tail = first[-MAX_OVERLAP_CHARS:]
+    for start in range(len(tail) - MIN_OVERLAP_CHARS + 1):
+        if second.startswith(tail[start:]):
+            return first + second[len(tail) - start:]
+    return first + "\n" + second
+
+
+class ContextBuilder:
+    """Packs retrieved chunks into a token-budgeted, de-duplicated context"""
+
+    def __init__(self,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+                 chunker: Optional[TextChunker] = None):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.chunker = chunker or TextChunker()
+
+    def build(self, results: Sequence[Union[Document, ScoredChunk]]) -> str:
+        """Select, merge and format chunks for the prompt"""
+        candidates = self._normalize(results)
+        selected = self._fill_budget(self._mmr_order(candidates))
+        sections = self._merge_neighbours(selected)
+
+        context = "\n\n---\n\n".join(
+            f"[Source: {source}]\n{text}" for source, text, _ in sections)
+        logging.debug(f"Context packed {len(selected)}/{len(candidates)} "
+                      f"chunks into {len(sections)} sections")
+        return context
+
+    def _normalize(
+        self, results: Sequence[Union[Document, ScoredChunk]]
+    ) -> List[ScoredChunk]:
+        """Wrap plain documents (scored by rank) and drop exact duplicates"""
+        candidates = []
+        seen = set()
+        for rank, result in enumerate(results):
+            if isinstance(result, Document):
+                result = ScoredChunk(document=result,
+                                     score=1.0 - rank / len(results))
+            if result.document.page_content in seen:
+                continue
+            seen.add(result.document.page_content)
+            candidates.append(result)
+        return sorted(candidates, key=lambda c: c.score, reverse=True)
+
+    def _mmr_order(self, candidates: List[ScoredChunk]) -> List[ScoredChunk]:
+        """Order candidates by maximal marginal relevance"""
+        if len(candidates) < 2 or any(c.embedding is None
+                                      for c in candidates):
+            return candidates
+
+        vectors = np.array([c.embedding for c in candidates], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        similarity = vectors @ vectors.T
+        scores = np.array([c.score for c in candidates], dtype=np.float32)
+
+        order = [0]
+        remaining = list(range(1, len(candidates)))
+        while remaining:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+            mmr = self.mmr_lambda * scores[remaining] - (
+                1 - self.mmr_lambda) * redundancy
+            order.append(remaining.pop(int(np.argmax(mmr))))
+        return [candidates[i] for i in order]
+
+    def _fill_budget(self, ordered: List[ScoredChunk]) -> List[ScoredChunk]:
+        selected = []
+        used = 0
+        for candidate in ordered:
+            tokens = self.chunker.count_tokens(candidate.document.page_content)
+            if used + tokens > self.token_budget:
+                continue
+            selected.append(candidate)
+            used += tokens
+        return selected
+
+    def _merge_neighbours(self, selected: List[ScoredChunk]) -> List[tuple]:
+        """Merge adjacent chunks of the same source into (source, text, score)"""
+        by_source = {}
+        for candidate in selected:
+            source = candidate.document.metadata.get("filename", "Unknown")
+            by_source.setdefault(source, []).append(candidate)
+
+        sections = []
+        for source, chunks in by_source.items():
+            chunks.sort(key=lambda c: c.document.metadata.get(
+                "chunk_index", -1))
+            text = chunks[0].document.page_content
+            score = chunks[0].score
+            previous = chunks[0].document.metadata.get("chunk_index")
+            for chunk in chunks[1:]:
+                index = chunk.document.metadata.get("chunk_index")
+                if previous is not None and index == previous + 1:
+                    text = _merge_overlapping(text, chunk.document.page_content)
+                    score = max(score, chunk.score)
+                else:
+                    sections.append((source, text, score))
+                    text = chunk.document.page_content
+                    score = chunk.score
+                previous = index
+            sections.append((source, text, score))
+
+        return sorted(sections, key=lambda section: section[2], reverse=True)
@@ -0,0 +1,214 @@
+import gzip
+import heapq
+import itertools
+import logging
+import math
+import posixpath
+import re
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import (parse_qsl, urlencode, urljoin, urlparse, urlunparse)
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from utils.constants import (CRAWL_DEPTH_WEIGHT, REQUEST_TIMEOUT,
+                             SITEMAP_MAX_FILES, SITEMAP_MAX_URLS,
+                             SITEMAP_PRIORITY_WEIGHT, SITEMAP_RECENCY_WEIGHT,
+                             TRACKING_PARAMS)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+INDEX_PAGES = ('index.html', 'index.htm', 'index.php')
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so equivalent forms map to the same string
+
+    Lower-cases scheme and host, drops default ports, fragments, tracking
+    parameters, index pages and trailing slashes, collapses repeated
+    slashes and sorts the query string. Raises ValueError for a malformed
+    port.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+
+    path = re.sub(r'/{2,}', '/', parsed.path or '/')
+    path = posixpath.normpath(path) if path != '/' else path
+    for index_page in INDEX_PAGES:
+        if path.endswith('/' + index_page):
+            path = path[:-len(index_page)]
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = urlencode(
+        sorted((key, value)
+               for key, value in parse_qsl(parsed.query,
+                                           keep_blank_values=True)
+               if not key.lower().startswith('utm_') and
+               key.lower() not in TRACKING_PARAMS))
+
+    return urlunparse((scheme, host, path or '/', '', query, ''))
+
+
+class RobotsPolicy:
+    """robots.txt rules for one site; everything is allowed if unavailable"""
+
+    def __init__(self, parser: Optional[RobotFileParser], user_agent: str):
+        self.parser = parser
+        self.user_agent = user_agent
+
+    @classmethod
+    def fetch(cls, site_url: str, headers: Dict) -> 'RobotsPolicy':
+        parsed = urlparse(site_url)
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+        user_agent = headers.get('User-Agent', '*')
+        try:
+            response = requests.get(robots_url,
+                                    headers=headers,
+                                    timeout=REQUEST_TIMEOUT)
+            if response.status_code >= 400:
+                return cls(None, user_agent)
+            parser = RobotFileParser(robots_url)
+            parser.parse(response.text.splitlines())
+            return cls(parser, user_agent)
+        except requests.RequestException as e:
+            logging.warning(f"Could not fetch {robots_url}: {str(e)}")
+            return cls(None, user_agent)
+
+    def can_fetch(self, url: str) -> bool:
+        return self.parser is None or self.parser.can_fetch(
+            self.user_agent, url)
+
+    @property
+    def crawl_delay(self) -> float:
+        if self.parser is None:
+            return 0.0
+        delay = self.parser.crawl_delay(self.user_agent)
+        return float(delay) if delay else 0.0
+
+    @property
+    def sitemaps(self) -> List[str]:
+        if self.parser is None:
+            return []
+        return self.parser.site_maps() or []
+
+
+@dataclass
+class SitemapEntry:
+    url: str
+    priority: float = 0.5
+    lastmod: Optional[float] = None
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_lastmod(value: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value.strip().replace(
+            'Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def iter_sitemap_entries(sitemap_urls: List[str],
+                         headers: Dict) -> Iterator[SitemapEntry]:
+    """Yield page entries from sitemaps, following sitemap indexes"""
+    pending = list(sitemap_urls)
+    fetched = 0
+    yielded = 0
+    while pending and fetched < SITEMAP_MAX_FILES:
+        sitemap_url = pending.pop(0)
+        fetched += 1
+        try:
+            response = requests.get(sitemap_url,
+                                    headers=headers,
+                                    timeout=REQUEST_TIMEOUT)
+            if response.status_code >= 400:
+                continue
+            content = response.content
+            if content[:2] == b'\x1f\x8b':
+                content = gzip.decompress(content)
+            root = ET.fromstring(content)
+        except (requests.RequestException, ET.ParseError, OSError) as e:
+            logging.warning(f"Could not read sitemap {sitemap_url}: {str(e)}")
+            continue
+
+        for node in root:
+            fields = {
+                _local_name(child.tag): (child.text or '').strip()
+                for child in node
+            }
+            if not fields.get('loc'):
+                continue
+            if _local_name(root.tag) == 'sitemapindex':
+                pending.append(fields['loc'])
+                continue
+            try:
+                priority = float(fields.get('priority', 0.5))
+            except ValueError:
+                priority = 0.5
+            yield SitemapEntry(url=fields['loc'],
+                               priority=priority,
+                               lastmod=_parse_lastmod(fields['lastmod'])
+                               if fields.get('lastmod') else None)
+            yielded += 1
+            if yielded >= SITEMAP_MAX_URLS:
+                return
+
+
+class CrawlFrontier:
+    """Priority queue of canonical URLs still to crawl
+
+    Lower scores are crawled first: shallow pages, high sitemap priority
+    and recently modified pages come before deep or stale ones. Each
+    canonical URL is only ever enqueued once.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._sequence = itertools.count()
+        self.seen: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @staticmethod
+    def score(depth: int,
+              priority: float = 0.5,
+              lastmod: Optional[float] = None) -> float:
+        score = depth * CRAWL_DEPTH_WEIGHT - priority * SITEMAP_PRIORITY_WEIGHT
+        if lastmod is not None:
+            age_days = max(0.0, (time.time() - lastmod) / 86400)
+            score -= SITEMAP_RECENCY_WEIGHT * math.exp(-age_days / 30)
+        return score
+
+    def push(self,
+             url: str,
+             depth: int,
+             priority: float = 0.5,
+             lastmod: Optional[float] = None) -> bool:
+        """Enqueue url unless its canonical form was already seen"""
+        canonical = canonicalize_url(url)
+        if canonical in self.seen:
+            return False
+        self.seen.add(canonical)
+        heapq.heappush(self._heap, (self.score(depth, priority, lastmod),
+                                    next(self._sequence), canonical, depth))
+        return True
+
+    def pop(self) -> Tuple[str, int]:
+        """Return the best (url, depth) pair"""
+        _, _, url, depth = heapq.heappop(self._heap)
+        return url, depth
+
+
+def default_sitemap_url(site_url: str) -> str:
+    return urljoin(site_url, '/sitemap.xml')
@@ -0,0 +1,224 @@
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from services.crawl_frontier import CrawlFrontier, canonicalize_url
+from utils.constants import (CRAWL_BLOOM_CAPACITY, CRAWL_BLOOM_ERROR_RATE,
+                             CRAWL_STATE_PATH)
+
+
+class BloomFilter:
+    """Fixed-size set of URL fingerprints with a bounded false positive rate"""
+
+    def __init__(self,
+                 capacity: int = CRAWL_BLOOM_CAPACITY,
+                 error_rate: float = CRAWL_BLOOM_ERROR_RATE):
+        num_bits = -capacity * math.log(error_rate) / math.log(2)**2
+        self.bits = bytearray(max(1, math.ceil(num_bits / 8)))
+        self.num_bits = len(self.bits) * 8
+        self.num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        bloom = cls.__new__(cls)
+        bloom.num_hashes = data[0]
+        bloom.bits = bytearray(data[1:])
+        bloom.num_bits = len(bloom.bits) * 8
+        return bloom
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.num_hashes]) + bytes(self.bits)
+
+
+def url_fingerprint(url: str) -> int:
+    """Signed 64-bit fingerprint of a canonical URL (fits an SQLite INTEGER)"""
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+class CrawlStateStore:
+    """SQLite-backed crawl checkpoints: crawl metadata, frontier and seen set
+
+    Frontier changes are committed as they happen, so several crawls can
+    share the file. Popped URLs are only claimed until the next
+    checkpoint; a resumed crawl puts claims made after it back in the
+    queue.
+    """
+
+    def __init__(self, path: str = CRAWL_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        # Checkpoints make up for commits lost to a power failure
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS crawls (
+                    id TEXT PRIMARY KEY,
+                    start_url TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    pages_crawled INTEGER NOT NULL DEFAULT 0,
+                    seen_filter BLOB,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS crawl_frontier (
+                    crawl_id TEXT NOT NULL,
+                    fingerprint INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    depth INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    claimed INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (crawl_id, fingerprint)
+                );
+            """)
+            columns = [
+                row[1] for row in self.conn.execute(
+                    "PRAGMA table_info(crawl_frontier)")
+            ]
+            if 'claimed' not in columns:
+                self.conn.execute("ALTER TABLE crawl_frontier ADD COLUMN "
+                                  "claimed INTEGER NOT NULL DEFAULT 0")
+            self.conn.executescript("""
+                DROP INDEX IF EXISTS idx_crawl_frontier_score;
+                CREATE INDEX IF NOT EXISTS idx_crawl_frontier_queue
+                    ON crawl_frontier (crawl_id, claimed, score);
+            """)
+            self.conn.commit()
+
+    def create_crawl(self, start_url: str, domain: str) -> str:
+        crawl_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO crawls (id, start_url, domain, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?)",
+                (crawl_id, start_url, domain, now, now))
+            self.conn.commit()
+        return crawl_id
+
+    def get_crawl(self, crawl_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, start_url, domain, status, pages_crawled, "
+                "seen_filter, created_at, updated_at FROM crawls WHERE id = ?",
+                (crawl_id, )).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'start_url', 'domain', 'status', 'pages_crawled',
+                'seen_filter', 'created_at', 'updated_at')
+        return dict(zip(keys, row))
+
+    def checkpoint(self, crawl_id: str, pages_crawled: int,
+                   seen: BloomFilter, status: str = 'running'):
+        """Drop claimed URLs together with saving progress and the seen set"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM crawl_frontier WHERE crawl_id = ? "
+                "AND claimed = 1", (crawl_id, ))
+            self.conn.execute(
+                "UPDATE crawls SET pages_crawled = ?, seen_filter = ?, "
+                "status = ?, updated_at = ? WHERE id = ?",
+                (pages_crawled, seen.to_bytes(), status, time.time(),
+                 crawl_id))
+
+    def release_claims(self, crawl_id: str):
+        """Queue again the URLs popped since the last checkpoint"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE crawl_frontier SET claimed = 0 WHERE crawl_id = ? "
+                "AND claimed = 1", (crawl_id, ))
+
+    def push(self, crawl_id: str, url: str, depth: int, score: float):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO crawl_frontier "
+                "(crawl_id, fingerprint, url, depth, score) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (crawl_id, url_fingerprint(url), url, depth, score))
+
+    def pop(self, crawl_id: str) -> Optional[Tuple[str, int]]:
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT fingerprint, url, depth FROM crawl_frontier "
+                "WHERE crawl_id = ? AND claimed = 0 ORDER BY score LIMIT 1",
+                (crawl_id, )).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE crawl_frontier SET claimed = 1 WHERE crawl_id = ? "
+                "AND fingerprint = ?", (crawl_id, row[0]))
+        return row[1], row[2]
+
+    def frontier_size(self, crawl_id: str) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM crawl_frontier WHERE crawl_id = ? "
+                "AND claimed = 0", (crawl_id, )).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class PersistentCrawlFrontier:
+    """CrawlFrontier whose queue lives in SQLite and whose seen set is a
+    Bloom filter, so memory stays flat however large the site is"""
+
+    def __init__(self,
+                 store: CrawlStateStore,
+                 crawl_id: str,
+                 seen: Optional[BloomFilter] = None):
+        self.store = store
+        self.crawl_id = crawl_id
+        self.seen = seen if seen is not None else BloomFilter()
+        self._size = store.frontier_size(crawl_id)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self,
+             url: str,
+             depth: int,
+             priority: float = 0.5,
+             lastmod: Optional[float] = None) -> bool:
+        canonical = canonicalize_url(url)
+        if canonical in self.seen:
+            return False
+        self.seen.add(canonical)
+        self.store.push(self.crawl_id, canonical, depth,
+                        CrawlFrontier.score(depth, priority, lastmod))
+        self._size += 1
+        return True
+
+    def pop(self) -> Tuple[str, int]:
+        entry = self.store.pop(self.crawl_id)
+        if entry is None:
+            self._size = 0
+            raise IndexError("pop from an empty frontier")
+        self._size -= 1
+        return entry
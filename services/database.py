@@ -7,6 +7,124 @@ import json
 from typing import Dict, List, Optional
 import time
 import logging
+from utils.constants import DEFAULT_TENANT
+
+# Hot statements; SEARCH_SUMMARIES_SQL is shared with services.async_database
+SAVE_DOCUMENT_SQL = """
+    INSERT INTO documents (
+        filename, file_type, summary, metadata,
+        total_chunks, processing_status
+    )
+    VALUES (%s, %s, %s, %s::jsonb, %s, %s)
+    RETURNING id
+"""
+
+UPDATE_PROGRESS_SQL = """
+    UPDATE documents
+    SET processed_chunks = %s,
+        processing_status = CASE
+            WHEN %s >= total_chunks THEN 'completed'
+            ELSE 'processing'
+        END
+    WHERE id = %s
+"""
+
+UPDATE_STATUS_SQL = """
+    UPDATE documents
+    SET processed_chunks = %s,
+        processing_status = %s
+    WHERE id = %s
+"""
+
+COMPLETE_DOCUMENT_SQL = """
+    UPDATE documents
+    SET summary = %s,
+        total_chunks = %s,
+        processed_chunks = %s,
+        processing_status = 'completed'
+    WHERE id = %s
+"""
+
+SEARCH_SUMMARIES_SQL = """
+    SELECT id, filename, file_type, summary, created_at
+    FROM documents
+    WHERE summary IS NOT NULL
+      AND processing_status = 'completed'
+      AND (filename ILIKE %s OR summary ILIKE %s)
+      AND COALESCE(metadata->>'tenant_id', %s) = %s
+    ORDER BY created_at DESC
+    LIMIT %s
+"""
+
+
+def connection_params() -> Dict:
+    """Connection settings from the standard libpq environment variables"""
+    return {
+        "dbname": os.environ["PGDATABASE"],
+        "user": os.environ["PGUSER"],
+        "password": os.environ["PGPASSWORD"],
+        "host": os.environ["PGHOST"],
+        "port": os.environ["PGPORT"],
+    }
+
+
+def create_document_tables(cur):
+    """Create the documents table and its trigger (idempotent)"""
+    # Create documents table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id SERIAL PRIMARY KEY,
+            filename TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            summary TEXT,
+            metadata JSONB,
+            processing_status TEXT DEFAULT 'processing',
+            total_chunks INTEGER DEFAULT 1,
+            processed_chunks INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create or replace the updated_at function
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    ''')
+
+    # Drop existing trigger if exists and create new one
+    cur.execute('''
+        DROP TRIGGER IF EXISTS update_documents_updated_at ON documents;
+    ''')
+
+    cur.execute('''
+        CREATE TRIGGER update_documents_updated_at
+        BEFORE UPDATE ON documents
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column();
+    ''')
+
+    # Ensure the updated_at column exists
+    cur.execute('''
+        DO $$ 
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 
+                FROM information_schema.columns 
+                WHERE table_name = 'documents' 
+                AND column_name = 'updated_at'
+            ) THEN
+                ALTER TABLE documents 
+                ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+            END IF;
+        END $$;
+    ''')
+
 
 class DatabaseService:
     def __init__(self, min_connections=1, max_connections=10, max_retries=3):
@@ -14,11 +132,7 @@ class DatabaseService:
         self.pool = ThreadedConnectionPool(
             minconn=min_connections,
             maxconn=max_connections,
-            dbname=os.environ["PGDATABASE"],
-            user=os.environ["PGUSER"],
-            password=os.environ["PGPASSWORD"],
-            host=os.environ["PGHOST"],
-            port=os.environ["PGPORT"]
+            **connection_params()
         )
         self._create_tables()
 
@@ -36,7 +150,8 @@ class DatabaseService:
             yield conn
         finally:
             if conn is not None:
-                self.pool.putconn(conn)
+                # Broken connections are discarded rather than reused
+                self.pool.putconn(conn, close=bool(conn.closed))
 
     def _execute_with_retry(self, operation, *args, **kwargs):
         """Execute database operation with retry mechanism"""
@@ -44,22 +159,27 @@ class DatabaseService:
         for attempt in range(self.max_retries):
             try:
                 with self.get_connection() as conn:
-                    with conn.cursor(cursor_factory=kwargs.get('cursor_factory', None)) as cur:
-                        cur.execute(*args)
-                        if operation == 'fetch_one':
-                            result = cur.fetchone()
-                        elif operation == 'fetch_all':
-                            result = cur.fetchall()
-                        else:
-                            result = None
-                    conn.commit()
-                    return result
+                    try:
+                        with conn.cursor(cursor_factory=kwargs.get('cursor_factory', None)) as cur:
+                            cur.execute(*args)
+                            if operation == 'fetch_one':
+                                result = cur.fetchone()
+                            elif operation == 'fetch_all':
+                                result = cur.fetchall()
+                            else:
+                                result = None
+                        conn.commit()
+                        return result
+                    except Exception:
+                        # Roll back while the connection is still ours
+                        if not conn.closed:
+                            conn.rollback()
+                        raise
             except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
                 last_error = e
                 time.sleep(0.1 * (attempt + 1))  # Exponential backoff
                 continue
             except Exception as e:
-                conn.rollback() if conn else None
                 raise Exception(f"Database error: {str(e)}")
         raise Exception(f"Max retries exceeded. Last error: {str(last_error)}")
 
@@ -68,80 +188,23 @@ class DatabaseService:
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cur:
-                    # Create documents table
-                    cur.execute("""
-                        CREATE TABLE IF NOT EXISTS documents (
-                            id SERIAL PRIMARY KEY,
-                            filename TEXT NOT NULL,
-                            file_type TEXT NOT NULL,
-                            summary TEXT,
-                            metadata JSONB,
-                            processing_status TEXT DEFAULT 'processing',
-                            total_chunks INTEGER DEFAULT 1,
-                            processed_chunks INTEGER DEFAULT 0,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
-                    
-                    # Create or replace the updated_at function
-                    cur.execute('''
-                        CREATE OR REPLACE FUNCTION update_updated_at_column()
-                        RETURNS TRIGGER AS $$
-                        BEGIN
-                            NEW.updated_at = CURRENT_TIMESTAMP;
-                            RETURN NEW;
-                        END;
-                        $$ LANGUAGE plpgsql;
-                    ''')
-
-                    # Drop existing trigger if exists and create new one
-                    cur.execute('''
-                        DROP TRIGGER IF EXISTS update_documents_updated_at ON documents;
-                    ''')
-
-                    cur.execute('''
-                        CREATE TRIGGER update_documents_updated_at
-                        BEFORE UPDATE ON documents
-                        FOR EACH ROW
-                        EXECUTE FUNCTION update_updated_at_column();
-                    ''')
-
-                    # Ensure the updated_at column exists
-                    cur.execute('''
-                        DO $$ 
-                        BEGIN
-                            IF NOT EXISTS (
-                                SELECT 1 
-                                FROM information_schema.columns 
-                                WHERE table_name = 'documents' 
-                                AND column_name = 'updated_at'
-                            ) THEN
-                                ALTER TABLE documents 
-                                ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
-                            END IF;
-                        END $$;
-                    ''')
+                    create_document_tables(cur)
                 conn.commit()
         except Exception as e:
             raise Exception(f"Error creating tables: {str(e)}")
 
-    def save_document(self, filename: str, file_type: str, summary: str, metadata: Dict, total_chunks: int = 1) -> int:
+    def save_document(self, filename: str, file_type: str, summary: str, metadata: Dict, total_chunks: int = 1, status: Optional[str] = None) -> int:
         """Save document with retry mechanism"""
         try:
+            if status is None:
+                status = 'processing' if total_chunks > 1 else 'completed'
+
             metadata_json = json.dumps(metadata) if isinstance(metadata, dict) else metadata
             result = self._execute_with_retry(
                 'fetch_one',
-                """
-                INSERT INTO documents (
-                    filename, file_type, summary, metadata, 
-                    total_chunks, processing_status
-                )
-                VALUES (%s, %s, %s, %s::jsonb, %s, %s)
-                RETURNING id
-                """,
+                SAVE_DOCUMENT_SQL,
                 (filename, file_type, summary, metadata_json,
-                 total_chunks, 'processing' if total_chunks > 1 else 'completed')
+                 total_chunks, status)
             )
             
             if result is None:
@@ -156,31 +219,42 @@ class DatabaseService:
             if status is None:
                 self._execute_with_retry(
                     'execute',
-                    """
-                    UPDATE documents 
-                    SET processed_chunks = %s,
-                        processing_status = CASE 
-                            WHEN %s >= total_chunks THEN 'completed'
-                            ELSE 'processing'
-                        END
-                    WHERE id = %s
-                    """,
+                    UPDATE_PROGRESS_SQL,
                     (processed_chunks, processed_chunks, doc_id)
                 )
             else:
                 self._execute_with_retry(
                     'execute',
-                    """
-                    UPDATE documents 
-                    SET processed_chunks = %s,
-                        processing_status = %s
-                    WHERE id = %s
-                    """,
+                    UPDATE_STATUS_SQL,
                     (processed_chunks, status, doc_id)
                 )
         except Exception as e:
             raise Exception(f"Error updating processing status: {str(e)}")
 
+    def complete_document(self, doc_id: int, summary: Optional[str], total_chunks: int):
+        """Store the ingest-time summary and mark the document completed"""
+        try:
+            self._execute_with_retry(
+                'execute',
+                COMPLETE_DOCUMENT_SQL,
+                (summary, total_chunks, total_chunks, doc_id)
+            )
+        except Exception as e:
+            raise Exception(f"Error completing document: {str(e)}")
+
+    def search_summaries(self, term: str, limit: int = 20, tenant_id: str = DEFAULT_TENANT) -> List[Dict]:
+        """Find a tenant's precomputed summaries whose filename or summary mention term"""
+        try:
+            pattern = f"%{term}%"
+            return self._execute_with_retry(
+                'fetch_all',
+                SEARCH_SUMMARIES_SQL,
+                (pattern, pattern, DEFAULT_TENANT, tenant_id, limit),
+                cursor_factory=RealDictCursor
+            ) or []
+        except Exception as e:
+            raise Exception(f"Error searching summaries: {str(e)}")
+
     def get_documents(self, filters: Optional[Dict] = None) -> List[Dict]:
         """Get documents with retry mechanism"""
         try:
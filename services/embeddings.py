@@ -0,0 +1,40 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from services.chunking import count_tokens
+from services.metrics import MetricsRegistry
+from services.rate_limiter import (PRIORITY_BULK, PRIORITY_INTERACTIVE,
+                                   RateGovernor)
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Wraps an embeddings model to record latency, tokens and errors
+
+    Calls go through the shared RateGovernor: document embedding (ingest)
+    runs at bulk priority, query embedding at interactive priority.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str):
+        self.embeddings = embeddings
+        self.model = model
+        self.metrics = MetricsRegistry()
+        self.governor = RateGovernor()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.metrics.track("embedding", self.model) as call:
+            call.input_tokens = sum(count_tokens(text) for text in texts)
+            return self.governor.call(
+                lambda: self.embeddings.embed_documents(texts),
+                priority=PRIORITY_BULK,
+                tokens=call.input_tokens,
+                call=call)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.metrics.track("embedding", self.model) as call:
+            call.input_tokens = count_tokens(text)
+            return self.governor.call(
+                lambda: self.embeddings.embed_query(text),
+                priority=PRIORITY_INTERACTIVE,
+                tokens=call.input_tokens,
+                call=call)
@@ -1,24 +1,66 @@
 from abc import ABC, abstractmethod
+import codecs
 import io
-from typing import BinaryIO
+from typing import BinaryIO, Dict, Iterator, List
 import docx
 import fitz  # PyMuPDF
 from PIL import Image
-import json
-import xml.etree.ElementTree as ET
 import pandas as pd
 import markdown
-from bs4 import BeautifulSoup
 import re
 import base64
+from services.chunking import PAGE_BREAK, TextChunker
+from services.html_extraction import parse_html
+from services.spooling import Payload, iter_blocks, local_path, open_payload
+from services.structured_extraction import iter_json_records, iter_xml_records
+from utils.constants import (CSV_READ_CHUNKSIZE, CSV_ROWS_PER_CHUNK,
+                             CSV_TYPE_COLUMNS, TEXT_BLOCK_SIZE)
+
+
+def iter_text_blocks(file: BinaryIO,
+                     block_size: int = TEXT_BLOCK_SIZE,
+                     errors: str = 'strict') -> Iterator[str]:
+    """Decode UTF-8 text a block at a time
+
+    Blocks end at a paragraph or line break where there is one, so
+    joining them gives back the whole text.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors)
+    carry = ""
+    for data in iter_blocks(file, block_size):
+        text = carry + decoder.decode(data)
+        cut = -1
+        for boundary in ("\n\n", "\n"):
+            cut = text.rfind(boundary, len(text) // 2)
+            if cut != -1:
+                break
+        if cut == -1:
+            cut = len(text)
+        carry = text[cut:]
+        yield text[:cut]
+    text = carry + decoder.decode(b"", final=True)
+    if text:
+        yield text
 
 
 class FileHandler(ABC):
+    # Streaming handlers produce ready-made chunks while reading the file;
+    # callers should index iter_chunks() output instead of extract_text()
+    streaming = False
+    # Vision handlers describe images through the LLM service, so they are
+    # extracted in-process when one is given
+    vision = False
+    # Record handlers stream many small records, which callers join into
+    # chunks of up to the chunk size
+    records = False
 
     @abstractmethod
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
         pass
 
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
+        yield self.extract_text(file, llm_service)
+
     def _get_image_summary(self, image: Image.Image, llm_service) -> str:
         buffered = io.BytesIO()
         image.save(buffered, format=image.format or 'PNG')
@@ -27,12 +69,16 @@ class FileHandler(ABC):
 
 
 class PDFHandler(FileHandler):
+    vision = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
         try:
-            # Create a bytes buffer from the file
-            file_content = file.read()
-            pdf_document = fitz.open(stream=file_content, filetype="pdf")
+            # Spooled files are opened by path so pages are read on demand
+            path = local_path(file)
+            if path is not None:
+                pdf_document = fitz.open(path, filetype="pdf")
+            else:
+                pdf_document = fitz.open(stream=file.read(), filetype="pdf")
             text_parts = []
             image_summaries = []
 
@@ -68,8 +114,9 @@ class PDFHandler(FileHandler):
                             )
                             continue
 
-            # Memory efficient text combination
-            text = "\n\n".join(text_parts)
+            # Memory efficient text combination; page breaks let the
+            # chunker split on page boundaries
+            text = PAGE_BREAK.join(text_parts)
 
             # Combine text and image summaries if any exist
             if image_summaries:
@@ -86,6 +133,7 @@ class PDFHandler(FileHandler):
 
 
 class DocxHandler(FileHandler):
+    vision = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
         doc = docx.Document(file)
@@ -117,6 +165,7 @@ class DocxHandler(FileHandler):
 
 
 class ImageHandler(FileHandler):
+    vision = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
         try:
@@ -129,65 +178,126 @@ class ImageHandler(FileHandler):
 
 
 class JSONHandler(FileHandler):
+    streaming = True
+    records = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
-        return json.dumps(json.load(file), indent=2)
+        return "\n\n".join(self.iter_chunks(file, llm_service))
+
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
+        """Yield one block of path=value lines per record"""
+        return iter_json_records(file)
 
 
 class XMLHandler(FileHandler):
+    streaming = True
+    records = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
-        tree = ET.parse(file)
-        return ET.tostring(tree.getroot(), encoding='unicode', method='xml')
+        return "\n\n".join(self.iter_chunks(file, llm_service))
+
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
+        """Yield the text of each top-level element without its markup"""
+        return iter_xml_records(file)
 
 
 class CSVHandler(FileHandler):
+    streaming = True
+
+    def __init__(self,
+                 read_chunksize: int = CSV_READ_CHUNKSIZE,
+                 rows_per_chunk: int = CSV_ROWS_PER_CHUNK,
+                 type_columns: bool = CSV_TYPE_COLUMNS):
+        self.read_chunksize = read_chunksize
+        self.rows_per_chunk = rows_per_chunk
+        self.type_columns = type_columns
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
-        df = pd.read_csv(file)
-        return df.to_string()
+        return "\n\n".join(self.iter_chunks(file, llm_service))
+
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
+        """Yield row groups, each prefixed with the header for context"""
+        # Read as strings so values are emitted exactly as written and
+        # memory stays bounded by read_chunksize rows
+        reader = pd.read_csv(file,
+                             chunksize=self.read_chunksize,
+                             dtype=str,
+                             keep_default_na=False)
+        header = None
+        for frame in reader:
+            if header is None:
+                header = self._build_header(frame)
+            for start in range(0, len(frame), self.rows_per_chunk):
+                rows = frame.iloc[start:start + self.rows_per_chunk]
+                yield header + rows.to_csv(index=False, header=False)
+
+    def _build_header(self, frame: pd.DataFrame) -> str:
+        columns = [str(column) for column in frame.columns]
+        lines = []
+        if self.type_columns:
+            types = self._infer_column_types(frame)
+            lines.append("Columns: " + ", ".join(
+                f"{column} ({types[column]})" for column in columns))
+        lines.append(",".join(columns))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _infer_column_types(frame: pd.DataFrame) -> Dict[str, str]:
+        """Infer column types from the first row group"""
+        types = {}
+        for column in frame.columns:
+            values = frame[column][frame[column] != ""]
+            numeric = pd.to_numeric(values, errors="coerce")
+            if len(values) and numeric.notna().all():
+                types[str(column)] = "integer" if (numeric % 1
+                                                   == 0).all() else "number"
+            else:
+                types[str(column)] = "text"
+        return types
 
 
 class MarkdownHandler(FileHandler):
+    streaming = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
-        content = file.read().decode('utf-8')
-        # Convert markdown to HTML
-        html = markdown.markdown(content)
-        # Remove HTML tags to get clean text
-        soup = BeautifulSoup(html, 'html.parser')
-        return soup.get_text(separator='\n\n')
+        return "\n\n".join(self.iter_chunks(file, llm_service))
+
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
+        """Yield the plain text of each block of paragraphs"""
+        for block in iter_text_blocks(file):
+            # Convert markdown to HTML, then remove the tags
+            yield parse_html(markdown.markdown(block)).text
 
 
 class TextHandler(FileHandler):
+    streaming = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
-        return file.read().decode('utf-8')
+        return "".join(self.iter_chunks(file, llm_service))
+
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
+        return iter_text_blocks(file)
 
 
 class HTMLHandler(FileHandler):
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
-        content = file.read().decode('utf-8')
-        soup = BeautifulSoup(content, 'html.parser')
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        # Get text
-        text = soup.get_text(separator='\n\n')
-        # Remove extra whitespace and empty lines
-        text = re.sub(r'\n\s*\n', '\n\n', text.strip())
-        return text
+        # Script and style elements are dropped; paragraphs are separated
+        # by blank lines
+        return parse_html(file.read()).text
 
 
 class RTFHandler(FileHandler):
+    streaming = True
 
     def extract_text(self, file: BinaryIO, llm_service=None) -> str:
+        return "".join(self.iter_chunks(file, llm_service)).strip()
+
+    def iter_chunks(self, file: BinaryIO, llm_service=None) -> Iterator[str]:
         # Simple RTF text extraction
-        content = file.read().decode('utf-8', errors='ignore')
-        # Remove RTF formatting
-        text = re.sub(r'[\\\{\}]|\\\w+|\{.*?\}', '', content)
-        return text.strip()
+        for content in iter_text_blocks(file, errors='ignore'):
+            # Remove RTF formatting
+            yield re.sub(r'[\\\{\}]|\\\w+|\{.*?\}', '', content)
 
 
 class FileHandlerFactory:
@@ -213,3 +323,15 @@ class FileHandlerFactory:
         if not handler:
             raise ValueError(f"Unsupported file type: {file_type}")
         return handler
+
+
+def extract_chunks(file_type: str, filename: str, payload: Payload,
+                   chunk_size: int, chunk_overlap: int,
+                   encoding_name: str) -> List[str]:
+    """Process pool entry point: extract a file without the LLM service
+    and split it, so only the chunks travel back to the parent"""
+    with open_payload(payload, filename) as file:
+        text = FileHandlerFactory.get_handler(file_type).extract_text(file)
+    # Already running in a pool worker, so split in-process
+    return TextChunker(chunk_size, chunk_overlap, encoding_name,
+                       max_workers=1).split_text(text)
@@ -0,0 +1,126 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Union
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+CONTENT_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+CONTENT_CLASS_PATTERN = re.compile(r'content|main|article')
+
+# Elements dropped before extraction
+DOCUMENT_REMOVED_TAGS = ('script', 'style')
+PAGE_REMOVED_TAGS = ('script', 'style', 'nav', 'footer', 'iframe')
+
+# Main content containers, in order of preference
+_CONTAINERS = ('main', 'article', 'content_div')
+
+_local = threading.local()
+
+
+@dataclass
+class ExtractedPage:
+    title: str = ''
+    description: str = ''
+    # All visible text, one text node per paragraph
+    text: str = ''
+    # Paragraphs and headings of the main content area (or the whole page)
+    blocks: List[str] = field(default_factory=list)
+    # Absolute URLs of every anchor, unfiltered
+    links: List[str] = field(default_factory=list)
+
+
+def _get_parser() -> lxml.html.HTMLParser:
+    # lxml parsers must not be shared between threads
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = lxml.html.HTMLParser(encoding='utf-8',
+                                      remove_comments=True,
+                                      remove_pis=True)
+        _local.parser = parser
+    return parser
+
+
+def _container_kind(element) -> Optional[str]:
+    if element.tag in ('main', 'article'):
+        return element.tag
+    if element.tag == 'div' and CONTENT_CLASS_PATTERN.search(
+            element.get('class', '')):
+        return 'content_div'
+    return None
+
+
+def parse_html(html: Union[str, bytes],
+               base_url: Optional[str] = None,
+               remove_tags: Iterable[str] = DOCUMENT_REMOVED_TAGS,
+               collect_text: bool = True) -> ExtractedPage:
+    """Parse a page once and extract text, main content, links and metadata
+
+    Uses lxml's C parser and a single walk over the tree. Byte input is
+    decoded as UTF-8.
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    page = ExtractedPage()
+    if not html.strip():
+        return page
+
+    try:
+        root = lxml.html.document_fromstring(html, parser=_get_parser())
+    except etree.ParserError:
+        return page
+    etree.strip_elements(root, *remove_tags, with_tail=False)
+
+    text_parts = []
+    all_blocks = []
+    # First container of each kind and its blocks; open ones collect blocks
+    captured = {}
+    open_containers = {}
+    og_description = ''
+
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            if collect_text and element.text and element.text.strip():
+                text_parts.append(element.text.strip())
+            kind = _container_kind(element)
+            if kind and kind not in captured:
+                captured[kind] = []
+                open_containers[kind] = element
+            if tag == 'a':
+                href = element.get('href')
+                if href:
+                    page.links.append(
+                        urljoin(base_url, href) if base_url else href)
+            elif tag == 'title' and not page.title:
+                page.title = element.text_content().strip()
+            elif tag == 'meta':
+                if element.get('name') == 'description' and \
+                        not page.description:
+                    page.description = element.get('content', '').strip()
+                elif element.get('property') == 'og:description' and \
+                        not og_description:
+                    og_description = element.get('content', '').strip()
+            continue
+
+        if tag in CONTENT_TAGS:
+            block = element.text_content()
+            all_blocks.append(block)
+            for kind in open_containers:
+                captured[kind].append(block)
+        for kind, container in list(open_containers.items()):
+            if container is element:
+                del open_containers[kind]
+        if collect_text and element.tail and element.tail.strip():
+            text_parts.append(element.tail.strip())
+
+    page.description = page.description or og_description
+    page.text = '\n\n'.join(text_parts)
+    page.blocks = all_blocks
+    for kind in _CONTAINERS:
+        if kind in captured:
+            page.blocks = captured[kind]
+            break
+    return page
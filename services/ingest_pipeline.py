@@ -0,0 +1,603 @@
+"""Staged ingest: extract and chunk, embed, persist.
+
+Stages run concurrently and hand work over through bounded queues, so
+parsing the next file overlaps with embedding and writing the last one.
+Extraction and chunking of non-vision files run in the shared process
+pool; files above SPOOL_THRESHOLD_BYTES are spilled to disk on submit and
+parsed from there. Embedding (network-bound) runs on a thread pool and
+Chroma writes on a single thread. A full queue blocks the stage feeding
+it, which in turn blocks submit_*(), so memory stays bounded however fast
+sources arrive.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.documents import Document
+
+from services.chunking import get_process_pool
+from services.file_handler import (FileHandler, FileHandlerFactory,
+                                   extract_chunks)
+from services.ingest_registry import get_ingest_registry
+from services.spooling import (Payload, SpooledFile, content_hash,
+                               open_payload, payload_size, release, spool)
+from services.tracing import Span, current_span, span, start_span
+from services.vector_store import TenantQuotaExceeded
+from utils.constants import (CHUNK_WORKERS, DEFAULT_TENANT, INDEX_BATCH_SIZE,
+                             PIPELINE_EMBED_WORKERS,
+                             PIPELINE_INLINE_EXTRACT_BYTES,
+                             PIPELINE_QUEUE_SIZE, SUMMARY_MAX_INPUT_TOKENS)
+
+STAGES = ('extract', 'embed', 'persist', 'summarize')
+
+
+@dataclass
+class IngestReport:
+    """Filled in when a pipeline closes, for the caller that ran it"""
+    # Stage timings per source (IngestSource.timings())
+    files: List[Dict] = field(default_factory=list)
+    # Per-stage statistics (IngestPipeline.stats())
+    stages: List[Dict] = field(default_factory=list)
+
+
+@dataclass
+class IngestSource:
+    """One file or page moving through the pipeline"""
+    name: str
+    metadata: Dict
+    tenant_id: str = DEFAULT_TENANT
+    document_id: Optional[int] = None
+    # SHA-256 of a file's contents
+    content_hash: Optional[str] = None
+    # Contents the tenant already had; nothing was extracted or written
+    duplicate: bool = False
+    # Chunks written to the vector store; for a duplicate, those the
+    # registry recorded for the original (0 if it is in this same run)
+    chunks: int = 0
+    error: Optional[Exception] = None
+    # Leading chunks, kept for the document summary
+    sample: List[str] = field(default_factory=list)
+    # Batches extracted but not yet written or dropped
+    pending: int = 0
+    extracted: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+    # Open from submission until done; stage spans are its children
+    span: Optional[Span] = None
+    # Busy seconds per stage, excluding time blocked by backpressure
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+
+    def timings(self) -> Dict:
+        row = {
+            "source": self.name,
+            "chunks": self.chunks,
+            "duplicate": self.duplicate,
+            "error": str(self.error) if self.error is not None else None,
+        }
+        for stage in STAGES:
+            row[f"{stage}_s"] = round(self.stage_seconds.get(stage, 0.0), 3)
+        row["total_s"] = round(self.span.duration or 0.0,
+                               3) if self.span is not None else None
+        row["trace_id"] = self.span.trace_id if self.span else None
+        return row
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items: int = 0
+    chunks: int = 0
+    # Time spent working, and waiting on a full downstream queue
+    busy_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+
+    def as_dict(self, elapsed: float) -> Dict:
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "chunks": self.chunks,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            # What the stage sustains with every worker busy; the lowest
+            # is the bottleneck
+            "capacity_chunks_per_sec": round(
+                self.chunks * self.workers / self.busy_seconds, 1)
+            if self.busy_seconds else 0.0,
+            "utilization": round(
+                self.busy_seconds / (self.workers * elapsed), 3)
+            if elapsed else 0.0,
+        }
+
+
+class IngestPipeline:
+    """Feeds files and pages through extract → embed → persist
+
+    Use as a context manager, or call close() to drain the stages. Each
+    submitted source is returned as an IngestSource whose done event is
+    set once it is written (and summarized, with a database). A report
+    passed in is filled in on close.
+    """
+
+    def __init__(self,
+                 vector_store,
+                 llm_service=None,
+                 database=None,
+                 extract_workers: int = CHUNK_WORKERS,
+                 embed_workers: int = PIPELINE_EMBED_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 batch_size: int = INDEX_BATCH_SIZE,
+                 report: Optional[IngestReport] = None):
+        self.vector_store = vector_store
+        self.llm_service = llm_service
+        self.database = database
+        self.chunker = vector_store.text_splitter
+        self.batch_size = batch_size
+        self.report = report
+        self.sources: List[IngestSource] = []
+        self.quota_error: Optional[TenantQuotaExceeded] = None
+        self.registry = get_ingest_registry()
+        # Files submitted to this pipeline, by tenant and content hash
+        self._submitted: Dict[Tuple[str, str], IngestSource] = {}
+
+        self._extract_queue = queue.Queue(queue_size)
+        self._embed_queue = queue.Queue(queue_size)
+        self._persist_queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._started = time.perf_counter()
+        self._stats = {
+            'extract': StageStats('extract', extract_workers),
+            'embed': StageStats('embed', embed_workers),
+            'persist': StageStats('persist', 1),
+            'summarize': StageStats('summarize', 1),
+        }
+        self._summaries = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ingest-summarize"
+        ) if database is not None else None
+        self._extract_threads = self._start('extract', self._extract_worker,
+                                            extract_workers)
+        self._embed_threads = self._start('embed', self._embed_worker,
+                                          embed_workers)
+        self._persist_threads = self._start('persist', self._persist_worker,
+                                            1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _start(self, stage: str, target,
+               workers: int) -> List[threading.Thread]:
+        threads = [
+            threading.Thread(target=target,
+                             name=f"ingest-{stage}-{i}",
+                             daemon=True) for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _record(self,
+                stage: str,
+                source: IngestSource,
+                chunks: int,
+                busy: float,
+                blocked: float = 0.0):
+        with self._lock:
+            source.stage_seconds[stage] = source.stage_seconds.get(
+                stage, 0.0) + busy
+            stats = self._stats[stage]
+            stats.items += 1
+            stats.chunks += chunks
+            stats.busy_seconds += busy
+            stats.blocked_seconds += blocked
+
+    @staticmethod
+    def _put(stage_queue: queue.Queue, item) -> float:
+        """Hand item downstream; returns the time spent blocked"""
+        start = time.perf_counter()
+        stage_queue.put(item)
+        return time.perf_counter() - start
+
+    def _fail(self, source: IngestSource, error: Exception):
+        with self._lock:
+            if source.error is None:
+                source.error = error
+                logging.error(f"Error ingesting {source.name}: {str(error)}")
+            if isinstance(error, TenantQuotaExceeded) and \
+                    self.quota_error is None:
+                self.quota_error = error
+
+    def raise_for_quota(self):
+        """Stop submitting once a tenant has run out of quota"""
+        if self.quota_error is not None:
+            raise self.quota_error
+
+    def _submit(self, source: IngestSource, handler: Optional[FileHandler],
+                payload) -> IngestSource:
+        if self._closed:
+            raise RuntimeError("Ingest pipeline is closed")
+        self.raise_for_quota()
+        source.span = start_span("ingest.source",
+                                 source=source.name,
+                                 tenant_id=source.tenant_id,
+                                 file_type=source.metadata.get("file_type"))
+        self.sources.append(source)
+        self._put(self._extract_queue, (source, handler, payload))
+        return source
+
+    def submit_file(self,
+                    file: Union[BinaryIO, SpooledFile],
+                    tenant_id: str = DEFAULT_TENANT) -> IngestSource:
+        """Queue a file for ingestion; blocks while the pipeline is full
+
+        Large files are spooled to disk first, so the queues hold paths
+        rather than contents. Contents the tenant has already indexed are
+        not queued; the returned source is marked duplicate and done.
+        """
+        file_type = file.name.split('.')[-1].lower()
+        handler = FileHandlerFactory.get_handler(file_type)
+        payload = file if isinstance(file, SpooledFile) else spool(file)
+        try:
+            digest = None
+            if self.registry is not None:
+                digest = content_hash(payload)
+                duplicate = self._find_duplicate(file.name, digest,
+                                                 tenant_id)
+                if duplicate is not None:
+                    release(payload)
+                    return duplicate
+            return self._submit_payload(file.name, file_type, handler,
+                                        payload, tenant_id, digest)
+        except BaseException:
+            release(payload)
+            raise
+
+    def _find_duplicate(self, name: str, digest: str,
+                        tenant_id: str) -> Optional[IngestSource]:
+        """A finished source standing in for contents already ingested"""
+        original = self._submitted.get((tenant_id, digest))
+        entry = self.registry.lookup(tenant_id,
+                                     digest) if original is None else None
+        if original is None and entry is None:
+            return None
+        metadata = {
+            "filename": name,
+            "tenant_id": tenant_id,
+            "content_hash": digest
+        }
+        source = IngestSource(name,
+                              metadata,
+                              tenant_id,
+                              content_hash=digest,
+                              duplicate=True)
+        if entry is not None:
+            source.chunks = entry["chunks"]
+            source.document_id = entry["document_id"]
+        logging.info(f"Skipping {name}: same contents as "
+                     f"{entry['filename'] if entry else original.name}")
+        source.extracted = True
+        source.span = start_span("ingest.source",
+                                 source=name,
+                                 tenant_id=tenant_id,
+                                 duplicate=True)
+        self._done(source)
+        self.sources.append(source)
+        return source
+
+    def _submit_payload(self,
+                        name: str,
+                        file_type: str,
+                        handler: FileHandler,
+                        payload: Payload,
+                        tenant_id: str,
+                        digest: Optional[str] = None) -> IngestSource:
+        metadata = {
+            "filename": name,
+            "file_type": file_type,
+            "created_at": time.time(),
+            "tenant_id": tenant_id
+        }
+        if digest is not None:
+            metadata["content_hash"] = digest
+        source = IngestSource(name, metadata, tenant_id, content_hash=digest)
+        if digest is not None:
+            self._submitted[(tenant_id, digest)] = source
+        if self.database is not None:
+            source.document_id = self.database.save_document(
+                name, file_type, None, metadata, status='processing')
+            metadata["document_id"] = source.document_id
+        return self._submit(source, handler, payload)
+
+    def submit_text(self,
+                    name: str,
+                    text: str,
+                    metadata: Dict,
+                    tenant_id: str = DEFAULT_TENANT) -> IngestSource:
+        """Queue already extracted text, such as a crawled page"""
+        return self._submit(IngestSource(name, metadata, tenant_id), None,
+                            text)
+
+    def wait(self):
+        """Block until every source submitted so far is done"""
+        for source in list(self.sources):
+            source.done.wait()
+
+    def _extract_in_pool(self, source: IngestSource, handler: FileHandler,
+                         payload: Payload) -> List[str]:
+        file_type = source.metadata["file_type"]
+        try:
+            future = get_process_pool(self.chunker.max_workers).submit(
+                extract_chunks, file_type, source.name, payload,
+                self.chunker.chunk_size, self.chunker.chunk_overlap,
+                self.chunker.encoding_name)
+            return future.result()
+        except BrokenProcessPool as e:
+            logging.warning(
+                f"Process pool unavailable, extracting in-process: {str(e)}")
+            return self._extract_in_thread(source, handler, payload, None)
+
+    def _extract_in_thread(self, source: IngestSource, handler: FileHandler,
+                           payload: Payload, llm_service) -> List[str]:
+        with open_payload(payload, source.name) as file:
+            with span("parse", handler=type(handler).__name__):
+                text = handler.extract_text(file, llm_service)
+        with span("split", chars=len(text)):
+            return self.chunker.split_text(text)
+
+    def _iter_streamed(self, source: IngestSource, handler: FileHandler,
+                       payload: Payload) -> Iterator[str]:
+        chunk_size = self.chunker.chunk_size
+        # Consecutive small records waiting to be joined into one chunk
+        records: List[str] = []
+        record_tokens = 0
+        with open_payload(payload, source.name) as file:
+            for chunk in handler.iter_chunks(file, self.llm_service):
+                # Oversized records and text blocks are re-split; counting
+                # the tokens of a multi-megabyte block would cost as much
+                # as splitting it
+                tokens = None if len(chunk) > chunk_size * 8 else \
+                    self.chunker.count_tokens(chunk)
+                if tokens is None or tokens > chunk_size:
+                    if records:
+                        yield "\n\n".join(records)
+                        records, record_tokens = [], 0
+                    yield from self.chunker.split_text(chunk)
+                elif handler.records:
+                    # One more token for the separator
+                    if records and record_tokens + tokens + 1 > chunk_size:
+                        yield "\n\n".join(records)
+                        records, record_tokens = [], 0
+                    records.append(chunk)
+                    record_tokens += tokens + 1
+                else:
+                    yield chunk
+        if records:
+            yield "\n\n".join(records)
+
+    def _iter_chunks(self, source: IngestSource,
+                     handler: Optional[FileHandler], payload) -> Iterator[str]:
+        extract_span = current_span()
+        if handler is None:
+            extract_span.set(mode="text")
+            with span("split", chars=len(payload)):
+                return iter(self.chunker.split_text(payload))
+        if handler.streaming:
+            extract_span.set(mode="stream")
+            return self._iter_streamed(source, handler, payload)
+        if handler.vision and self.llm_service is not None:
+            # Image descriptions need the LLM service, which stays here
+            extract_span.set(mode="vision")
+            return iter(
+                self._extract_in_thread(source, handler, payload,
+                                        self.llm_service))
+        if payload_size(payload) < PIPELINE_INLINE_EXTRACT_BYTES:
+            extract_span.set(mode="thread")
+            return iter(
+                self._extract_in_thread(source, handler, payload, None))
+        extract_span.set(mode="process_pool")
+        return iter(self._extract_in_pool(source, handler, payload))
+
+    def _iter_batches(self, source: IngestSource,
+                      handler: Optional[FileHandler],
+                      payload) -> Iterator[List[Document]]:
+        keep_sample = self.database is not None
+        sampled_chars = 0
+        chunk_index = 0
+        batch = []
+        for chunk in self._iter_chunks(source, handler, payload):
+            if not chunk.strip():
+                continue
+            # ~4 characters per token
+            if keep_sample and sampled_chars < SUMMARY_MAX_INPUT_TOKENS * 4:
+                source.sample.append(chunk)
+                sampled_chars += len(chunk)
+            batch.append(
+                Document(page_content=chunk,
+                         metadata={
+                             **source.metadata, "chunk_index": chunk_index
+                         }))
+            chunk_index += 1
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _extract_worker(self):
+        while True:
+            item = self._extract_queue.get()
+            if item is None:
+                return
+            source, handler, payload = item
+            start = time.perf_counter()
+            blocked = 0.0
+            chunks = 0
+            with span("extract", parent=source.span) as current:
+                try:
+                    for docs in self._iter_batches(source, handler, payload):
+                        with self._lock:
+                            source.pending += 1
+                        blocked += self._put(self._embed_queue,
+                                             (source, docs))
+                        chunks += len(docs)
+                except Exception as e:
+                    self._fail(source, e)
+                    current.fail(e)
+                finally:
+                    release(payload)
+                current.set(chunks=chunks, blocked_seconds=round(blocked, 3))
+            # End of source marker
+            blocked += self._put(self._embed_queue, (source, None))
+            self._record('extract', source, chunks,
+                         time.perf_counter() - start - blocked, blocked)
+
+    def _embed_worker(self):
+        while True:
+            item = self._embed_queue.get()
+            if item is None:
+                return
+            source, docs = item
+            embeddings = None
+            start = time.perf_counter()
+            if docs is not None and source.error is None:
+                with span("embed", parent=source.span,
+                          chunks=len(docs)) as current:
+                    try:
+                        embeddings = self.vector_store.embed_documents(docs)
+                    except Exception as e:
+                        self._fail(source, e)
+                        current.fail(e)
+            busy = time.perf_counter() - start
+            blocked = self._put(self._persist_queue,
+                                (source, docs, embeddings))
+            if docs is not None:
+                self._record('embed', source, len(docs), busy, blocked)
+
+    def _persist_worker(self):
+        while True:
+            item = self._persist_queue.get()
+            if item is None:
+                return
+            source, docs, embeddings = item
+            start = time.perf_counter()
+            if docs is None:
+                source.extracted = True
+            else:
+                if embeddings is not None and source.error is None:
+                    with span("persist", parent=source.span,
+                              chunks=len(docs)) as current:
+                        try:
+                            self.vector_store.write_embedded(
+                                docs, embeddings, source.tenant_id)
+                            source.chunks += len(docs)
+                        except Exception as e:
+                            self._fail(source, e)
+                            current.fail(e)
+                with self._lock:
+                    source.pending -= 1
+            # Batches can overtake the end marker between embed workers
+            with self._lock:
+                finished = source.extracted and source.pending == 0
+            if finished:
+                self._finish(source)
+            if docs is not None:
+                self._record('persist', source, len(docs),
+                             time.perf_counter() - start)
+
+    def _finish(self, source: IngestSource):
+        if source.error is None and source.chunks:
+            with span("flush", parent=source.span) as current:
+                try:
+                    self.vector_store.persist(source.tenant_id)
+                except Exception as e:
+                    self._fail(source, e)
+                    current.fail(e)
+        if self._summaries is not None and source.document_id is not None:
+            self._summaries.submit(self._complete_document, source)
+        else:
+            self._done(source)
+
+    def _done(self, source: IngestSource):
+        # Registered only once its document row is complete too, so a
+        # failed file can be ingested again
+        if source.error is None and source.content_hash is not None and \
+                not source.duplicate:
+            try:
+                self.registry.record(source.tenant_id, source.content_hash,
+                                     source.name, source.chunks,
+                                     source.document_id)
+            except Exception as e:
+                logging.error(
+                    f"Error registering {source.name} as ingested: {str(e)}")
+        source.span.set(chunks=source.chunks)
+        source.span.end(source.error)
+        source.done.set()
+
+    def _complete_document(self, source: IngestSource):
+        """Precompute the summary so summary queries skip retrieval"""
+        start = time.perf_counter()
+        with span("summarize", parent=source.span) as current:
+            try:
+                if source.error is None:
+                    text = "\n\n".join(source.sample)
+                    summary = self.llm_service.generate_summary(
+                        text) if text.strip() else None
+                    self.database.complete_document(source.document_id,
+                                                    summary, source.chunks)
+            except Exception as e:
+                self._fail(source, e)
+                current.fail(e)
+        if source.error is not None:
+            try:
+                self.database.update_processing_status(
+                    source.document_id, 0, 'failed')
+            except Exception as e:
+                logging.error(f"Error marking {source.name} failed: {str(e)}")
+        source.sample = []
+        self._record('summarize', source, source.chunks,
+                     time.perf_counter() - start)
+        self._done(source)
+
+    def close(self) -> List[IngestSource]:
+        """Drain every stage and stop the workers"""
+        if self._closed:
+            return self.sources
+        self._closed = True
+        for stage_queue, threads in (
+            (self._extract_queue, self._extract_threads),
+            (self._embed_queue, self._embed_threads),
+            (self._persist_queue, self._persist_threads),
+        ):
+            for _ in threads:
+                stage_queue.put(None)
+            for thread in threads:
+                thread.join()
+        if self._summaries is not None:
+            self._summaries.shutdown(wait=True)
+
+        stages = self.stats()
+        if self.report is not None:
+            self.report.stages = stages
+            self.report.files = [source.timings() for source in self.sources]
+        for row in stages:
+            logging.info(f"Ingest stage {row['stage']}: {row['chunks']} "
+                         f"chunks, {row['busy_seconds']}s busy, "
+                         f"{row['blocked_seconds']}s blocked")
+        return self.sources
+
+    def stats(self) -> List[Dict]:
+        """Per-stage throughput and time blocked by backpressure"""
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            return [
+                self._stats[stage].as_dict(elapsed) for stage in STAGES
+                if stage != 'summarize' or self._summaries is not None
+            ]
@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.constants import (INGEST_DEDUPLICATION, INGEST_REGISTRY_PATH,
+                             VECTOR_BACKEND)
+
+REGISTRY_FIELDS = ('tenant_id', 'content_hash', 'filename', 'chunks',
+                   'document_id', 'ingested_at')
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class IngestRegistry:
+    """SQLite-backed record of the file contents each tenant has indexed
+
+    Files are keyed by the SHA-256 of their contents, so the same file
+    uploaded again (under any name) is recognised before it is extracted.
+    The file is local to this node, like the Chroma directory it
+    describes; with VECTOR_BACKEND=pgvector, PgIngestRegistry is used.
+    """
+
+    def __init__(self, path: str = INGEST_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    tenant_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    document_id INTEGER,
+                    ingested_at REAL NOT NULL,
+                    PRIMARY KEY (tenant_id, content_hash)
+                );
+            """)
+            self.conn.commit()
+
+    def lookup(self, tenant_id: str, content_hash: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(REGISTRY_FIELDS)} FROM ingested_files "
+                "WHERE tenant_id = ? AND content_hash = ?",
+                (tenant_id, content_hash)).fetchone()
+        return dict(zip(REGISTRY_FIELDS, row)) if row is not None else None
+
+    def record(self,
+               tenant_id: str,
+               content_hash: str,
+               filename: str,
+               chunks: int,
+               document_id: Optional[int] = None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ingested_files (tenant_id, "
+                "content_hash, filename, chunks, document_id, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tenant_id, content_hash, filename, chunks, document_id,
+                 time.time()))
+            self.conn.commit()
+
+    def forget_tenant(self, tenant_id: str):
+        """Drop a tenant's entries, e.g. when its index is cleared"""
+        with self._lock:
+            self.conn.execute("DELETE FROM ingested_files WHERE tenant_id = ?",
+                              (tenant_id, ))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class PgIngestRegistry:
+    """The same record in PostgreSQL, beside the pgvector chunks
+
+    Every node sharing the chunks table shares this one, so a file
+    indexed through one node is recognised by all of them.
+    """
+
+    def __init__(self, pool):
+        # Owned by the pgvector store
+        self.pool = pool
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    tenant_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    document_id INTEGER,
+                    ingested_at DOUBLE PRECISION NOT NULL,
+                    PRIMARY KEY (tenant_id, content_hash)
+                )
+            """)
+
+    def lookup(self, tenant_id: str, content_hash: str) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(REGISTRY_FIELDS)} FROM ingested_files "
+                "WHERE tenant_id = %s AND content_hash = %s",
+                (tenant_id, content_hash)).fetchone()
+        return dict(zip(REGISTRY_FIELDS, row)) if row is not None else None
+
+    def record(self,
+               tenant_id: str,
+               content_hash: str,
+               filename: str,
+               chunks: int,
+               document_id: Optional[int] = None):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO ingested_files (tenant_id, content_hash, "
+                "filename, chunks, document_id, ingested_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s) "
+                "ON CONFLICT (tenant_id, content_hash) DO UPDATE SET "
+                "filename = EXCLUDED.filename, chunks = EXCLUDED.chunks, "
+                "document_id = EXCLUDED.document_id, "
+                "ingested_at = EXCLUDED.ingested_at",
+                (tenant_id, content_hash, filename, chunks, document_id,
+                 time.time()))
+
+    def forget_tenant(self, tenant_id: str):
+        """Drop a tenant's entries, e.g. when its index is cleared"""
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM ingested_files WHERE tenant_id = %s",
+                         (tenant_id, ))
+
+    def close(self):
+        pass
+
+
+def get_ingest_registry():
+    """Return the shared registry, or None with deduplication disabled
+
+    The registry lives with the vector store: a local SQLite file for
+    Chroma, a table in the shared database for pgvector.
+    """
+    global _registry
+    if not INGEST_DEDUPLICATION:
+        return None
+    with _registry_lock:
+        if _registry is None:
+            if VECTOR_BACKEND == 'pgvector':
+                from services.pgvector_store import PgVectorStoreService
+                _registry = PgIngestRegistry(PgVectorStoreService().pool)
+            else:
+                _registry = IngestRegistry()
+        return _registry
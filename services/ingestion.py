@@ -0,0 +1,80 @@
+import zipfile
+from typing import BinaryIO, Dict, List, Optional, Union
+
+from services.ingest_pipeline import (IngestPipeline, IngestReport,
+                                     IngestSource)
+from services.spooling import SpooledFile
+from services.tracing import span
+from services.web_scraper import WebScraperService
+from utils.constants import CRAWL_MAX_PAGES, DEFAULT_TENANT
+
+
+def _raise_first_error(sources: List[IngestSource]):
+    for source in sources:
+        if source.error is not None:
+            raise source.error
+
+
+def process_single_file(file: Union[BinaryIO, SpooledFile],
+                        vector_store,
+                        llm_service,
+                        database=None,
+                        tenant_id: str = DEFAULT_TENANT,
+                        report: Optional[IngestReport] = None) -> int:
+    """Extract, index and summarize one file; returns the chunks indexed
+
+    A report passed in receives the file's stage timings, also on failure.
+    """
+    with span("ingest.file", source=file.name, tenant_id=tenant_id), \
+            IngestPipeline(vector_store, llm_service, database,
+                           report=report) as pipeline:
+        source = pipeline.submit_file(file, tenant_id)
+    _raise_first_error([source])
+    return source.chunks
+
+
+def process_zip(file: BinaryIO,
+                vector_store,
+                llm_service,
+                database=None,
+                tenant_id: str = DEFAULT_TENANT,
+                report: Optional[IngestReport] = None) -> Dict[str, int]:
+    """Process every file in a ZIP archive; returns chunks per member
+
+    Members overlap in the ingest pipeline; the first failure is raised
+    once the others are done. A report passed in receives each member's
+    stage timings.
+    """
+    with span("ingest.zip", source=getattr(file, "name", None),
+              tenant_id=tenant_id), \
+            IngestPipeline(vector_store, llm_service, database,
+                           report=report) as pipeline:
+        with zipfile.ZipFile(file) as z:
+            for filename in z.namelist():
+                if filename.endswith('/'):  # Skip directories
+                    continue
+                # Members are read straight from the archive; large
+                # ones are spooled to disk rather than memory
+                with z.open(filename) as f:
+                    pipeline.submit_file(f, tenant_id)
+    _raise_first_error(pipeline.sources)
+    return {source.name: source.chunks for source in pipeline.sources}
+
+
+def process_url(url: str,
+                vector_store,
+                llm_service,
+                crawl_id: Optional[str] = None,
+                tenant_id: str = DEFAULT_TENANT,
+                max_pages: int = CRAWL_MAX_PAGES) -> str:
+    """Crawl a site into the vector store; returns the crawl ID
+
+    max_pages bounds the pages fetched by this run, including a resumed
+    one.
+    """
+    web_scraper = WebScraperService(max_pages=max_pages)
+    web_scraper.crawl_website(url, vector_store, llm_service, crawl_id,
+                              tenant_id)
+
+    # Checkpointed crawls can be resumed with this ID
+    return web_scraper.crawl_id
@@ -0,0 +1,145 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from utils.constants import DEFAULT_TENANT, JOB_STORE_PATH
+
+JOB_FIELDS = ('id', 'tenant_id', 'kind', 'source', 'status', 'result',
+              'error', 'pid', 'created_at', 'updated_at')
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed status of background ingest jobs
+
+    The database file is shared, so any API worker process can report on
+    a job started by another. Jobs are owned by the process that created
+    them; those whose owner has exited are reported as failed, which
+    assumes the workers sharing the file run on one host.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    tenant_id TEXT NOT NULL DEFAULT 'default',
+                    kind TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    result TEXT,
+                    error TEXT,
+                    pid INTEGER,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_tenant_created_at
+                    ON jobs (tenant_id, created_at);
+            """)
+            self.conn.commit()
+
+    def create_job(self,
+                   kind: str,
+                   source: str,
+                   tenant_id: str = DEFAULT_TENANT) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, tenant_id, kind, source, pid, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tenant_id, kind, source, os.getpid(), now, now))
+            self.conn.commit()
+        return job_id
+
+    def update_job(self,
+                   job_id: str,
+                   status: str,
+                   result: Any = None,
+                   error: Optional[str] = None):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, "
+                "updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id))
+            self.conn.commit()
+
+    def _to_dict(self, row) -> Dict:
+        job = dict(zip(JOB_FIELDS, row))
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def get_job(self,
+                job_id: str,
+                tenant_id: str = DEFAULT_TENANT) -> Optional[Dict]:
+        self.fail_interrupted_jobs(at_startup=False)
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs "
+                "WHERE id = ? AND tenant_id = ?",
+                (job_id, tenant_id)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list_jobs(self,
+                  limit: int = 50,
+                  tenant_id: str = DEFAULT_TENANT) -> List[Dict]:
+        self.fail_interrupted_jobs(at_startup=False)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs "
+                "WHERE tenant_id = ? ORDER BY created_at DESC LIMIT ?",
+                (tenant_id, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def fail_interrupted_jobs(self, at_startup: bool = True):
+        """Mark jobs left queued or running by an exited process as failed
+
+        At startup this process ID counts as exited too: a new process
+        reusing the ID cannot be running them.
+        """
+        with self._lock:
+            pids = [
+                row[0] for row in self.conn.execute(
+                    "SELECT DISTINCT pid FROM jobs "
+                    "WHERE status IN ('queued', 'running')")
+            ]
+            exited = [
+                pid for pid in pids if pid is not None and (
+                    at_startup if pid == os.getpid() else not _pid_alive(pid))
+            ]
+            if not exited:
+                return
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? "
+                f"WHERE pid IN ({', '.join('?' * len(exited))}) "
+                "AND status IN ('queued', 'running')",
+                ("Interrupted: the worker process exited", time.time(),
+                 *exited))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -2,19 +2,51 @@ import os
 from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
-from typing import List, Dict, Union
+from typing import Iterator, List, Dict, Optional, Union
 from openai import OpenAI
 import base64
 import io
 from PIL import Image
 from pydantic import SecretStr
+from services.chunking import TextChunker
+from concurrent.futures import ThreadPoolExecutor
+from services.context_builder import ContextBuilder, ScoredChunk
+from services.metrics import MetricsRegistry
+from services.query_router import QueryRouter
+from services.rate_limiter import (PRIORITY_BULK, PRIORITY_INTERACTIVE,
+                                   RateGovernor)
+from services.chunking import count_tokens
+from utils.constants import (COMPLETION_TOKEN_ESTIMATE, IMAGE_TOKEN_ESTIMATE,
+                             SUMMARY_CHUNK_TOKENS, SUMMARY_MAX_INPUT_TOKENS,
+                             SUMMARY_MAX_WORKERS)
+import logging
 
 # LangChain tracing configuration
 default_model = "gpt-4o-mini"
-embedding_model = "text-embedding-3-small"
+
+SUMMARY_TEMPLATE = """Generate a comprehensive summary of the following text. 
+            Focus on key points, main ideas, and important details:
+
+            {text}
+
+            Summary:"""
+
+ANSWER_TEMPLATE = """
+        Answer the following question based on this context:
+
+        {context}
+
+        Question: {query}
+        """
+
+COMBINE_SUMMARIES_TEMPLATE = """The following are summaries of consecutive parts of one document.
+            Combine them into a single comprehensive summary of the whole document.
+            Focus on key points, main ideas, and important details:
+
+            {text}
+
+            Summary:"""
 
 
 class LLMService:
@@ -28,25 +60,32 @@ class LLMService:
 
     def __init__(self):
         if not self._initialized:
-            from langchain.callbacks.manager import CallbackManager
-            from langchain.callbacks.tracers import LangChainTracer
+            # Attach LangSmith tracing when it is enabled in the environment
+            self.run_config = {}
+            if os.environ.get("LANGCHAIN_TRACING_V2", "").lower() == "true":
+                from langchain.callbacks.tracers import LangChainTracer
+                self.run_config = {"callbacks": [LangChainTracer()]}
 
-            tracer = LangChainTracer()
-            callback_manager = CallbackManager([tracer])
+            self.metrics = MetricsRegistry()
+            self.governor = RateGovernor()
 
             # Create SecretStr from API key
             api_key = SecretStr(os.environ["OPENAI_API_KEY"])
 
+            # Retries are handled by the shared RateGovernor
             self.llm = ChatOpenAI(temperature=0,
-                                  model="gpt-4o-mini",
+                                  model=default_model,
                                   api_key=api_key,
-                                  max_tokens=4096)
-
-            self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small",
-                                               api_key=api_key)
+                                  max_tokens=4096,
+                                  max_retries=0,
+                                  # Token usage on the last streamed chunk
+                                  stream_usage=True)
 
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000, chunk_overlap=100)
+            self.text_splitter = TextChunker()
+            self.summary_splitter = TextChunker(chunk_size=SUMMARY_CHUNK_TOKENS,
+                                                chunk_overlap=100)
+            self.context_builder = ContextBuilder(chunker=self.text_splitter)
+            self.query_router = QueryRouter()
 
             self.client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
             self._initialized = True
@@ -68,54 +107,106 @@ class LLMService:
         except Exception as e:
             raise ValueError(f"Failed to encode image: {str(e)}")
 
+    def _invoke(self,
+                operation: str,
+                llm_input,
+                priority: int = PRIORITY_INTERACTIVE,
+                estimated_tokens: Optional[int] = None):
+        """Invoke the chat model through the rate governor, recording
+        latency, token usage, retries and errors"""
+        if estimated_tokens is None:
+            estimated_tokens = count_tokens(str(llm_input))
+        with self.metrics.track(operation, default_model) as call:
+            response = self.governor.call(
+                lambda: self.llm.invoke(llm_input, config=self.run_config),
+                priority=priority,
+                tokens=estimated_tokens + COMPLETION_TOKEN_ESTIMATE,
+                call=call)
+            usage = getattr(response, "usage_metadata", None) or {}
+            call.input_tokens = usage.get("input_tokens", 0)
+            call.output_tokens = usage.get("output_tokens", 0)
+        return response
+
     def split_text(self, text: str) -> List[str]:
         """Split text into chunks for processing"""
         return self.text_splitter.split_text(text)
 
-    def generate_summary(self, text: str) -> str:
-        """Generate a comprehensive summary of the given text"""
-        prompt = PromptTemplate(
-            input_variables=["text"],
-            template="""Generate a comprehensive summary of the following text. 
-            Focus on key points, main ideas, and important details:
+    def _summarize(self, text: str, template: str) -> str:
+        prompt = PromptTemplate(input_variables=["text"], template=template)
+        response = self._invoke("summary",
+                                prompt.format(text=text),
+                                priority=PRIORITY_BULK)
+        return str(response.content)
 
-            {text}
+    def _group_summaries(self, summaries: List[str]) -> List[List[str]]:
+        """Group partial summaries to fit the summary chunk size, at least
+        two per group so every reduce round shrinks the list"""
+        groups = []
+        current = []
+        tokens = 0
+        for summary in summaries:
+            summary_tokens = count_tokens(summary)
+            if len(current) >= 2 and \
+                    tokens + summary_tokens > SUMMARY_CHUNK_TOKENS:
+                groups.append(current)
+                current = []
+                tokens = 0
+            current.append(summary)
+            tokens += summary_tokens
+        if len(current) == 1 and groups:
+            groups[-1].extend(current)
+        elif current:
+            groups.append(current)
+        return groups
 
-            Summary:""")
-        response = self.llm.invoke(prompt.format(text=text[:4000]))
-        return str(response.content)
+    def generate_summary(self, text: str) -> str:
+        """Generate a comprehensive summary of the given text
 
-    def analyze_query(self, query: str) -> Dict:
-        """Analyze the query and determine its type and characteristics"""
-        prompt = PromptTemplate(
-            input_variables=["query"],
-            template="""Analyze the following query and provide:
-            1. The main intent or purpose
-            2. Key concepts or entities mentioned
-            3. Type of analysis requested (e.g., summary, comparison, timeline)
-            4. Expected response format
+        Long texts are summarized map-reduce style: chunks are summarized
+        concurrently, then the partial summaries are combined
+        hierarchically until one remains.
+        """
+        chunks = self.summary_splitter.split_text(text)
+        if not chunks:
+            return ""
+
+        # Sample evenly across very large documents instead of truncating
+        max_chunks = max(1, SUMMARY_MAX_INPUT_TOKENS // SUMMARY_CHUNK_TOKENS)
+        if len(chunks) > max_chunks:
+            step = len(chunks) / max_chunks
+            chunks = [chunks[int(i * step)] for i in range(max_chunks)]
+
+        if len(chunks) == 1:
+            return self._summarize(chunks[0], SUMMARY_TEMPLATE)
+
+        with ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS) as executor:
+            summaries = list(
+                executor.map(lambda chunk: self._summarize(
+                    chunk, SUMMARY_TEMPLATE), chunks))
+            while len(summaries) > 1:
+                groups = self._group_summaries(summaries)
+                summaries = list(
+                    executor.map(lambda group: self._summarize(
+                        "\n\n".join(group), COMBINE_SUMMARIES_TEMPLATE),
+                                 groups))
+        return summaries[0]
 
-            Query: {query}
+    def analyze_query(self, query: str) -> Dict:
+        """Analyze the query and determine its type and characteristics
 
-            Analysis:""")
-        response = self.llm.invoke(prompt.format(query=query))
-
-        # Determine query type based on content
-        query_type = "semantic"
-        if any(word in query.lower()
-               for word in ["compare", "difference", "versus", "vs"]):
-            query_type = "comparative"
-        elif any(word in query.lower()
-                 for word in ["when", "timeline", "chronological"]):
-            query_type = "temporal"
-        elif any(word in query.lower()
-                 for word in ["sentiment", "opinion", "feel"]):
-            query_type = "sentiment"
-        elif any(word in query.lower()
-                 for word in ["trend", "pattern", "change over time"]):
-            query_type = "trend"
-
-        return {"analysis": str(response.content), "type": query_type}
+        Classification is local (see QueryRouter), so no LLM call is made.
+        """
+        route = self.query_router.route(query)
+        stages = [
+            name for name, enabled in (("query expansion", route.expand),
+                                       ("reranking", route.rerank),
+                                       ("stored summaries",
+                                        route.use_summaries)) if enabled
+        ]
+        analysis = (f"{route.complexity.capitalize()} {route.query_type} "
+                    f"query about '{route.subject or query}'. Stages: "
+                    f"{', '.join(stages) if stages else 'direct answer'}.")
+        return {"analysis": analysis, "type": route.query_type}
 
     def analyze_image(self, image_input: Union[str, Image.Image]) -> str:
         """Analyze an image using OpenAI with proper message formatting"""
@@ -150,7 +241,10 @@ class LLMService:
 
             # Create the message and invoke
             messages = [HumanMessage(content=message_content)]
-            response = self.llm.invoke(messages)
+            response = self._invoke("image",
+                                    messages,
+                                    priority=PRIORITY_BULK,
+                                    estimated_tokens=IMAGE_TOKEN_ESTIMATE)
 
             return str(response.content
                        ) if response.content else "No description available"
@@ -168,37 +262,49 @@ class LLMService:
 
             Output: ({num_queries} queries)""")
 
-        response = self.llm.invoke(
+        response = self._invoke(
+            "query_expansion",
             prompt.format(query=query, num_queries=num_queries))
 
         return query + "\n" + str(response.content)
 
-    def pass_vector_results_as_context(self, vector_results: list[Document],
-                                       queries: str) -> str:
-        # Initialize empty list to store processed contexts
-        processed_documents = ", ".join(doc.page_content
-                                        for doc in vector_results)
-
-        # Format the final context string
-        context_template = """
-        Answer the following question based on this context:
-
-        {context}
+    def _answer_prompt(self, vector_results: List[Union[Document,
+                                                        ScoredChunk]],
+                       queries: str) -> str:
+        # Pack the most relevant, non-redundant chunks into the token budget
+        processed_documents = self.context_builder.build(vector_results)
 
-        Question: {query}
-        """
-
-        print("________________________processed_documents: ",
-              processed_documents)
+        logging.debug(f"Answer context: {processed_documents}")
 
         prompt = PromptTemplate(input_variables=["query", "context"],
-                                template=context_template)
+                                template=ANSWER_TEMPLATE)
+        return prompt.format(query=queries, context=processed_documents)
 
-        response = self.llm.invoke(
-            prompt.format(query=queries, context=processed_documents))
+    def pass_vector_results_as_context(
+            self, vector_results: List[Union[Document, ScoredChunk]],
+            queries: str) -> str:
+        response = self._invoke("answer",
+                                self._answer_prompt(vector_results, queries))
 
         return str(response.content)
 
+    def stream_answer(self, vector_results: List[Union[Document,
+                                                       ScoredChunk]],
+                      queries: str) -> Iterator[str]:
+        """Like pass_vector_results_as_context, yielding the answer as it
+        is generated"""
+        prompt = self._answer_prompt(vector_results, queries)
+        with self.metrics.track("answer", default_model) as call, \
+                self.governor.slot(PRIORITY_INTERACTIVE,
+                                   count_tokens(prompt) +
+                                   COMPLETION_TOKEN_ESTIMATE):
+            for chunk in self.llm.stream(prompt, config=self.run_config):
+                usage = getattr(chunk, "usage_metadata", None) or {}
+                call.input_tokens += usage.get("input_tokens", 0)
+                call.output_tokens += usage.get("output_tokens", 0)
+                if chunk.content:
+                    yield str(chunk.content)
+
     def batch_process_images(self,
                              image_paths: List[str],
                              analysis_type: str = "general") -> Dict[str, str]:
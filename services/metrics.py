@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from services.tracing import start_span
+from utils.constants import (METRICS_EXPORT_INTERVAL, METRICS_EXPORT_PATH,
+                             METRICS_PORT, METRICS_SAMPLE_WINDOW,
+                             MODEL_PRICING)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+class Histogram:
+    """Cumulative-bucket histogram that also keeps a window of recent samples"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=METRICS_SAMPLE_WINDOW)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+        self.samples.append(value)
+
+    def quantile(self, q: float) -> float:
+        """Quantile over the recent sample window"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def cumulative(self) -> List[tuple]:
+        result = []
+        running = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+class CallRecord:
+    """Filled in by the caller while a tracked call runs"""
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.retries = 0
+        self.error = False
+
+
+class OperationStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cost = 0.0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.input_tokens = Histogram(TOKEN_BUCKETS)
+        self.output_tokens = Histogram(TOKEN_BUCKETS)
+
+
+class MetricsRegistry:
+    """Process-wide per-operation metrics for LLM and embedding calls"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self._lock = threading.Lock()
+            self._operations: Dict[str, OperationStats] = {}
+            self._exporters_started = False
+            self._initialized = True
+
+    @contextmanager
+    def track(self, operation: str, model: Optional[str] = None):
+        """Time a call; the yielded CallRecord collects tokens and retries
+
+        The call is also traced as a span of the active span.
+        """
+        call = CallRecord(model)
+        # Not activated: streamed calls yield inside this block
+        current = start_span(operation, model=model)
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception as e:
+            call.error = True
+            current.fail(e)
+            raise
+        finally:
+            self.record(operation, time.perf_counter() - start, call)
+            current.set(input_tokens=call.input_tokens,
+                        output_tokens=call.output_tokens,
+                        retries=call.retries)
+            current.end()
+
+    def record(self, operation: str, latency: float, call: CallRecord):
+        input_price, output_price = MODEL_PRICING.get(call.model, (0.0, 0.0))
+        cost = (call.input_tokens * input_price +
+                call.output_tokens * output_price) / 1_000_000
+        with self._lock:
+            stats = self._operations.setdefault(operation, OperationStats())
+            stats.calls += 1
+            stats.errors += int(call.error)
+            stats.retries += call.retries
+            stats.cost += cost
+            stats.latency.observe(latency)
+            stats.input_tokens.observe(call.input_tokens)
+            stats.output_tokens.observe(call.output_tokens)
+
+    def snapshot(self) -> List[Dict]:
+        """Summary rows per operation, for display"""
+        with self._lock:
+            return [{
+                "operation": name,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "retries": stats.retries,
+                "p50_ms": round(stats.latency.quantile(0.5) * 1000, 1),
+                "p95_ms": round(stats.latency.quantile(0.95) * 1000, 1),
+                "avg_input_tokens": round(
+                    stats.input_tokens.total / stats.calls, 1),
+                "avg_output_tokens": round(
+                    stats.output_tokens.total / stats.calls, 1),
+                "cost_usd": round(stats.cost, 6),
+            } for name, stats in sorted(self._operations.items())]
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            operations = sorted(self._operations.items())
+            for metric, help_text, attr in (
+                ("llm_calls_total", "Calls per operation", "calls"),
+                ("llm_errors_total", "Failed calls per operation", "errors"),
+                ("llm_retries_total", "Retries per operation", "retries"),
+                ("llm_cost_usd_total", "Estimated cost in USD", "cost"),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for name, stats in operations:
+                    lines.append(
+                        f'{metric}{{operation="{name}"}} {getattr(stats, attr)}')
+
+            for metric, help_text, attr in (
+                ("llm_latency_seconds", "Call latency", "latency"),
+                ("llm_input_tokens", "Input tokens per call", "input_tokens"),
+                ("llm_output_tokens", "Output tokens per call",
+                 "output_tokens"),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, stats in operations:
+                    histogram = getattr(stats, attr)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{operation="{name}",'
+                                     f'le="{bound}"}} {count}')
+                    lines.append(
+                        f'{metric}_sum{{operation="{name}"}} {histogram.total}')
+                    lines.append(
+                        f'{metric}_count{{operation="{name}"}} {histogram.count}'
+                    )
+        return "\n".join(lines) + "\n"
+
+    def export_to_file(self, path: str):
+        """Atomically write the Prometheus text to path"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_exporters(self):
+        """Start the configured HTTP and/or file exporters (once per process)"""
+        with self._lock:
+            if self._exporters_started:
+                return
+            self._exporters_started = True
+
+        if METRICS_PORT:
+            registry = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = registry.render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type",
+                                     "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            try:
+                server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT),
+                                             MetricsHandler)
+                threading.Thread(target=server.serve_forever,
+                                 daemon=True).start()
+                logging.info(f"Serving metrics on :{METRICS_PORT}/metrics")
+            except OSError as e:
+                logging.error(f"Error starting metrics server: {str(e)}")
+
+        if METRICS_EXPORT_PATH:
+
+            def export_loop():
+                while True:
+                    time.sleep(METRICS_EXPORT_INTERVAL)
+                    try:
+                        self.export_to_file(METRICS_EXPORT_PATH)
+                    except OSError as e:
+                        logging.error(f"Error exporting metrics: {str(e)}")
+
+            threading.Thread(target=export_loop, daemon=True).start()
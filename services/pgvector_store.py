@@ -0,0 +1,365 @@
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.load import dumps, loads
+from langchain_core.documents import Document
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+
+from services.chunking import TextChunker
+from services.context_builder import ScoredChunk
+from services.database import connection_params, create_document_tables
+from services.ingest_registry import get_ingest_registry
+from services.tracing import span
+from services.vector_store import (TenantQuotaExceeded, TenantStats,
+                                   create_embeddings)
+from utils.constants import (CONTEXT_CANDIDATES, DEFAULT_TENANT,
+                             EMBEDDING_DIMENSIONS, EMBEDDING_MODEL_DIMENSIONS,
+                             HNSW_CONSTRUCTION_EF, HNSW_M, HNSW_SEARCH_EF,
+                             PG_POOL_MAX_SIZE, PG_POOL_MIN_SIZE,
+                             PG_PREPARE_STATEMENTS, TENANT_MAX_CHUNKS)
+from utils.validators import validate_tenant_id
+
+# pgvector indexes at most 2000 dimensions of the vector type
+MAX_INDEXED_DIMENSIONS = 2000
+
+SEARCH_SQL = """
+    SELECT c.content, c.metadata, c.embedding::text AS embedding,
+           1 - (c.embedding <=> %(query)s::vector) AS score
+    FROM chunks c
+    WHERE c.tenant_id = %(tenant_id)s
+    ORDER BY c.embedding <=> %(query)s::vector
+    LIMIT %(limit)s
+"""
+
+# pgvector's default hnsw.ef_search, and the largest value it accepts
+DEFAULT_SEARCH_EF = 40
+MAX_SEARCH_EF = 1000
+
+
+def to_vector_literal(embedding) -> str:
+    """pgvector's text form, e.g. [0.1,0.2]; cast with ::vector"""
+    values = np.asarray(embedding, dtype=np.float32)
+    return "[" + ",".join(f"{value:.9g}" for value in values) + "]"
+
+
+def from_vector_literal(text: str) -> List[float]:
+    return np.array(text[1:-1].split(","), dtype=np.float32).tolist()
+
+
+def _version(text: str) -> tuple:
+    return tuple(int(part) for part in re.findall(r"\d+", text)[:3])
+
+
+def hnsw_index_options() -> str:
+    """WITH clause for the configured HNSW build parameters, if any"""
+    options = [
+        f"{name} = {int(value)}" for name, value in (
+            ("m", HNSW_M), ("ef_construction", HNSW_CONSTRUCTION_EF)) if value
+    ]
+    return f"WITH ({', '.join(options)})" if options else ""
+
+
+class PgVectorStoreService:
+    """Chunks and embeddings in PostgreSQL, beside the documents table
+
+    Rows carry their tenant and (for uploaded files) a foreign key to
+    documents.id. An HNSW index serves the nearest-neighbour ordering;
+    the tenant predicate is applied to the rows it yields, so searches
+    use pgvector's iterative scan where available and fall back to an
+    exact scan when the index returns too few of a tenant's rows. Any
+    number of app nodes can share it.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PgVectorStoreService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.embeddings = create_embeddings()
+            self.text_splitter = TextChunker()
+            self.dimensions = EMBEDDING_DIMENSIONS or EMBEDDING_MODEL_DIMENSIONS
+            if self.dimensions > MAX_INDEXED_DIMENSIONS:
+                raise ValueError(
+                    f"pgvector indexes at most {MAX_INDEXED_DIMENSIONS} "
+                    f"dimensions; set EMBEDDING_DIMENSIONS lower")
+            kwargs = connection_params()
+            if not PG_PREPARE_STATEMENTS:
+                kwargs["prepare_threshold"] = None
+            self.pool = ConnectionPool("",
+                                       min_size=PG_POOL_MIN_SIZE,
+                                       max_size=PG_POOL_MAX_SIZE,
+                                       check=ConnectionPool.check_connection,
+                                       kwargs=kwargs,
+                                       open=True)
+            self._tenant_stats: Dict[str, TenantStats] = {}
+            self._lock = threading.Lock()
+            self._create_tables()
+            self.iterative_scan = self._vector_version() >= (0, 8)
+            self._initialized = True
+
+    def _create_tables(self):
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    create_document_tables(cur)
+                    cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                    cur.execute(f"""
+                        CREATE TABLE IF NOT EXISTS chunks (
+                            id BIGSERIAL PRIMARY KEY,
+                            document_id INTEGER
+                                REFERENCES documents (id) ON DELETE CASCADE,
+                            tenant_id TEXT NOT NULL,
+                            chunk_index INTEGER NOT NULL,
+                            content TEXT NOT NULL,
+                            metadata JSONB NOT NULL DEFAULT '{{}}',
+                            embedding vector({self.dimensions}) NOT NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+                    cur.execute(f"""
+                        CREATE INDEX IF NOT EXISTS chunks_embedding_hnsw
+                        ON chunks USING hnsw (embedding vector_cosine_ops)
+                        {hnsw_index_options()}
+                    """)
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS chunks_tenant_id
+                        ON chunks (tenant_id)
+                    """)
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS chunks_document_id
+                        ON chunks (document_id)
+                    """)
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS chunks_metadata
+                        ON chunks USING gin (metadata jsonb_path_ops)
+                    """)
+        except Exception as e:
+            raise Exception(f"Error creating chunk tables: {str(e)}")
+
+    def _vector_version(self) -> tuple:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT extversion FROM pg_extension "
+                               "WHERE extname = 'vector'").fetchone()
+        return _version(row[0]) if row else ()
+
+    def _stats(self, tenant_id: str) -> TenantStats:
+        stats = self._tenant_stats.setdefault(tenant_id, TenantStats())
+        stats.last_used = time.time()
+        return stats
+
+    @staticmethod
+    def _check_tenant(tenant_id: str):
+        is_valid, error_msg = validate_tenant_id(tenant_id)
+        if not is_valid:
+            raise ValueError(error_msg)
+
+    def _count(self, conn, tenant_id: str) -> int:
+        return conn.execute("SELECT count(*) FROM chunks WHERE tenant_id = %s",
+                            (tenant_id, )).fetchone()[0]
+
+    def embed_documents(self, docs: List[Document]) -> List[List[float]]:
+        return self.embeddings.embed_documents(
+            [doc.page_content for doc in docs])
+
+    def write_embedded(self,
+                       docs: List[Document],
+                       embeddings: List[List[float]],
+                       tenant_id: str = DEFAULT_TENANT):
+        """Store chunks embedded by the caller, with COPY"""
+        self._check_tenant(tenant_id)
+        with span("index.upsert", chunks=len(docs)), \
+                self.pool.connection() as conn:
+            if TENANT_MAX_CHUNKS:
+                # Serialize writers per tenant so the quota holds across nodes
+                conn.execute("SELECT pg_advisory_xact_lock(hashtext(%s))",
+                             (tenant_id, ))
+                if self._count(conn, tenant_id) + len(docs) > \
+                        TENANT_MAX_CHUNKS:
+                    raise TenantQuotaExceeded(
+                        f"Tenant {tenant_id} would exceed its quota of "
+                        f"{TENANT_MAX_CHUNKS} chunks")
+            with conn.cursor() as cur:
+                with cur.copy("COPY chunks (document_id, tenant_id, "
+                              "chunk_index, content, metadata, embedding) "
+                              "FROM STDIN") as copy:
+                    for doc, embedding in zip(docs, embeddings):
+                        copy.write_row(
+                            (doc.metadata.get("document_id"), tenant_id,
+                             doc.metadata.get("chunk_index", 0),
+                             doc.page_content, json.dumps(doc.metadata),
+                             to_vector_literal(embedding)))
+        with self._lock:
+            self._stats(tenant_id).chunks_added += len(docs)
+
+    def persist(self, tenant_id: str = DEFAULT_TENANT):
+        # Committed with each write
+        pass
+
+    def add_documents(self,
+                      text: str,
+                      metadata: dict,
+                      tenant_id: str = DEFAULT_TENANT) -> int:
+        docs = [
+            Document(page_content=chunk,
+                     metadata={
+                         **metadata, "chunk_index": index
+                     }) for index, chunk in enumerate(
+                         self.text_splitter.split_text(text))
+        ]
+        if docs:
+            self.write_embedded(docs, self.embed_documents(docs), tenant_id)
+        return len(docs)
+
+    def search(self,
+               query_text: str,
+               top_k=5,
+               tenant_id: str = DEFAULT_TENANT) -> list[Document]:
+        results = self.search_with_scores(query_text, top_k, tenant_id)
+        return self.get_unique_union([result.document for result in results])
+
+    def search_with_scores(
+            self,
+            query_text: str,
+            top_k: int = CONTEXT_CANDIDATES,
+            tenant_id: str = DEFAULT_TENANT,
+            search_ef: Optional[int] = None) -> List[ScoredChunk]:
+        """Similarity search within a tenant
+
+        search_ef overrides hnsw.ef_search (and HNSW_SEARCH_EF) for this
+        query; it is raised to top_k when lower, since the index yields
+        at most ef_search rows.
+        """
+        self._check_tenant(tenant_id)
+        query_embedding = self.embeddings.embed_query(query_text)
+        params = {
+            "query": to_vector_literal(query_embedding),
+            "tenant_id": tenant_id,
+            "limit": top_k,
+        }
+        ef = min(max(search_ef or HNSW_SEARCH_EF or DEFAULT_SEARCH_EF, top_k),
+                 MAX_SEARCH_EF)
+
+        start = time.perf_counter()
+        try:
+            with span("index.query", top_k=top_k, search_ef=ef), \
+                    self.pool.connection() as conn:
+                # Settings are scoped to this query's transaction
+                conn.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                             (str(ef), ))
+                if self.iterative_scan:
+                    # Keep scanning the graph until enough rows pass the
+                    # tenant filter (pgvector >= 0.8)
+                    conn.execute("SELECT set_config('hnsw.iterative_scan', "
+                                 "'relaxed_order', true)")
+                with conn.cursor(row_factory=dict_row) as cur:
+                    rows = cur.execute(SEARCH_SQL, params).fetchall()
+                    if len(rows) < top_k:
+                        # The index ran out before finding top_k of this
+                        # tenant's rows (or the tenant is that small):
+                        # rank all of the tenant's rows instead
+                        conn.execute("SELECT set_config('enable_indexscan', "
+                                     "'off', true)")
+                        rows = cur.execute(SEARCH_SQL, params).fetchall()
+        except Exception as e:
+            raise Exception(f"Error searching chunks: {str(e)}")
+        finally:
+            with self._lock:
+                stats = self._stats(tenant_id)
+                stats.searches += 1
+                stats.search_seconds += time.perf_counter() - start
+
+        # relaxed_order may return rows slightly out of order
+        rows.sort(key=lambda row: row["score"], reverse=True)
+        return [
+            ScoredChunk(document=Document(page_content=row["content"],
+                                          metadata=row["metadata"] or {}),
+                        score=float(row["score"]),
+                        embedding=from_vector_literal(row["embedding"]))
+            for row in rows
+        ]
+
+    def get_all_documents(self,
+                          tenant_id: str = DEFAULT_TENANT) -> List[Document]:
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT content, metadata FROM chunks "
+                    "WHERE tenant_id = %s ORDER BY id",
+                    (tenant_id, )).fetchall()
+            return self.get_unique_union([
+                Document(page_content=content, metadata=metadata or {})
+                for content, metadata in rows
+            ])
+        except Exception as e:
+            raise Exception(
+                f"Error retrieving documents from vector store: {str(e)}")
+
+    def get_unique_union(self, documents: list[Document]):
+        """ Unique union of retrieved docs """
+        return [loads(doc) for doc in set(dumps(doc) for doc in documents)]
+
+    def clear_data(self, tenant_id: str = DEFAULT_TENANT):
+        """Delete one tenant's chunks; other tenants are untouched"""
+        self._check_tenant(tenant_id)
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("DELETE FROM chunks WHERE tenant_id = %s",
+                             (tenant_id, ))
+            registry = get_ingest_registry()
+            if registry is not None:
+                registry.forget_tenant(tenant_id)
+        except Exception as e:
+            raise Exception(f"Error clearing vector store: {str(e)}")
+
+    def sample_embeddings(self,
+                          tenant_id: str = DEFAULT_TENANT,
+                          limit: int = 50000,
+                          seed: int = 0) -> np.ndarray:
+        """Up to limit stored vectors chosen at random, for calibration"""
+        self._check_tenant(tenant_id)
+        with self.pool.connection() as conn:
+            conn.execute("SELECT setseed(%s)", (seed % 1000 / 1000, ))
+            rows = conn.execute(
+                "SELECT embedding::text FROM chunks WHERE tenant_id = %s "
+                "ORDER BY random() LIMIT %s", (tenant_id, limit)).fetchall()
+        return np.array([from_vector_literal(row[0]) for row in rows],
+                        dtype=np.float32)
+
+    def list_tenants(self) -> List[str]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT tenant_id FROM chunks ORDER BY tenant_id"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def tenant_stats(self, tenant_id: str = DEFAULT_TENANT) -> Dict:
+        """Chunk count, quota and search statistics for a tenant"""
+        with self.pool.connection() as conn:
+            chunks = self._count(conn, tenant_id)
+        with self._lock:
+            stats = self._tenant_stats.get(tenant_id, TenantStats())
+        return {
+            "tenant_id": tenant_id,
+            "chunks": chunks,
+            "quota": TENANT_MAX_CHUNKS or None,
+            "chunks_added": stats.chunks_added,
+            "searches": stats.searches,
+            "avg_search_ms": round(
+                stats.search_seconds / stats.searches * 1000, 2)
+            if stats.searches else 0.0,
+            "last_used": stats.last_used or None,
+        }
+
+    def close(self):
+        self.pool.close()
+        logging.info("Closed pgvector connection pool")
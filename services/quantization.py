@@ -0,0 +1,380 @@
+import os
+import random
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUANTIZATION_METHODS = ("none", "int8", "binary")
+
+# Codes scored at a time: bounds the float32 copy of an int8 block (6 MB at
+# 1536 dimensions) instead of upcasting the whole matrix per query; larger
+# copies stay allocated in the heap between queries
+SCAN_BLOCK_ROWS = 1024
+
+# Set bits per byte value, for Hamming distances over packed codes
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None],
+                          axis=1).sum(axis=1).astype(np.uint16)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-vector symmetric scalar quantization to int8 codes and scales"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed eight to a byte"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return np.packbits(vectors > 0, axis=1)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    return _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1)
+
+
+def _top_rows(scores: np.ndarray, count: int) -> np.ndarray:
+    """Positions of the count highest scores, best first"""
+    count = min(count, len(scores))
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, count - 1)[:count]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class QuantizedIndex:
+    """Vector storage of a quantized tenant: int8 or binary codes in
+    memory, full-precision vectors on disk
+
+    Only the codes (1 or 1/8 byte per dimension instead of 4) and the
+    chunk ids are held in memory. The float32 vectors are appended to
+    `{path}.vectors`, from which rescoring reads just the shortlisted
+    rows; ids are appended to `{path}.ids` in the same order.
+    Those two files are the durable copy; the codes are cached in `path`
+    and rebuilt from the vectors when stale.
+    """
+
+    def __init__(self, method: str, path: str, dimensions: int):
+        if method not in ("int8", "binary"):
+            raise ValueError(f"Unsupported quantization method: {method}")
+        self.method = method
+        self.path = path
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._pending: List[Tuple[np.ndarray, Optional[np.ndarray]]] = []
+        self._vector_file = None
+        self._id_file = None
+
+    @property
+    def vectors_path(self) -> str:
+        return f"{self.path}.vectors"
+
+    @property
+    def ids_path(self) -> str:
+        return f"{self.path}.ids"
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _encode(
+            self,
+            vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.method == "int8":
+            return quantize_int8(vectors)
+        return quantize_binary(vectors), None
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        if not len(ids):
+            return
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors),
+                                       dtype=np.float32)
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions} dimensions, got "
+                             f"{vectors.shape[1]}")
+        codes, scales = self._encode(vectors)
+        with self._lock:
+            if self._vector_file is None:
+                self._vector_file = open(self.vectors_path, "ab")
+                self._id_file = open(self.ids_path, "a", encoding="utf-8")
+            # Vectors first: a crash in between leaves an unnamed row,
+            # which open() drops
+            self._vector_file.write(vectors.tobytes())
+            self._vector_file.flush()
+            self._id_file.write("".join(f"{chunk_id}\n" for chunk_id in ids))
+            self._id_file.flush()
+            self._ids.extend(ids)
+            self._pending.append((codes, scales))
+
+    def _consolidate(self):
+        """Merge pending additions into the contiguous code matrix"""
+        if not self._pending:
+            return
+        parts = ([] if self._codes is None else [self._codes]) + \
+            [codes for codes, _ in self._pending]
+        self._codes = np.concatenate(parts)
+        if self.method == "int8":
+            scales = ([] if self._scales is None else [self._scales]) + \
+                [scales for _, scales in self._pending]
+            self._scales = np.concatenate(scales)
+        self._pending = []
+
+    @contextmanager
+    def _reader(self):
+        """The ids, codes and scales as of now, with a descriptor of the
+        matching vectors file, for use without the lock
+
+        Additions replace the code arrays rather than modify them and
+        only extend the ids; remove() writes a new vectors file.
+        """
+        with self._lock:
+            self._consolidate()
+            fd = os.open(self.vectors_path, os.O_RDONLY) \
+                if self._ids else None
+            state = self._ids, self._codes, self._scales
+        try:
+            yield (*state, fd)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _read_rows(self, fd: int, rows: Sequence[int]) -> np.ndarray:
+        """Stored vectors of the given rows
+
+        Read rather than memory-mapped: the pages stay in the page cache
+        instead of this process's resident memory.
+        """
+        row_bytes = self.dimensions * 4
+        vectors = np.empty((len(rows), self.dimensions), dtype=np.float32)
+        for i, row in enumerate(rows):
+            vectors[i] = np.frombuffer(os.pread(fd, row_bytes,
+                                                int(row) * row_bytes),
+                                       dtype=np.float32)
+        return vectors
+
+    def _shortlist(self, codes: np.ndarray, scales: Optional[np.ndarray],
+                   query: np.ndarray, count: int) -> np.ndarray:
+        """Rows of the count best codes for the query, scanned in blocks"""
+        if self.method == "binary":
+            query_code = quantize_binary(query)[0]
+        rows, scores = [], []
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS]
+            if self.method == "int8":
+                block_scores = (block.astype(np.float32) @ query) * \
+                    scales[start:start + SCAN_BLOCK_ROWS]
+            else:
+                block_scores = -hamming_distances(
+                    block, query_code).astype(np.float32)
+            best = _top_rows(block_scores, count)
+            rows.append(best + start)
+            scores.append(block_scores[best])
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        return rows[_top_rows(scores, count)]
+
+    def search(self,
+               query: np.ndarray,
+               k: int,
+               rescore_factor: int = 1) -> List[Tuple[str, float, np.ndarray]]:
+        """The k best chunks as (id, score, vector), best first
+
+        With rescore_factor > 1, the codes shortlist that many candidates
+        per result and they are ranked by exact cosine similarity against
+        their stored vectors. Otherwise the codes' ranking is kept.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._reader() as (ids, codes, scales, fd):
+            if codes is None or not len(codes):
+                return []
+            rows = self._shortlist(codes, scales, query,
+                                   k * max(1, rescore_factor))
+            if rescore_factor > 1:
+                # In file order, for the disk's sake
+                rows = np.sort(rows)
+            full = self._read_rows(fd, rows)
+        scores = full @ query
+        order = _top_rows(scores, k) if rescore_factor > 1 else \
+            range(len(rows))
+        return [(ids[rows[i]], float(scores[i]), full[i]) for i in order]
+
+    def get_vectors(self, ids: Sequence[str]) -> np.ndarray:
+        """Stored vectors of the given chunk ids, in that order"""
+        with self._reader() as (known, _, _, fd):
+            positions: Dict[str, int] = {
+                chunk_id: row
+                for row, chunk_id in enumerate(known)
+            }
+            return self._read_rows(fd,
+                                   [positions[chunk_id] for chunk_id in ids])
+
+    def sample(self, limit: int, seed: int = 0) -> np.ndarray:
+        """Up to limit stored vectors chosen at random"""
+        with self._reader() as (ids, _, _, fd):
+            rows = range(len(ids))
+            if len(rows) > limit:
+                rows = sorted(random.Random(seed).sample(rows, limit))
+            return self._read_rows(fd, rows)
+
+    def remove(self, ids: Sequence[str]):
+        """Drop chunks, rewriting the stored files without them"""
+        removed = set(ids)
+        with self._lock:
+            self._consolidate()
+            keep = np.array(
+                [chunk_id not in removed for chunk_id in self._ids],
+                dtype=bool)
+            if keep.all():
+                return
+            self._close_files()
+            tmp_path = self.vectors_path + ".tmp"
+            with open(self.vectors_path, "rb") as f, \
+                    open(tmp_path, "wb") as out:
+                for start, block in self._iter_blocks(f):
+                    out.write(block[keep[start:start + len(block)]].tobytes())
+            # Searches already reading the old file keep their descriptor
+            os.replace(tmp_path, self.vectors_path)
+            self._ids = [
+                chunk_id for chunk_id, kept in zip(self._ids, keep) if kept
+            ]
+            self._write_ids()
+            self._codes = self._codes[keep]
+            if self._scales is not None:
+                self._scales = self._scales[keep]
+            self._save_codes()
+
+    def _iter_blocks(self, f) -> Iterator[Tuple[int, np.ndarray]]:
+        """(first row, vectors) blocks of an open vectors file"""
+        row_bytes = self.dimensions * 4
+        start = 0
+        while True:
+            data = f.read(SCAN_BLOCK_ROWS * row_bytes)
+            if len(data) < row_bytes:
+                return
+            block = np.frombuffer(data[:len(data) // row_bytes * row_bytes],
+                                  dtype=np.float32).reshape(
+                                      -1, self.dimensions)
+            yield start, block
+            start += len(block)
+
+    def _write_ids(self):
+        tmp_path = self.ids_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write("".join(f"{chunk_id}\n" for chunk_id in self._ids))
+        os.replace(tmp_path, self.ids_path)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes of the in-memory codes and scales"""
+        with self._lock:
+            self._consolidate()
+            if self._codes is None:
+                return 0
+            scales = self._scales.nbytes if self._scales is not None else 0
+            return self._codes.nbytes + scales
+
+    def _close_files(self):
+        for handle in (self._vector_file, self._id_file):
+            if handle is not None:
+                handle.close()
+        self._vector_file = self._id_file = None
+
+    def close(self):
+        """Save the codes and release the files; the index stays usable"""
+        with self._lock:
+            self._close_files()
+            self._save_codes()
+
+    def save(self):
+        with self._lock:
+            self._save_codes()
+
+    def _save_codes(self):
+        self._consolidate()
+        if self._codes is None or not len(self._codes):
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        arrays = {"method": np.array(self.method), "codes": self._codes}
+        if self._scales is not None:
+            arrays["scales"] = self._scales
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def delete(self):
+        """Remove the index and its files"""
+        with self._lock:
+            self._close_files()
+            self.delete_files(self.path)
+            self._ids = []
+            self._codes = self._scales = None
+            self._pending = []
+
+    @staticmethod
+    def delete_files(path: str):
+        """Remove the files of the index stored at path"""
+        for file_path in (path, f"{path}.vectors", f"{path}.ids"):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    @staticmethod
+    def move_files(path: str, target: str):
+        """Move the files of the closed index at path to target"""
+        for suffix in ("", ".vectors", ".ids"):
+            if os.path.exists(f"{path}{suffix}"):
+                os.replace(f"{path}{suffix}", f"{target}{suffix}")
+
+    @classmethod
+    def open(cls, path: str, method: str,
+             dimensions: int) -> 'QuantizedIndex':
+        """Load the stored index at path, or start an empty one
+
+        Rows written without their id by an interrupted add are dropped,
+        and the codes are recomputed if the cache is stale or was built
+        with another method.
+        """
+        index = cls(method, path, dimensions)
+        if not os.path.exists(index.ids_path) or \
+                not os.path.exists(index.vectors_path):
+            return index
+        with open(index.ids_path, encoding="utf-8") as f:
+            ids = f.read().split("\n")
+        # The last entry is the empty string after the final newline, or
+        # an id cut short by a crash
+        ids = ids[:-1]
+        row_bytes = dimensions * 4
+        rows = min(len(ids), os.path.getsize(index.vectors_path) // row_bytes)
+        if rows != len(ids) or \
+                os.path.getsize(index.vectors_path) != rows * row_bytes:
+            with open(index.vectors_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+            index._ids = ids[:rows]
+            index._write_ids()
+        index._ids = ids[:rows]
+        if not rows:
+            return index
+
+        cached = None
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if str(data["method"]) == method and \
+                        len(data["codes"]) == rows:
+                    cached = (data["codes"],
+                              data["scales"] if "scales" in data else None)
+        if cached is not None:
+            index._codes, index._scales = cached
+            return index
+
+        with open(index.vectors_path, "rb") as f:
+            for _, block in index._iter_blocks(f):
+                index._pending.append(index._encode(block))
+        index.save()
+        return index
@@ -0,0 +1,92 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Keyword rules, checked in order; the first matching type wins
+QUERY_TYPE_KEYWORDS = (
+    ("summary", ("summary", "summarize", "summarise", "overview", "tl;dr",
+                 "main topics", "main points")),
+    ("comparative", ("compare", "difference", "versus", "vs")),
+    ("temporal", ("when", "timeline", "chronological")),
+    ("sentiment", ("sentiment", "opinion", "feel")),
+    ("trend", ("trend", "pattern", "change over time")),
+)
+
+QUESTION_WORDS = {"what", "why", "how", "which", "who", "where", "when"}
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "from", "and", "or",
+    "is", "are", "was", "were", "be", "me", "give", "provide", "please",
+    "document", "documents", "file", "files", "about", "this", "that", "all",
+    "comprehensive", "brief", "short", "detailed", "with", "my", "our", "it"
+}
+
+# Query types that need several passages compared or ordered
+MULTI_HOP_TYPES = {"comparative", "trend"}
+
+SIMPLE_MAX_WORDS = 12
+
+
+@dataclass(frozen=True)
+class QueryRoute:
+    query_type: str
+    complexity: str
+    # Generate similar queries before retrieval
+    expand: bool
+    # Rerank over-fetched candidates before building the context
+    rerank: bool
+    # Answer from precomputed document summaries
+    use_summaries: bool
+    # Query words left after removing stopwords and type keywords
+    subject: str
+
+
+def _matches(text: str, keyword: str) -> bool:
+    if " " in keyword or not keyword.isalnum():
+        return keyword in text
+    return re.search(rf"\b{re.escape(keyword)}\b", text) is not None
+
+
+@lru_cache(maxsize=1024)
+def _route(normalized_query: str) -> QueryRoute:
+    words = [
+        word.strip(".-") for word in re.findall(r"[\w.\-]+", normalized_query)
+    ]
+
+    query_type = "semantic"
+    type_keywords = ()
+    for candidate, keywords in QUERY_TYPE_KEYWORDS:
+        if any(_matches(normalized_query, keyword) for keyword in keywords):
+            query_type = candidate
+            type_keywords = keywords
+            break
+    if query_type == "semantic" and len(words) <= 4 and \
+            not QUESTION_WORDS.intersection(words):
+        query_type = "lookup"
+
+    clauses = len(re.findall(r",|;|\band\b|\bor\b|\bthen\b",
+                             normalized_query))
+    questions = len(QUESTION_WORDS.intersection(words))
+    complex_query = (len(words) > SIMPLE_MAX_WORDS or clauses >= 2 or
+                     questions >= 2 or query_type in MULTI_HOP_TYPES)
+
+    subject = " ".join(
+        word for word in words
+        if word not in STOPWORDS and word not in QUESTION_WORDS and
+        not any(word.startswith(keyword) for keyword in type_keywords))
+
+    return QueryRoute(
+        query_type=query_type,
+        complexity="complex" if complex_query else "simple",
+        expand=complex_query and query_type not in ("lookup", "summary"),
+        rerank=complex_query or query_type == "comparative",
+        use_summaries=query_type == "summary",
+        subject=subject,
+    )
+
+
+class QueryRouter:
+    """Classifies queries locally to decide which LLM stages they need"""
+
+    def route(self, query: str) -> QueryRoute:
+        return _route(" ".join(query.lower().split()))
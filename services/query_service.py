@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.context_builder import ScoredChunk
+from services.query_router import QueryRoute
+from services.reranker import get_reranker
+from services.tracing import Span, activate, span, start_span
+from utils.constants import (CONTEXT_CANDIDATES, DEFAULT_TENANT,
+                             RERANK_CANDIDATES)
+
+
+@dataclass
+class QueryResult:
+    route: QueryRoute
+    # The query as searched (with generated variants when expanded)
+    queries: str = ""
+    answer: Optional[str] = None
+    documents: List[ScoredChunk] = field(default_factory=list)
+    # Precomputed document summaries, when they answer the query
+    summaries: List[Dict] = field(default_factory=list)
+
+
+class QueryService:
+    """Routing, retrieval and answering, independent of any UI"""
+
+    def __init__(self,
+                 vector_store,
+                 llm_service,
+                 database=None,
+                 async_database=None):
+        self.vector_store = vector_store
+        self.llm_service = llm_service
+        self.database = database
+        # AsyncDatabaseService for the a* methods, if available
+        self.async_database = async_database
+
+    def route(self, query: str) -> QueryRoute:
+        # Local routing decides which LLM stages this query needs
+        return self.llm_service.query_router.route(query)
+
+    def find_summaries(self,
+                       route: QueryRoute,
+                       topic: Optional[str] = None,
+                       tenant_id: str = DEFAULT_TENANT) -> List[Dict]:
+        """Precomputed summaries for summary queries, if any match"""
+        if not route.use_summaries or self.database is None:
+            return []
+        try:
+            return self.database.search_summaries(topic or route.subject,
+                                                  tenant_id=tenant_id)
+        except Exception as e:
+            logging.error(f"Error loading summaries: {str(e)}")
+            return []
+
+    async def afind_summaries(self,
+                              route: QueryRoute,
+                              topic: Optional[str] = None,
+                              tenant_id: str = DEFAULT_TENANT) -> List[Dict]:
+        """find_summaries without holding a thread while Postgres answers"""
+        if not route.use_summaries:
+            return []
+        if self.async_database is None:
+            return await asyncio.to_thread(self.find_summaries, route, topic,
+                                           tenant_id)
+        try:
+            return await self.async_database.search_summaries(
+                topic or route.subject, tenant_id=tenant_id)
+        except Exception as e:
+            logging.error(f"Error loading summaries: {str(e)}")
+            return []
+
+    def retrieve(
+            self,
+            query: str,
+            route: QueryRoute,
+            tenant_id: str = DEFAULT_TENANT,
+            search_ef: Optional[int] = None
+    ) -> Tuple[str, List[ScoredChunk]]:
+        """Search the vector store; returns the searched query string and
+        the scored candidates
+
+        search_ef overrides the index's search breadth for this query.
+        Queries routed to reranking, with a reranker configured, fetch
+        more candidates and keep the best by cross-encoder score.
+        """
+        with span("retrieve", tenant_id=tenant_id) as current:
+            # Only complex queries pay for an expansion call
+            queries_string = self.llm_service.create_similar_queries(
+                query) if route.expand else query
+
+            reranker = get_reranker() if route.rerank else None
+            # Over-fetch candidates; the context builder keeps the
+            # relevant, non-redundant ones that fit the token budget
+            scored_results = self.vector_store.search_with_scores(
+                queries_string,
+                top_k=RERANK_CANDIDATES
+                if reranker is not None else CONTEXT_CANDIDATES,
+                tenant_id=tenant_id,
+                search_ef=search_ef)
+            if reranker is not None:
+                scored_results = reranker.rerank(query, scored_results)
+            current.set(results=len(scored_results))
+            return queries_string, scored_results
+
+    @staticmethod
+    def _trace_route(current: Span, route: QueryRoute):
+        current.set(query_type=route.query_type,
+                    complexity=route.complexity,
+                    expand=route.expand,
+                    rerank=route.rerank)
+
+    def answer(self,
+               query: str,
+               topic: Optional[str] = None,
+               tenant_id: str = DEFAULT_TENANT,
+               search_ef: Optional[int] = None) -> QueryResult:
+        with span("query", tenant_id=tenant_id) as current:
+            route = self.route(query)
+            self._trace_route(current, route)
+            summaries = self.find_summaries(route, topic, tenant_id)
+            if summaries:
+                return QueryResult(route=route, summaries=summaries)
+
+            queries_string, scored_results = self.retrieve(
+                query, route, tenant_id, search_ef)
+            answer = self.llm_service.pass_vector_results_as_context(
+                scored_results, query)
+            return QueryResult(route=route,
+                               queries=queries_string,
+                               answer=answer,
+                               documents=scored_results)
+
+    async def aanswer(self,
+                      query: str,
+                      topic: Optional[str] = None,
+                      tenant_id: str = DEFAULT_TENANT,
+                      search_ef: Optional[int] = None) -> QueryResult:
+        """answer() for event loops: summaries are looked up without a
+        thread, retrieval and generation run in one"""
+        with span("query", tenant_id=tenant_id) as current:
+            route = self.route(query)
+            self._trace_route(current, route)
+            summaries = await self.afind_summaries(route, topic, tenant_id)
+            if summaries:
+                return QueryResult(route=route, summaries=summaries)
+
+            # to_thread copies the context, so spans there nest under this
+            queries_string, scored_results = await asyncio.to_thread(
+                self.retrieve, query, route, tenant_id, search_ef)
+            answer = await asyncio.to_thread(
+                self.llm_service.pass_vector_results_as_context,
+                scored_results, query)
+            return QueryResult(route=route,
+                               queries=queries_string,
+                               answer=answer,
+                               documents=scored_results)
+
+    def stream_answer(self,
+                      query: str,
+                      topic: Optional[str] = None,
+                      tenant_id: str = DEFAULT_TENANT,
+                      search_ef: Optional[int] = None) -> Iterator[Dict]:
+        """Yield events: route, then summaries or sources followed by the
+        answer text in pieces as it is generated"""
+        # Started, not activated: the consumer may resume this generator
+        # in another context
+        current = start_span("query", parent=None, tenant_id=tenant_id)
+        try:
+            route = self.route(query)
+            self._trace_route(current, route)
+            yield {"type": "route", "route": route}
+
+            with activate(current):
+                summaries = self.find_summaries(route, topic, tenant_id)
+            if summaries:
+                yield {"type": "summaries", "summaries": summaries}
+                return
+            yield from self.stream_retrieved_answer(query, route, tenant_id,
+                                                    search_ef, current)
+        except Exception as e:
+            current.fail(e)
+            raise
+        finally:
+            current.end()
+
+    def stream_retrieved_answer(
+            self,
+            query: str,
+            route: QueryRoute,
+            tenant_id: str = DEFAULT_TENANT,
+            search_ef: Optional[int] = None,
+            parent: Optional[Span] = None) -> Iterator[Dict]:
+        """The sources and answer events of stream_answer
+
+        Traced as a child of parent, or as a new trace.
+        """
+        current = start_span("answer", parent=parent, tenant_id=tenant_id)
+        try:
+            with activate(current):
+                queries_string, scored_results = self.retrieve(
+                    query, route, tenant_id, search_ef)
+            yield {
+                "type": "sources",
+                "queries": queries_string,
+                "documents": scored_results
+            }
+            stream = self.llm_service.stream_answer(scored_results, query)
+            while True:
+                # The LLM call's span starts on the first step
+                with activate(current):
+                    text = next(stream, None)
+                if text is None:
+                    break
+                yield {"type": "answer", "text": text}
+        except Exception as e:
+            current.fail(e)
+            raise
+        finally:
+            current.end()
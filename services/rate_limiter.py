@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, TypeVar
+
+import openai
+
+from services.metrics import CallRecord
+from utils.constants import (OPENAI_BACKOFF_BASE, OPENAI_BACKOFF_MAX,
+                             OPENAI_MAX_CONCURRENCY, OPENAI_MAX_RETRIES,
+                             OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+T = TypeVar("T")
+
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError,
+                     openai.APIConnectionError, openai.InternalServerError)
+
+
+class _TokenBucket:
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(self.capacity,
+                             self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (after refill)"""
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read Retry-After (seconds or milliseconds) from an API error response"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class RateGovernor:
+    """Process-wide admission control for OpenAI calls
+
+    Calls wait in a priority queue until the request-per-minute and
+    token-per-minute budgets and the adaptive concurrency limit admit
+    them. Rate limit responses halve concurrency and pause admission for
+    the server's Retry-After; successes grow concurrency back additively.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RateGovernor, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.max_concurrency = OPENAI_MAX_CONCURRENCY
+            self.max_retries = OPENAI_MAX_RETRIES
+            self._condition = threading.Condition()
+            self._requests = _TokenBucket(OPENAI_RPM_LIMIT)
+            self._tokens = _TokenBucket(OPENAI_TPM_LIMIT)
+            self._waiting = []
+            self._sequence = itertools.count()
+            self._in_flight = 0
+            self._concurrency = float(self.max_concurrency)
+            self._paused_until = 0.0
+            self._rate_limited = 0
+            self._initialized = True
+
+    def call(self,
+             func: Callable[[], T],
+             priority: int = PRIORITY_INTERACTIVE,
+             tokens: int = 0,
+             call: Optional[CallRecord] = None) -> T:
+        """Run func once admitted, retrying transient errors with backoff"""
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            try:
+                result = func()
+            except _RETRYABLE_ERRORS as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                retry_after = _retry_after(e)
+                self._release(False, rate_limited, retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(OPENAI_BACKOFF_MAX,
+                            OPENAI_BACKOFF_BASE * 2**attempt)
+                delay = max(delay * random.uniform(0.5, 1.0),
+                            retry_after or 0.0)
+                logging.warning(f"OpenAI call failed ({type(e).__name__}), "
+                                f"retrying in {delay:.1f}s")
+                attempt += 1
+                if call is not None:
+                    call.retries += 1
+                time.sleep(delay)
+                continue
+            except Exception:
+                self._release(False)
+                raise
+            self._release(True)
+            return result
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Hold an admission slot for a call consumed incrementally, such as
+        a streamed response; errors are not retried"""
+        self._acquire(priority, tokens)
+        try:
+            yield
+        except Exception as e:
+            self._release(False, isinstance(e, openai.RateLimitError),
+                          _retry_after(e))
+            raise
+        except BaseException:
+            # e.g. GeneratorExit when a streaming client disconnects
+            self._release(False)
+            raise
+        self._release(True)
+
+    def _acquire(self, priority: int, tokens: int):
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                self._requests.refill(now)
+                self._tokens.refill(now)
+                wait = max(self._paused_until - now,
+                           self._requests.wait_time(1),
+                           self._tokens.wait_time(tokens))
+                if self._waiting[0] == ticket and wait <= 0 and \
+                        self._in_flight < int(self._concurrency):
+                    heapq.heappop(self._waiting)
+                    self._requests.available -= 1
+                    self._tokens.available -= min(tokens,
+                                                  self._tokens.capacity)
+                    self._in_flight += 1
+                    # Let the next waiter re-check its turn
+                    self._condition.notify_all()
+                    return
+                # Budget waits are timed; turn and concurrency waits are
+                # woken by notify_all
+                self._condition.wait(
+                    timeout=min(wait, 1.0) if wait > 0 else 1.0)
+
+    def _release(self,
+                 success: bool,
+                 rate_limited: bool = False,
+                 retry_after: Optional[float] = None):
+        with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                self._rate_limited += 1
+                self._concurrency = max(1.0, self._concurrency / 2)
+                if retry_after:
+                    self._paused_until = max(self._paused_until,
+                                             time.monotonic() + retry_after)
+            elif success:
+                self._concurrency = min(
+                    float(self.max_concurrency),
+                    self._concurrency + 1.0 / self._concurrency)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                "concurrency_limit": int(self._concurrency),
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiting),
+                "rate_limited_responses": self._rate_limited,
+                "requests_available": int(self._requests.available),
+                "tokens_available": int(self._tokens.available),
+            }
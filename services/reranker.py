@@ -0,0 +1,177 @@
+"""Cross-encoder reranking of retrieved chunks, on CPU with ONNX Runtime.
+
+RERANKER_MODEL_DIR holds an exported cross-encoder: model.onnx and the
+Hugging Face tokenizer.json (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+exported with optimum). Retrieval over-fetches RERANK_CANDIDATES chunks,
+the model scores each (query, chunk) pair and the best RERANK_TOP_N are
+kept for the context. Reranking is skipped when onnxruntime or tokenizers
+is not installed or no model is configured.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import List, Optional
+
+import numpy as np
+
+from services.context_builder import ScoredChunk
+from services.tracing import span
+from utils.constants import (RERANK_TOP_N, RERANKER_BATCH_SIZE,
+                             RERANKER_CACHE_SIZE, RERANKER_LATENCY_BUDGET_MS,
+                             RERANKER_MAX_LENGTH, RERANKER_MODEL_DIR,
+                             RERANKER_THREADS)
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:  # reranking is optional
+    onnxruntime = None
+
+MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+_reranker: Optional['CrossEncoderReranker'] = None
+_reranker_loaded = False
+_reranker_lock = threading.Lock()
+
+
+def _pair_key(query: str, text: str) -> bytes:
+    return hashlib.blake2b(f"{query}\0{text}".encode("utf-8"),
+                           digest_size=16).digest()
+
+
+class CrossEncoderReranker:
+    """Scores query/chunk pairs with an ONNX cross-encoder
+
+    Scores are cached per (query, chunk) pair, so repeated and refined
+    queries only score chunks they have not seen.
+    """
+
+    def __init__(self,
+                 model_dir: str = RERANKER_MODEL_DIR,
+                 batch_size: int = RERANKER_BATCH_SIZE,
+                 cache_size: int = RERANKER_CACHE_SIZE):
+        options = onnxruntime.SessionOptions()
+        if RERANKER_THREADS:
+            options.intra_op_num_threads = RERANKER_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(
+            os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(RERANKER_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Relevance of each text to the query, between 0 and 1"""
+        encodings = self.tokenizer.encode_batch([(query, text)
+                                                 for text in texts])
+        inputs = {
+            "input_ids": [encoding.ids for encoding in encodings],
+            "attention_mask":
+            [encoding.attention_mask for encoding in encodings],
+            "token_type_ids": [encoding.type_ids for encoding in encodings],
+        }
+        feed = {
+            name: np.array(values, dtype=np.int64)
+            for name, values in inputs.items() if name in self.input_names
+        }
+        logits = np.asarray(self.session.run(None, feed)[0],
+                            dtype=np.float32)
+        if logits.ndim == 2 and logits.shape[1] > 1:
+            # Two-class heads: probability of the relevant class
+            shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return (shifted[:, -1] / shifted.sum(axis=1)).tolist()
+        return (1 / (1 + np.exp(-logits.reshape(-1)))).tolist()
+
+    def _cached(self, key: bytes) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, keys: List[bytes], scores: List[float]):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(
+            self,
+            query: str,
+            candidates: List[ScoredChunk],
+            top_n: int = RERANK_TOP_N,
+            budget_ms: int = RERANKER_LATENCY_BUDGET_MS
+    ) -> List[ScoredChunk]:
+        """The top_n candidates by cross-encoder score
+
+        Uncached candidates are scored in batches in their retrieval
+        order. Once budget_ms is spent, the rest are not scored and rank
+        after the scored ones, in retrieval order (with score 0).
+        """
+        with span("rerank", candidates=len(candidates)) as current:
+            start = time.perf_counter()
+            keys = [
+                _pair_key(query, candidate.document.page_content)
+                for candidate in candidates
+            ]
+            scores = [self._cached(key) for key in keys]
+            pending = [i for i, score in enumerate(scores) if score is None]
+            hits = len(candidates) - len(pending)
+
+            for offset in range(0, len(pending), self.batch_size):
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if budget_ms and offset and elapsed_ms > budget_ms:
+                    logging.warning(
+                        f"Reranking stopped after {elapsed_ms:.0f} ms with "
+                        f"{len(pending) - offset} candidates unscored")
+                    break
+                batch = pending[offset:offset + self.batch_size]
+                batch_scores = self.score(
+                    query,
+                    [candidates[i].document.page_content for i in batch])
+                self._store([keys[i] for i in batch], batch_scores)
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = score
+
+            ranked = sorted(range(len(candidates)),
+                            key=lambda i:
+                            (scores[i] is None, -(scores[i] or 0)))
+            current.set(cached=hits,
+                        unscored=sum(score is None for score in scores))
+            return [
+                replace(candidates[i], score=scores[i] or 0.0)
+                for i in ranked[:top_n]
+            ]
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Return the shared reranker, or None when it is not available"""
+    global _reranker, _reranker_loaded
+    with _reranker_lock:
+        if not _reranker_loaded:
+            _reranker_loaded = True
+            if not RERANKER_MODEL_DIR:
+                return None
+            if onnxruntime is None:
+                logging.warning("RERANKER_MODEL_DIR is set but onnxruntime "
+                                "or tokenizers is not installed")
+                return None
+            try:
+                _reranker = CrossEncoderReranker()
+            except Exception as e:
+                logging.error(f"Error loading reranker: {str(e)}")
+        return _reranker
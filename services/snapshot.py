@@ -0,0 +1,241 @@
+"""Vector index snapshots: export a tenant's chunks, import them elsewhere.
+
+An archive is a ZIP holding:
+
+    manifest.json        version, tenant, embedding model and dimensions,
+                         collection metadata (index parameters), checksums
+    ids.txt              every chunk id in the collection at export time
+    deleted.txt          ids removed since the parent (incremental only)
+    vectors/NNNNN.vdbt   VectorDocumentBatch: ids, metadata, float32 matrix
+    records/NNNNN.jsonl  chunk text, one {"id", "document"} per line
+
+Chunks are never rewritten in place (each write gets a new id), so an
+incremental snapshot is exactly the ids added and removed since its
+parent. Importing one requires the target to hold the parent's ids.
+The commands work on a store no app process has open (see
+services.vector_store.lock_store).
+
+Usage:
+    python -m services.snapshot export PATH [--tenant T] [--parent P]
+    python -m services.snapshot import PATH [--tenant T]
+    python -m services.snapshot info PATH
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+import zipfile
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from models.vector_document import VectorDocumentBatch
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+IDS_FILE = "ids.txt"
+DELETED_FILE = "deleted.txt"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def ids_digest(ids: Sequence[str]) -> str:
+    """Order-independent checksum of a set of chunk ids"""
+    return hashlib.sha256("\n".join(sorted(ids)).encode("utf-8")).hexdigest()
+
+
+class SnapshotWriter:
+    """Writes an archive to a temporary file, moved into place on close"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        self._zip = zipfile.ZipFile(self._tmp_path, "w")
+        self._files: Dict[str, Dict] = {}
+        self._parts: List[Dict] = []
+
+    def _write(self, name: str, data: bytes, compress: bool = True):
+        self._zip.writestr(
+            name, data,
+            zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED)
+        self._files[name] = {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "bytes": len(data),
+        }
+
+    def add_batch(self, batch: VectorDocumentBatch, documents: List[str]):
+        part = len(self._parts)
+        vectors = f"vectors/{part:05d}.vdbt"
+        records = f"records/{part:05d}.jsonl"
+        # float32 noise does not compress
+        self._write(vectors, batch.to_bytes(), compress=False)
+        self._write(
+            records, "".join(
+                json.dumps({
+                    "id": doc_id,
+                    "document": document
+                }) + "\n" for doc_id, document in zip(batch.ids, documents)
+            ).encode("utf-8"))
+        self._parts.append({
+            "vectors": vectors,
+            "records": records,
+            "count": len(batch)
+        })
+
+    def close(self, manifest: Dict, ids: Sequence[str],
+              deleted: Sequence[str]) -> Dict:
+        """Write ids, deletions and the manifest; returns the manifest"""
+        self._write(IDS_FILE, "\n".join(ids).encode("utf-8"))
+        if deleted:
+            self._write(DELETED_FILE, "\n".join(deleted).encode("utf-8"))
+        manifest = {
+            **manifest,
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "count": len(ids),
+            "added": sum(part["count"] for part in self._parts),
+            "deleted": len(deleted),
+            "ids_sha256": ids_digest(ids),
+            "parts": self._parts,
+            "files": self._files,
+        }
+        self._zip.writestr(MANIFEST_FILE, json.dumps(manifest, indent=2))
+        self._zip.close()
+        os.replace(self._tmp_path, self.path)
+        return manifest
+
+    def abort(self):
+        self._zip.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def new_snapshot_id() -> str:
+    return time.strftime("%Y%m%dT%H%M%SZ",
+                         time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+
+
+class SnapshotReader:
+    """Reads and verifies an archive written by SnapshotWriter"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        try:
+            self.manifest = json.loads(self._zip.read(MANIFEST_FILE))
+        except KeyError:
+            self._zip.close()
+            raise SnapshotError(f"{path} has no {MANIFEST_FILE}")
+        version = self.manifest.get("format_version")
+        if version != SNAPSHOT_FORMAT_VERSION:
+            self._zip.close()
+            raise SnapshotError(f"Unsupported snapshot version: {version}")
+
+    def __enter__(self) -> 'SnapshotReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def verify(self):
+        """Check every file against its manifest checksum"""
+        for name, expected in self.manifest["files"].items():
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with self._zip.open(name) as f:
+                    while block := f.read(1024 * 1024):
+                        digest.update(block)
+                        size += len(block)
+            except KeyError:
+                raise SnapshotError(f"Snapshot is missing {name}")
+            if digest.hexdigest() != expected["sha256"] or \
+                    size != expected["bytes"]:
+                raise SnapshotError(f"Checksum mismatch for {name}")
+
+    def _read_lines(self, name: str) -> List[str]:
+        if name not in self.manifest["files"]:
+            return []
+        data = self._zip.read(name).decode("utf-8")
+        return data.split("\n") if data else []
+
+    def ids(self) -> List[str]:
+        return self._read_lines(IDS_FILE)
+
+    def deleted(self) -> List[str]:
+        return self._read_lines(DELETED_FILE)
+
+    def added_ids(self) -> List[str]:
+        """Ids of the chunks the archive holds, without their vectors"""
+        ids = []
+        for part in self.manifest["parts"]:
+            ids.extend(
+                json.loads(line)["id"] for line in self._zip.read(
+                    part["records"]).decode("utf-8").splitlines())
+        return ids
+
+    def iter_batches(
+            self) -> Iterator[Tuple[VectorDocumentBatch, List[str]]]:
+        """Yield each part's vectors with the matching chunk texts"""
+        for part in self.manifest["parts"]:
+            batch = VectorDocumentBatch.from_bytes(
+                self._zip.read(part["vectors"]))
+            records = [
+                json.loads(line) for line in self._zip.read(
+                    part["records"]).decode("utf-8").splitlines()
+            ]
+            if [record["id"] for record in records] != batch.ids:
+                raise SnapshotError(
+                    f"{part['records']} does not match {part['vectors']}")
+            yield batch, [record["document"] for record in records]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export or import vector index snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--tenant", default=None)
+    export_parser.add_argument(
+        "--parent", help="earlier snapshot to export changes since")
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument(
+        "--tenant", help="tenant to restore into (default: the exported one)")
+    info_parser = subparsers.add_parser("info")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        with SnapshotReader(args.path) as reader:
+            manifest = dict(reader.manifest)
+        manifest.pop("files")
+        manifest.pop("parts")
+        print(json.dumps(manifest, indent=2))
+        return
+
+    from services.vector_store import VectorStoreService, lock_store
+    from utils.constants import DEFAULT_TENANT
+    # Refuses to run while the app has the store open
+    lock_store(exclusive=True)
+    vector_store = VectorStoreService()
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = vector_store.export_snapshot(args.path, args.tenant
+                                                or DEFAULT_TENANT,
+                                                args.parent)
+    else:
+        manifest = vector_store.import_snapshot(args.path, args.tenant)
+    print(f"{args.command}ed snapshot {manifest['snapshot_id']}: "
+          f"{manifest['added']} chunks added, {manifest['deleted']} "
+          f"deleted, {manifest['count']} total in "
+          f"{time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
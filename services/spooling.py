@@ -0,0 +1,119 @@
+"""Keep large uploads on disk instead of in memory.
+
+Payloads up to SPOOL_THRESHOLD_BYTES stay as bytes; larger files are
+copied to a temporary file once, and handlers open, memory-map or hand
+that path to their parser. Worker processes receive the path rather than
+the contents.
+"""
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional, Union
+
+from utils.constants import SPOOL_DIRECTORY, SPOOL_THRESHOLD_BYTES
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledFile:
+    """A file on disk standing in for an upload's contents"""
+    path: str
+    # Original file name, recorded in metadata
+    name: str
+    size: int
+    # Deleted by release(); borrowed files belong to the caller
+    owned: bool = True
+
+
+Payload = Union[bytes, SpooledFile]
+
+
+def spool(file: BinaryIO,
+          name: Optional[str] = None,
+          threshold: int = SPOOL_THRESHOLD_BYTES) -> Payload:
+    """Read a small file into memory, or copy a large one to disk
+
+    The file is read sequentially, so unseekable streams such as ZIP
+    members work too.
+    """
+    name = name or file.name
+    head = file.read(threshold + 1)
+    if len(head) <= threshold:
+        return head
+    fd, path = tempfile.mkstemp(suffix=f"-{os.path.basename(name)}",
+                                dir=SPOOL_DIRECTORY)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(head)
+            del head
+            shutil.copyfileobj(file, out, COPY_BUFFER_SIZE)
+            size = out.tell()
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledFile(path, name, size)
+
+
+def payload_size(payload: Payload) -> int:
+    if isinstance(payload, SpooledFile):
+        return payload.size
+    return len(payload)
+
+
+def content_hash(payload: Payload) -> str:
+    """SHA-256 of a payload's contents"""
+    digest = hashlib.sha256()
+    if isinstance(payload, SpooledFile):
+        with open(payload.path, 'rb') as file:
+            while block := file.read(COPY_BUFFER_SIZE):
+                digest.update(block)
+    else:
+        digest.update(payload)
+    return digest.hexdigest()
+
+
+@contextmanager
+def open_payload(payload: Payload, name: str) -> Iterator[BinaryIO]:
+    """Open a payload as a binary file"""
+    if isinstance(payload, SpooledFile):
+        with open(payload.path, 'rb') as file:
+            yield file
+    else:
+        file = io.BytesIO(payload)
+        file.name = name
+        yield file
+
+
+def release(payload):
+    """Delete a spooled payload's temporary file"""
+    if isinstance(payload, SpooledFile) and payload.owned:
+        try:
+            os.remove(payload.path)
+        except FileNotFoundError:
+            pass
+
+
+def local_path(file: BinaryIO) -> Optional[str]:
+    """Path of a file opened from disk, for parsers that read paths"""
+    name = getattr(file, 'name', None)
+    if isinstance(file, (io.BufferedReader, io.FileIO)) and isinstance(
+            name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def iter_blocks(file: BinaryIO, block_size: int) -> Iterator[bytes]:
+    """Read a file in blocks, memory-mapping it when it is on disk"""
+    if local_path(file) is not None and os.fstat(file.fileno()).st_size:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), block_size):
+                yield mapped[start:start + block_size]
+        return
+    while data := file.read(block_size):
+        yield data
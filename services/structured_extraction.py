@@ -0,0 +1,167 @@
+import json
+import xml.etree.ElementTree as ET
+from typing import Any, BinaryIO, Iterator, List, Tuple
+
+try:
+    import ijson
+except ImportError:  # fall back to json.load, which reads the whole file
+    ijson = None
+
+_SCALAR_EVENTS = {"null", "boolean", "integer", "double", "number", "string"}
+
+# Records are the items of a top-level array and the items of an array
+# held by a top-level key (e.g. {"data": [...]}). The other fields of a
+# top-level object are kept together as one record.
+
+
+def _iter_json_events(value: Any) -> Iterator[Tuple[str, Any]]:
+    """Produce ijson.basic_parse style events for an already loaded value"""
+    if isinstance(value, dict):
+        yield "start_map", None
+        for key, item in value.items():
+            yield "map_key", key
+            yield from _iter_json_events(item)
+        yield "end_map", None
+    elif isinstance(value, list):
+        yield "start_array", None
+        for item in value:
+            yield from _iter_json_events(item)
+        yield "end_array", None
+    else:
+        yield "string", value
+
+
+def _format_path(stack: List[list]) -> str:
+    path = ""
+    for kind, position in stack:
+        if kind == "array":
+            path += f"[{position}]"
+        else:
+            path += f".{position}" if path else str(position)
+    return path
+
+
+def _format_json_value(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def iter_json_records(file: BinaryIO) -> Iterator[str]:
+    """Stream a JSON document as records of path=value lines"""
+    if ijson is not None:
+        events = ijson.basic_parse(file, use_float=True)
+    else:
+        events = _iter_json_events(json.load(file))
+
+    # Each frame is [kind, key or index] for an open container
+    stack: List[list] = []
+    lines: List[str] = []
+
+    for event, value in events:
+        if event == "map_key":
+            stack[-1][1] = value
+            continue
+
+        if event in ("end_map", "end_array"):
+            stack.pop()
+        else:
+            if stack and stack[-1][0] == "array":
+                stack[-1][1] += 1
+            if event == "start_map":
+                stack.append(["map", None])
+                continue
+            if event == "start_array":
+                if lines and len(stack) == 1 and stack[0][0] == "map":
+                    # Fields before a top-level array are a record of
+                    # their own
+                    yield "\n".join(lines)
+                    lines = []
+                stack.append(["array", -1])
+                continue
+            lines.append(
+                f"{_format_path(stack) or 'value'}={_format_json_value(value)}"
+            )
+
+        # A value just completed; flush if it was a record
+        if lines and stack and stack[-1][0] == "array" and len(stack) <= 2:
+            yield "\n".join(lines)
+            lines = []
+
+    if lines:
+        yield "\n".join(lines)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else str(tag)
+
+
+def iter_xml_records(file: BinaryIO) -> Iterator[str]:
+    """Stream the text of each child of the root element as one record
+
+    Elements are cleared once their record is emitted, so memory is bounded
+    by the largest record rather than the whole document. Text between
+    top-level elements starts the record of the element that follows it.
+    """
+    # Each frame is [element, path, text_emitted]
+    stack: List[list] = []
+    lines: List[str] = []
+    root = None
+    # The last top-level element, kept until the text after it is parsed
+    previous = None
+
+    def emit_tail(path):
+        nonlocal previous
+        if previous is not None:
+            tail = (previous.tail or "").strip()
+            if tail:
+                lines.append(f"{path}: {tail}")
+            root.remove(previous)
+            previous = None
+
+    def emit_text(frame):
+        element, path, emitted = frame
+        if not emitted:
+            text = (element.text or "").strip()
+            if text:
+                lines.append(f"{path}: {text}")
+            frame[2] = True
+
+    for event, element in ET.iterparse(file, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            if stack:
+                # The parent's leading text is complete once a child starts
+                emit_text(stack[-1])
+            if len(stack) == 1:
+                emit_tail(stack[0][1])
+            parent_path = stack[-1][1] if len(stack) > 1 else ""
+            name = _local_name(element.tag)
+            path = f"{parent_path}/{name}" if parent_path else name
+            stack.append([element, path, False])
+            for attribute, value in element.attrib.items():
+                lines.append(f"{path}/@{_local_name(attribute)}: {value}")
+            continue
+
+        frame = stack.pop()
+        emit_text(frame)
+        if not stack:
+            emit_tail(frame[1])
+        for child in element:
+            tail = (child.tail or "").strip()
+            if tail:
+                lines.append(f"{frame[1]}: {tail}")
+
+        if len(stack) == 1 or not stack:
+            if lines:
+                yield "\n".join(lines)
+                lines = []
+            if stack:
+                # The tail may already be parsed; clear() would drop it
+                tail = element.tail
+                element.clear()
+                element.tail = tail
+                previous = element
@@ -0,0 +1,401 @@
+"""Lightweight tracing: timed, nested spans with attributes.
+
+A span times one step, such as parsing a file, embedding a batch or
+answering a query. A span opened while another is active (in the same
+thread, or async task through contextvars) becomes its child; work handed
+to another thread names its parent explicitly. Finished spans are kept in
+memory for the UI and, with TRACE_FILE set, appended to it as JSON lines
+by a background writer. To view them in chrome://tracing or Perfetto:
+
+    python -m services.tracing chrome traces.jsonl trace.json [--trace ID]
+
+With TRACE_PROFILE_SLOW_MS set, a sampling profiler records the stacks of
+threads inside spans. Every trace slower than that threshold gets a
+collapsed-stack file in TRACE_PROFILE_DIR, which flamegraph.pl,
+speedscope and similar tools can render as a flamegraph.
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from utils.constants import (TRACE_BUFFER_SPANS, TRACE_FILE,
+                             TRACE_FILE_MAX_BYTES, TRACE_PROFILE_DIR,
+                             TRACE_PROFILE_INTERVAL_MS, TRACE_PROFILE_SLOW_MS,
+                             TRACE_QUEUE_SPANS)
+
+# Traces whose profiler samples are held at once; the oldest are dropped
+MAX_PROFILED_TRACES = 100
+# Spans written to TRACE_FILE per write call
+WRITE_BATCH_SPANS = 500
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span',
+                                                         default=None)
+# Marks "use the active span" as a parent, since None means "no parent"
+_ACTIVE = object()
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    # Wall-clock start, seconds since the epoch
+    start: float
+    attributes: Dict = field(default_factory=dict)
+    duration: Optional[float] = None
+    error: Optional[str] = None
+    thread_id: int = 0
+    thread_name: str = ""
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self, error: Optional[BaseException] = None):
+        """Finish the span; later calls are ignored"""
+        if self.duration is not None:
+            return
+        if error is not None:
+            self.fail(error)
+        self.duration = time.perf_counter() - self._started
+        Tracer().record(self)
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "pid": os.getpid(),
+            "thread_id": self.thread_id,
+            "thread_name": self.thread_name,
+            "attributes": self.attributes,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, parent=_ACTIVE, **attributes) -> Span:
+    """Begin a span; call end() on it when done
+
+    The parent defaults to the active span; parent=None starts a new
+    trace. The span does not become active (see span() and activate()).
+    """
+    if parent is _ACTIVE:
+        parent = _current_span.get()
+    thread = threading.current_thread()
+    return Span(name=name,
+                trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+                span_id=_new_id(),
+                parent_id=parent.span_id if parent else None,
+                start=time.time(),
+                attributes=attributes,
+                thread_id=thread.ident,
+                thread_name=thread.name)
+
+
+@contextmanager
+def activate(current: Span) -> Iterator[Span]:
+    """Make an open span the parent of spans started in this block"""
+    token = _current_span.set(current)
+    profiler = Tracer().profiler
+    previous = profiler.enter(current.trace_id) if profiler else None
+    try:
+        yield current
+    finally:
+        if profiler:
+            profiler.exit(previous)
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, parent=_ACTIVE, **attributes) -> Iterator[Span]:
+    """Time the block as a span, active for the spans started inside it
+
+    Not for blocks that yield from a generator: the consumer could
+    resume it in another context. Use start_span() there.
+    """
+    current = start_span(name, parent, **attributes)
+    try:
+        with activate(current):
+            yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    current.end()
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads working inside spans, per trace"""
+
+    def __init__(self,
+                 interval_ms: int = TRACE_PROFILE_INTERVAL_MS,
+                 slow_ms: int = TRACE_PROFILE_SLOW_MS,
+                 directory: str = TRACE_PROFILE_DIR):
+        self.interval = interval_ms / 1000
+        self.slow_seconds = slow_ms / 1000
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Thread ident -> trace it is working on
+        self._threads: Dict[int, str] = {}
+        self._samples: "OrderedDict[str, Counter]" = OrderedDict()
+        threading.Thread(target=self._run,
+                         name="trace-profiler",
+                         daemon=True).start()
+
+    def enter(self, trace_id: str) -> Optional[str]:
+        """Attribute this thread's samples to trace_id; returns the
+        previous trace, for exit()"""
+        ident = threading.get_ident()
+        with self._lock:
+            previous = self._threads.get(ident)
+            self._threads[ident] = trace_id
+        return previous
+
+    def exit(self, previous: Optional[str]):
+        ident = threading.get_ident()
+        with self._lock:
+            if previous is None:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] = previous
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} "
+                         f"({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            stacks = [(trace_id, self._collapse(frames[ident]))
+                      for ident, trace_id in threads if ident in frames]
+            with self._lock:
+                for trace_id, stack in stacks:
+                    samples = self._samples.get(trace_id)
+                    if samples is None:
+                        samples = self._samples[trace_id] = Counter()
+                        while len(self._samples) > MAX_PROFILED_TRACES:
+                            self._samples.popitem(last=False)
+                    samples[stack] += 1
+
+    def finish(self, root: Span) -> Optional[str]:
+        """Write a slow trace's samples; returns the file written"""
+        with self._lock:
+            samples = self._samples.pop(root.trace_id, None)
+        if not samples or root.duration < self.slow_seconds:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory,
+                            f"{root.name}-{root.trace_id}.folded")
+        with open(path, "w") as out:
+            for stack, count in samples.most_common():
+                out.write(f"{stack} {count}\n")
+        logging.info(f"Profiled slow {root.name} ({root.duration:.2f}s, "
+                     f"{sum(samples.values())} samples): {path}")
+        return path
+
+
+class Tracer:
+    """Process-wide sink for finished spans"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Tracer, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self._lock = threading.Lock()
+            self._spans = deque(maxlen=TRACE_BUFFER_SPANS)
+            self._file = None
+            self.path = TRACE_FILE.replace("{pid}", str(
+                os.getpid())) if TRACE_FILE else None
+            # Spans not yet written, and those dropped with it full
+            self._export = queue.Queue(TRACE_QUEUE_SPANS)
+            self.dropped = 0
+            if self.path:
+                threading.Thread(target=self._run_writer,
+                                 name="trace-writer",
+                                 daemon=True).start()
+                atexit.register(self.flush)
+            self.profiler = SamplingProfiler(
+            ) if TRACE_PROFILE_SLOW_MS else None
+            self._initialized = True
+
+    def record(self, finished: Span):
+        with self._lock:
+            self._spans.append(finished)
+        if self.path:
+            try:
+                self._export.put_nowait(finished)
+            except queue.Full:
+                self.dropped += 1
+        if finished.parent_id is None and self.profiler is not None:
+            self.profiler.finish(finished)
+
+    def _run_writer(self):
+        while True:
+            batch = [self._export.get()]
+            while len(batch) < WRITE_BATCH_SPANS:
+                try:
+                    batch.append(self._export.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.path:
+                    self._write("".join(
+                        json.dumps(item.as_dict(), default=str) + "\n"
+                        for item in batch))
+            except OSError as e:
+                logging.error(f"Error writing trace file: {str(e)}")
+                self.path = None
+            finally:
+                for _ in batch:
+                    self._export.task_done()
+
+    def _write(self, text: str):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(text)
+        self._file.flush()
+        if self._file.tell() > TRACE_FILE_MAX_BYTES:
+            self._file.close()
+            os.replace(self.path, f"{self.path}.1")
+            self._file = None
+
+    def flush(self):
+        """Wait until every span recorded so far is written"""
+        if self.path:
+            self._export.join()
+
+    def recent_traces(self, limit: int = 50) -> List[Span]:
+        """The latest finished root spans, newest first"""
+        with self._lock:
+            roots = [item for item in self._spans if item.parent_id is None]
+        return roots[::-1][:limit]
+
+    def trace(self, trace_id: str) -> List[Span]:
+        """A trace's finished spans still in memory, by start time"""
+        with self._lock:
+            spans = [item for item in self._spans if item.trace_id == trace_id]
+        return sorted(spans, key=lambda item: item.start)
+
+
+def span_tree(spans: List[Span]) -> List[Dict]:
+    """Rows of a trace's spans, depth-first, with their nesting depth"""
+    children: Dict[Optional[str], List[Span]] = {}
+    ids = {item.span_id for item in spans}
+    for item in spans:
+        parent = item.parent_id if item.parent_id in ids else None
+        children.setdefault(parent, []).append(item)
+
+    rows = []
+
+    def visit(parent_id: Optional[str], depth: int):
+        for item in children.get(parent_id, []):
+            rows.append({
+                "span": "  " * depth + item.name,
+                "start_ms": round((item.start - spans[0].start) * 1000, 1),
+                "duration_ms": round(item.duration * 1000, 1),
+                "error": item.error,
+                "attributes": json.dumps(item.attributes, default=str),
+            })
+            visit(item.span_id, depth + 1)
+
+    if spans:
+        visit(None, 0)
+    return rows
+
+
+def to_chrome_trace(spans: List[Dict]) -> Dict:
+    """Chrome trace event format for span dicts read from TRACE_FILE"""
+    events = []
+    threads = set()
+    for item in spans:
+        events.append({
+            "name": item["name"],
+            "cat": item["trace_id"],
+            "ph": "X",
+            "ts": item["start"] * 1e6,
+            "dur": item["duration"] * 1e6,
+            "pid": item["pid"],
+            "tid": item["thread_id"],
+            "args": {
+                **item["attributes"],
+                "span_id": item["span_id"],
+                "parent_id": item["parent_id"],
+                "error": item["error"],
+            },
+        })
+        threads.add((item["pid"], item["thread_id"], item["thread_name"]))
+    for pid, tid, name in threads:
+        events.append({
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": tid,
+            "args": {
+                "name": name
+            }
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert recorded traces")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    chrome_parser = subparsers.add_parser(
+        "chrome", help="write the Chrome trace format (Perfetto, "
+        "chrome://tracing)")
+    chrome_parser.add_argument("path", help="JSONL trace file")
+    chrome_parser.add_argument("output")
+    chrome_parser.add_argument("--trace", help="only this trace ID")
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if args.trace:
+        spans = [item for item in spans if item["trace_id"] == args.trace]
+    with open(args.output, "w") as out:
+        json.dump(to_chrome_trace(spans), out)
+    print(f"Wrote {len(spans)} spans to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
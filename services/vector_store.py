@@ -1,13 +1,188 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+import chromadb
+from chromadb.config import Settings
+from chromadb.segment import VectorReader
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
-from typing import List, Dict
-from dataclasses import dataclass
+from typing import Iterable, List, Dict, Optional
+from dataclasses import dataclass, field
 from langchain.load import dumps, loads
+import numpy as np
+from services.chunking import TextChunker
+from services.context_builder import ScoredChunk
+from services.embeddings import InstrumentedEmbeddings
+from services.ingest_registry import get_ingest_registry
+from models.vector_document import VectorDocumentBatch
+from services.quantization import QuantizedIndex
+from services.tracing import span
+from services.snapshot import (SnapshotError, SnapshotReader,
+                               SnapshotWriter, ids_digest, new_snapshot_id)
+from utils.constants import (CHROMA_PERSIST_DIRECTORY,
+                             CHROMA_SEGMENT_CACHE_BYTES, CONTEXT_CANDIDATES,
+                             DEFAULT_TENANT, EMBEDDING_DIMENSIONS,
+                             EMBEDDING_MODEL, EMBEDDING_MODEL_DIMENSIONS,
+                             EMBEDDING_QUANTIZATION, HNSW_CONSTRUCTION_EF,
+                             HNSW_M, HNSW_SEARCH_EF, INDEX_BATCH_SIZE,
+                             QUANTIZED_INDEX_FILE, QUANTIZED_RESCORE_FACTOR,
+                             SNAPSHOT_BATCH_SIZE, TENANT_CACHE_SIZE,
+                             TENANT_MAX_CHUNKS, VECTOR_BACKEND)
+from utils.validators import validate_tenant_id
+
+# LangChain's default collection, which predates tenants
+DEFAULT_COLLECTION = "langchain"
+# Collection metadata key naming the quantization of a collection whose
+# vectors are kept in a QuantizedIndex; Chroma then holds PLACEHOLDER
+# embeddings, so its HNSW index costs next to no memory
+QUANTIZATION_KEY = "quantization"
+PLACEHOLDER_EMBEDDING = [0.0]
+# In CHROMA_PERSIST_DIRECTORY; see lock_store() and write_lock()
+STORE_LOCK_FILE = ".store.lock"
+WRITE_LOCK_FILE = ".write.lock"
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_store_lock = None
+
+
+class TenantQuotaExceeded(Exception):
+    pass
+
+
+@dataclass
+class TenantStats:
+    chunks_added: int = 0
+    searches: int = 0
+    search_seconds: float = 0.0
+    loads: int = 0
+    last_used: float = 0.0
+
+
+@dataclass
+class TenantIndex:
+    """An open tenant collection and, for quantized collections, the
+    index holding its vectors"""
+    tenant_id: str
+    vectorstore: Chroma
+    quantized_index: Optional[QuantizedIndex]
+    # Serializes queries that change the HNSW search ef
+    ef_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def create_embeddings() -> InstrumentedEmbeddings:
+    return InstrumentedEmbeddings(
+        OpenAIEmbeddings(model=EMBEDDING_MODEL,
+                         dimensions=EMBEDDING_DIMENSIONS or None,
+                         max_retries=0), EMBEDDING_MODEL)
+
+
+def lock_store(exclusive: bool = False):
+    """Lock CHROMA_PERSIST_DIRECTORY for the rest of this process
+
+    Chroma keeps the open indexes in process memory, so one store cannot
+    be written from two places at once. Every VectorStoreService holds
+    the lock shared; the snapshot CLI takes it exclusively first, and so
+    refuses to run while the app has the store open (and vice versa).
+    Without fcntl (Windows) the check is skipped.
+    """
+    global _store_lock
+    if _store_lock is not None or fcntl is None:
+        return
+    os.makedirs(CHROMA_PERSIST_DIRECTORY, exist_ok=True)
+    lock_file = open(os.path.join(CHROMA_PERSIST_DIRECTORY, STORE_LOCK_FILE),
+                     "a")
+    try:
+        fcntl.flock(lock_file,
+                    (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                    | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(
+            f"{CHROMA_PERSIST_DIRECTORY} is in use by another process"
+            + ("; stop the app before running snapshot commands"
+               if exclusive else " (a snapshot command)"))
+    _store_lock = lock_file
+
+
+@contextmanager
+def write_lock():
+    """Serialize a write with those of other processes sharing the store,
+    so a tenant's quota check and the write it admits are atomic"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(CHROMA_PERSIST_DIRECTORY, WRITE_LOCK_FILE),
+              "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_vector_store():
+    """The vector store selected by VECTOR_BACKEND"""
+    if VECTOR_BACKEND == 'pgvector':
+        # Imported here so the Chroma backend does not need psycopg
+        from services.pgvector_store import PgVectorStoreService
+        return PgVectorStoreService()
+    return VectorStoreService()
+
+
+def hnsw_collection_metadata() -> Optional[Dict]:
+    """HNSW parameters for new collections; unset ones use Chroma's"""
+    metadata = {
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": HNSW_SEARCH_EF,
+    }
+    return {key: value for key, value in metadata.items() if value} or None
+
+
+def new_collection_metadata(
+        hnsw_metadata: Optional[Dict] = None) -> Optional[Dict]:
+    """Metadata for a new collection: HNSW parameters and, with
+    EMBEDDING_QUANTIZATION set, the quantization its vectors are kept in"""
+    metadata = dict(hnsw_metadata or {})
+    metadata.pop(QUANTIZATION_KEY, None)
+    if EMBEDDING_QUANTIZATION != "none":
+        metadata[QUANTIZATION_KEY] = EMBEDDING_QUANTIZATION
+    return metadata or None
+
+
+def collection_name(tenant_id: str) -> str:
+    is_valid, error_msg = validate_tenant_id(tenant_id)
+    if not is_valid:
+        raise ValueError(error_msg)
+    if tenant_id == DEFAULT_TENANT:
+        return DEFAULT_COLLECTION
+    return f"tenant-{tenant_id}"
+
+
+def quantized_index_path(tenant_id: str) -> str:
+    name = collection_name(tenant_id)
+    index_file = QUANTIZED_INDEX_FILE if tenant_id == DEFAULT_TENANT \
+        else f"{name}.{QUANTIZED_INDEX_FILE}"
+    return os.path.join(CHROMA_PERSIST_DIRECTORY, index_file)
 
 
 class VectorStoreService:
+    """Chunk storage and similarity search, one Chroma collection per tenant
+
+    Tenant collections are opened on first use and the least recently
+    used are closed beyond TENANT_CACHE_SIZE; Chroma's segment cache
+    unloads idle indexes beyond CHROMA_SEGMENT_CACHE_BYTES.
+    """
     _instance = None
 
     def __new__(cls):
@@ -18,37 +193,356 @@ class VectorStoreService:
 
     def __init__(self):
         if not self._initialized:
-            self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-            self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-                chunk_size=300, chunk_overlap=50)
-            self.vectorstore = Chroma(persist_directory="./chroma_store",
-                                      embedding_function=self.embeddings)
+            lock_store()
+            self.embeddings = create_embeddings()
+            self.text_splitter = TextChunker()
+            settings = Settings(is_persistent=True,
+                                persist_directory=CHROMA_PERSIST_DIRECTORY)
+            if CHROMA_SEGMENT_CACHE_BYTES:
+                settings.chroma_segment_cache_policy = "LRU"
+                settings.chroma_memory_limit_bytes = CHROMA_SEGMENT_CACHE_BYTES
+            self.client = chromadb.PersistentClient(
+                path=CHROMA_PERSIST_DIRECTORY, settings=settings)
+            self._tenants: "OrderedDict[str, TenantIndex]" = OrderedDict()
+            self._tenant_stats: Dict[str, TenantStats] = {}
+            self._lock = threading.Lock()
+            # Serializes opening tenants: Chroma races when two threads
+            # create the same collection
+            self._open_lock = threading.Lock()
+            # Held by every write, so a snapshot sees no partial batches;
+            # write_lock() extends it to other processes
+            self._write_lock = threading.RLock()
             self._initialized = True
 
-    def add_documents(self, text: str, metadata: dict):
+    @property
+    def vectorstore(self) -> Chroma:
+        """The default tenant's collection"""
+        return self._tenant(DEFAULT_TENANT).vectorstore
+
+    def _stats(self, tenant_id: str) -> TenantStats:
+        return self._tenant_stats.setdefault(tenant_id, TenantStats())
+
+    def _tenant(self, tenant_id: str) -> TenantIndex:
+        """Open tenant handle, loading it and evicting idle ones as needed"""
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+                self._stats(tenant_id).last_used = time.time()
+                return tenant
+
+        with self._open_lock:
+            with self._lock:
+                # Another thread may have opened it meanwhile
+                opened = self._tenants.get(tenant_id)
+            if opened is not None:
+                return opened
+            tenant = self._open_tenant(tenant_id)
+
+            evicted = []
+            with self._lock:
+                self._tenants[tenant_id] = tenant
+                stats = self._stats(tenant_id)
+                stats.loads += 1
+                stats.last_used = time.time()
+                while len(self._tenants) > TENANT_CACHE_SIZE:
+                    evicted.append(self._tenants.popitem(last=False)[1])
+        for idle in evicted:
+            if idle.quantized_index is not None:
+                idle.quantized_index.close()
+        return tenant
+
+    def _open_tenant(self, tenant_id: str) -> TenantIndex:
+        # Existing collections keep the parameters and quantization they
+        # were created with
+        vectorstore = Chroma(
+            client=self.client,
+            collection_name=collection_name(tenant_id),
+            embedding_function=self.embeddings,
+            persist_directory=CHROMA_PERSIST_DIRECTORY,
+            collection_metadata=new_collection_metadata(
+                hnsw_collection_metadata()))
+        return TenantIndex(tenant_id, vectorstore,
+                           self._open_quantized_index(tenant_id, vectorstore))
+
+    def _open_quantized_index(
+            self,
+            tenant_id: str,
+            vectorstore: Chroma,
+            path: Optional[str] = None) -> Optional[QuantizedIndex]:
+        """The vector index of a quantized collection, or None for one
+        that keeps its vectors in Chroma"""
+        method = (vectorstore._collection.metadata
+                  or {}).get(QUANTIZATION_KEY)
+        if method is None:
+            if EMBEDDING_QUANTIZATION != "none":
+                logging.warning(
+                    f"Tenant {tenant_id} predates EMBEDDING_QUANTIZATION "
+                    "and keeps float32 vectors; export and re-import a "
+                    "snapshot to quantize it")
+            return None
+        return QuantizedIndex.open(path or quantized_index_path(tenant_id),
+                                   method, EMBEDDING_DIMENSIONS
+                                   or EMBEDDING_MODEL_DIMENSIONS)
+
+    def _check_quota(self, tenant: TenantIndex, new_chunks: int):
+        if not TENANT_MAX_CHUNKS:
+            return
+        if tenant.vectorstore._collection.count() + new_chunks > \
+                TENANT_MAX_CHUNKS:
+            raise TenantQuotaExceeded(
+                f"Tenant {tenant.tenant_id} would exceed its quota of "
+                f"{TENANT_MAX_CHUNKS} chunks")
+
+    def embed_documents(self, docs: List[Document]) -> List[List[float]]:
+        return self.embeddings.embed_documents(
+            [doc.page_content for doc in docs])
+
+    def _write_embedded(self, tenant: TenantIndex, docs: List[Document],
+                        embeddings: List[List[float]]):
+        """Write one batch of embedded chunks"""
+        ids = [str(uuid.uuid4()) for _ in docs]
+        self._upsert(tenant, ids, embeddings,
+                     [doc.page_content for doc in docs],
+                     [doc.metadata for doc in docs])
+
+    def _upsert(self, tenant: TenantIndex, ids: List[str], embeddings,
+                documents: List[str], metadatas: List[Dict]):
+        with span("index.upsert", chunks=len(ids)), self._write_lock, \
+                write_lock():
+            # Counted and written under both locks, so concurrent writers
+            # cannot overshoot the quota together
+            self._check_quota(tenant, len(ids))
+            if tenant.quantized_index is not None:
+                # Vectors go to the quantized index; a chunk it holds but
+                # Chroma lacks after a crash is skipped by searches
+                tenant.quantized_index.add(ids, np.asarray(embeddings))
+                embeddings = [PLACEHOLDER_EMBEDDING] * len(ids)
+            tenant.vectorstore._collection.upsert(ids=ids,
+                                                  embeddings=embeddings,
+                                                  documents=documents,
+                                                  metadatas=metadatas)
+        self._stats(tenant.tenant_id).chunks_added += len(ids)
+
+    def write_embedded(self,
+                       docs: List[Document],
+                       embeddings: List[List[float]],
+                       tenant_id: str = DEFAULT_TENANT):
+        """Store chunks embedded by the caller (see embed_documents)"""
+        self._write_embedded(self._tenant(tenant_id), docs, embeddings)
+
+    def _index_documents(self, tenant: TenantIndex, docs: List[Document]):
+        self._write_embedded(tenant, docs, self.embed_documents(docs))
+
+    def _persist(self, tenant: TenantIndex):
+        with span("index.persist"):
+            tenant.vectorstore.persist()
+            if tenant.quantized_index is not None:
+                tenant.quantized_index.save()
+
+    def persist(self, tenant_id: str = DEFAULT_TENANT):
+        self._persist(self._tenant(tenant_id))
+
+    def add_documents(self,
+                      text: str,
+                      metadata: dict,
+                      tenant_id: str = DEFAULT_TENANT) -> int:
+        tenant = self._tenant(tenant_id)
         # Split text into chunks
         chunks = self.text_splitter.split_text(text)
         docs = [
-            Document(page_content=chunk, metadata=metadata) for chunk in chunks
+            Document(page_content=chunk,
+                     metadata={
+                         **metadata, "chunk_index": index
+                     }) for index, chunk in enumerate(chunks)
         ]
 
+        if not docs:
+            return 0
+
         # Index chunks in the vector store
-        self.vectorstore.add_documents(docs)
+        self._index_documents(tenant, docs)
         # Persist after adding documents
-        self.vectorstore.persist()
+        self._persist(tenant)
+        return len(docs)
+
+    def add_chunks(self,
+                   chunks: Iterable[str],
+                   metadata: dict,
+                   batch_size: int = INDEX_BATCH_SIZE,
+                   tenant_id: str = DEFAULT_TENANT) -> int:
+        """Index pre-split chunks as they are produced, in batches
 
-    def search(self, query_text: str, top_k=5) -> list[Document]:
-        # Embed query text
-        # embedding = self.embeddings.embed_query(query_text)
+        Chunks larger than the configured chunk size are re-split.
+        Returns the number of chunks indexed.
+        """
+        tenant = self._tenant(tenant_id)
+        batch = []
+        total = 0
+        chunk_index = 0
+        for chunk in chunks:
+            if self.text_splitter.count_tokens(
+                    chunk) > self.text_splitter.chunk_size:
+                pieces = self.text_splitter.split_text(chunk)
+            else:
+                pieces = [chunk]
+            for piece in pieces:
+                if piece.strip():
+                    batch.append(
+                        Document(page_content=piece,
+                                 metadata={
+                                     **metadata, "chunk_index": chunk_index
+                                 }))
+                    chunk_index += 1
+            if len(batch) >= batch_size:
+                self._index_documents(tenant, batch)
+                total += len(batch)
+                batch = []
+
+        if batch:
+            self._index_documents(tenant, batch)
+            total += len(batch)
+        self._persist(tenant)
+        return total
 
+    def search(self,
+               query_text: str,
+               top_k=5,
+               tenant_id: str = DEFAULT_TENANT) -> list[Document]:
         # Perform similarity search
-        results = self.vectorstore.similarity_search(query_text, k=top_k)
+        results = self.search_with_scores(query_text,
+                                          top_k=top_k,
+                                          tenant_id=tenant_id)
+
+        return self.get_unique_union(
+            [result.document for result in results])
+
+    def search_with_scores(
+            self,
+            query_text: str,
+            top_k: int = CONTEXT_CANDIDATES,
+            tenant_id: str = DEFAULT_TENANT,
+            search_ef: Optional[int] = None) -> List[ScoredChunk]:
+        """Similarity search returning scores and embeddings for each chunk
+
+        search_ef overrides the HNSW search breadth for this query: higher
+        finds more of the true nearest neighbours, lower answers faster.
+        """
+        tenant = self._tenant(tenant_id)
+        query_embedding = self.embeddings.embed_query(query_text)
+        start = time.perf_counter()
+        try:
+            with span("index.query", top_k=top_k,
+                      search_ef=search_ef) as current:
+                results = self._search_tenant(tenant, query_embedding, top_k,
+                                              search_ef)
+                current.set(results=len(results))
+                return results
+        finally:
+            stats = self._stats(tenant_id)
+            stats.searches += 1
+            stats.search_seconds += time.perf_counter() - start
+
+    def _hnsw_index(self, tenant: TenantIndex):
+        """The loaded hnswlib index and its creation parameters behind a
+        tenant's collection, or (None, None)
+
+        Chroma only reads search_ef when it loads an index, so overrides
+        are applied to the index directly.
+        """
+        try:
+            segment = self.client._server._manager.get_segment(
+                tenant.vectorstore._collection.id, VectorReader)
+            return segment._index, segment._params
+        except Exception as e:
+            logging.warning(f"HNSW index unavailable: {str(e)}")
+            return None, None
 
-        return self.get_unique_union(results)
+    @contextmanager
+    def _search_ef(self, tenant: TenantIndex, search_ef: Optional[int]):
+        """Run a query with the HNSW search ef set to search_ef, or to
+        HNSW_SEARCH_EF when configured
 
-    def get_all_documents(self) -> List[Document]:
+        Overrides are undone afterwards; a concurrent query on the same
+        tenant may run with the override meanwhile.
         """
-        Retrieves all documents from the vector store.
+        if not search_ef and not HNSW_SEARCH_EF:
+            yield
+            return
+        index, params = self._hnsw_index(tenant)
+        if index is None:
+            yield
+            return
+        baseline = HNSW_SEARCH_EF or params.search_ef
+        target = search_ef or baseline
+        if index.ef == target:
+            yield
+            return
+        with tenant.ef_lock:
+            index.set_ef(target)
+            try:
+                yield
+            finally:
+                if target != baseline:
+                    index.set_ef(baseline)
+
+    def _search_tenant(self,
+                       tenant: TenantIndex,
+                       query_embedding: List[float],
+                       top_k: int,
+                       search_ef: Optional[int] = None) -> List[ScoredChunk]:
+        if tenant.quantized_index is not None:
+            return self._search_quantized(tenant, query_embedding, top_k)
+        with self._search_ef(tenant, search_ef):
+            results = tenant.vectorstore._collection.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances", "embeddings"])
+
+        if not results or not results['ids'] or not results['ids'][0]:
+            return []
+
+        # Chroma returns squared L2 distances; OpenAI embeddings are unit
+        # length, so cosine similarity is 1 - d / 2
+        return [
+            ScoredChunk(document=Document(page_content=doc,
+                                          metadata=meta if meta else {}),
+                        score=1.0 - distance / 2,
+                        embedding=list(embedding))
+            for doc, meta, distance, embedding in zip(
+                results['documents'][0], results['metadatas'][0],
+                results['distances'][0], results['embeddings'][0])
+        ]
+
+    def _search_quantized(self, tenant: TenantIndex,
+                          query_embedding: List[float],
+                          top_k: int) -> List[ScoredChunk]:
+        """Shortlist with the quantized codes, rescore at full precision,
+        then fetch the chunks' text from Chroma"""
+        hits = tenant.quantized_index.search(query_embedding, top_k,
+                                             QUANTIZED_RESCORE_FACTOR)
+        if not hits:
+            return []
+        results = tenant.vectorstore._collection.get(
+            ids=[chunk_id for chunk_id, _, _ in hits],
+            include=["documents", "metadatas"])
+        chunks = {
+            chunk_id: (document, metadata)
+            for chunk_id, document, metadata in zip(
+                results['ids'], results['documents'], results['metadatas'])
+        }
+        return [
+            ScoredChunk(document=Document(page_content=chunks[chunk_id][0],
+                                          metadata=chunks[chunk_id][1] or {}),
+                        score=score,
+                        embedding=vector.tolist())
+            for chunk_id, score, vector in hits if chunk_id in chunks
+        ]
+
+    def get_all_documents(self,
+                          tenant_id: str = DEFAULT_TENANT) -> List[Document]:
+        """
+        Retrieves all of a tenant's documents from the vector store.
 
         Returns:
             List[Document]: List of unique documents with their content and metadata
@@ -58,7 +552,7 @@ class VectorStoreService:
         """
         try:
             # Get all documents from the collection
-            results = self.vectorstore._collection.get()
+            results = self._tenant(tenant_id).vectorstore._collection.get()
 
             if not results or not results['documents']:
                 return []
@@ -86,14 +580,286 @@ class VectorStoreService:
         # Return
         return [loads(doc) for doc in unique_docs]
 
-    def clear_data(self):
+    def clear_data(self, tenant_id: str = DEFAULT_TENANT):
+        """Delete one tenant's chunks; other tenants are untouched"""
         try:
-            # Use _collection.get() to get raw documents
-            results = self.vectorstore._collection.get()
-            if results and results['ids']:
-                # Delete documents using the ids from results
-                self.vectorstore._collection.delete(ids=results['ids'])
-                # Persist the changes
-                self.vectorstore.persist()
+            with self._write_lock:
+                self._drop_tenant(tenant_id)
         except Exception as e:
             raise Exception(f"Error clearing vector store: {str(e)}")
+
+    def _drop_tenant(self, tenant_id: str):
+        """Close a tenant and delete its collection and quantized index"""
+        name = collection_name(tenant_id)
+        with self._lock:
+            tenant = self._tenants.pop(tenant_id, None)
+        if name in self.list_collections():
+            self.client.delete_collection(name)
+        registry = get_ingest_registry()
+        if registry is not None:
+            registry.forget_tenant(tenant_id)
+        if tenant is not None and tenant.quantized_index is not None:
+            tenant.quantized_index.delete()
+        else:
+            QuantizedIndex.delete_files(quantized_index_path(tenant_id))
+
+    def export_snapshot(self,
+                        path: str,
+                        tenant_id: str = DEFAULT_TENANT,
+                        parent: Optional[str] = None) -> Dict:
+        """Write a tenant's chunks, vectors and index parameters to a
+        snapshot archive (see services.snapshot)
+
+        With parent (an earlier snapshot of the same tenant), only chunks
+        added and removed since are written. Writes wait until the export
+        is done, so the snapshot is consistent.
+        """
+        parent_manifest, parent_ids = None, []
+        if parent is not None:
+            with SnapshotReader(parent) as reader:
+                parent_manifest = reader.manifest
+                parent_ids = reader.ids()
+            if parent_manifest["tenant_id"] != tenant_id:
+                raise SnapshotError(
+                    f"Parent snapshot is of tenant "
+                    f"{parent_manifest['tenant_id']}, not {tenant_id}")
+
+        with self._write_lock:
+            tenant = self._tenant(tenant_id)
+            collection = tenant.vectorstore._collection
+            quantized = tenant.quantized_index
+            ids = collection.get(include=[])['ids']
+            known = set(parent_ids)
+            added = [chunk_id for chunk_id in ids if chunk_id not in known]
+            current = set(ids)
+            deleted = [
+                chunk_id for chunk_id in parent_ids
+                if chunk_id not in current
+            ]
+
+            writer = SnapshotWriter(path)
+            try:
+                for start in range(0, len(added), SNAPSHOT_BATCH_SIZE):
+                    page = collection.get(
+                        ids=added[start:start + SNAPSHOT_BATCH_SIZE],
+                        include=["documents", "metadatas"] +
+                        ([] if quantized else ["embeddings"]))
+                    writer.add_batch(
+                        VectorDocumentBatch(
+                            page['ids'],
+                            quantized.get_vectors(page['ids'])
+                            if quantized else np.asarray(page['embeddings'],
+                                                         dtype=np.float32),
+                            [meta or {} for meta in page['metadatas']]),
+                        page['documents'])
+                return writer.close(
+                    {
+                        "snapshot_id": new_snapshot_id(),
+                        "parent_id": parent_manifest["snapshot_id"]
+                        if parent_manifest else None,
+                        "parent_ids_sha256": parent_manifest["ids_sha256"]
+                        if parent_manifest else None,
+                        "created_at": time.time(),
+                        "tenant_id": tenant_id,
+                        "embedding_model": EMBEDDING_MODEL,
+                        "dimensions": EMBEDDING_DIMENSIONS
+                        or EMBEDDING_MODEL_DIMENSIONS,
+                        "index": {
+                            "backend": "chroma",
+                            "collection_metadata": collection.metadata,
+                            "quantization": quantized.method
+                            if quantized else "none",
+                        },
+                    }, ids, deleted)
+            except BaseException:
+                writer.abort()
+                raise
+
+    def import_snapshot(self,
+                        path: str,
+                        tenant_id: Optional[str] = None) -> Dict:
+        """Restore a snapshot without re-embedding; returns its manifest
+
+        A full snapshot replaces the tenant's chunks: it is imported into
+        a staging collection, checked, and only then swapped in, so a bad
+        archive leaves the tenant as it was. An incremental one is applied
+        on top and requires the tenant to be exactly at its parent
+        snapshot; the ids it will leave are checked before it is applied.
+        """
+        with SnapshotReader(path) as reader:
+            manifest = reader.manifest
+            tenant_id = tenant_id or manifest["tenant_id"]
+            dimensions = EMBEDDING_DIMENSIONS or EMBEDDING_MODEL_DIMENSIONS
+            if manifest["embedding_model"] != EMBEDDING_MODEL or \
+                    manifest["dimensions"] != dimensions:
+                raise SnapshotError(
+                    f"Snapshot holds {manifest['embedding_model']} vectors "
+                    f"of {manifest['dimensions']} dimensions; this store "
+                    f"uses {EMBEDDING_MODEL} with {dimensions}")
+            reader.verify()
+            if ids_digest(reader.ids()) != manifest["ids_sha256"]:
+                raise SnapshotError(
+                    f"{path} does not match its manifest's id checksum")
+
+            with self._write_lock:
+                if manifest["parent_id"] is None:
+                    self._check_import(reader, [])
+                    self._swap_in(tenant_id, self._import_staged(reader))
+                    return manifest
+
+                tenant = self._tenant(tenant_id)
+                collection = tenant.vectorstore._collection
+                current = collection.get(include=[])['ids']
+                if ids_digest(current) != manifest["parent_ids_sha256"]:
+                    raise SnapshotError(
+                        f"Tenant {tenant_id} is not at parent snapshot "
+                        f"{manifest['parent_id']}")
+                self._check_import(reader, current)
+                deleted = reader.deleted()
+                for start in range(0, len(deleted), SNAPSHOT_BATCH_SIZE):
+                    collection.delete(ids=deleted[start:start +
+                                                  SNAPSHOT_BATCH_SIZE])
+                if deleted and tenant.quantized_index is not None:
+                    tenant.quantized_index.remove(deleted)
+                self._import_batches(tenant, reader)
+
+                ids = collection.get(include=[])['ids']
+                if ids_digest(ids) != manifest["ids_sha256"]:
+                    raise SnapshotError(
+                        f"Tenant {tenant_id} does not match snapshot "
+                        f"{manifest['snapshot_id']} after import")
+        return manifest
+
+    @staticmethod
+    def _check_import(reader: SnapshotReader, current: List[str]):
+        """Raise unless applying the archive to current yields its ids"""
+        expected = (set(current) - set(reader.deleted())) | set(
+            reader.added_ids())
+        if ids_digest(list(expected)) != reader.manifest["ids_sha256"]:
+            raise SnapshotError(
+                f"Snapshot {reader.manifest['snapshot_id']} would not "
+                f"leave the ids it records")
+
+    def _import_batches(self, tenant: TenantIndex, reader: SnapshotReader):
+        for batch, documents in reader.iter_batches():
+            # Chroma caps the size of a single write
+            for start in range(0, len(batch), SNAPSHOT_BATCH_SIZE):
+                end = start + SNAPSHOT_BATCH_SIZE
+                self._upsert(tenant, batch.ids[start:end],
+                             batch.matrix[start:end], documents[start:end], [
+                                 meta or None
+                                 for meta in batch.metadatas[start:end]
+                             ])
+        self._persist(tenant)
+
+    def _import_staged(self, reader: SnapshotReader) -> TenantIndex:
+        """Import a full snapshot into a new collection of its own
+
+        Its name cannot clash with a tenant's (those start with
+        "tenant-"). The collection is deleted again if the import fails.
+        """
+        manifest = reader.manifest
+        name = f"staging-{uuid.uuid4().hex[:12]}"
+        # Recreated with the exported index parameters, in this store's
+        # quantization
+        vectorstore = Chroma(client=self.client,
+                             collection_name=name,
+                             embedding_function=self.embeddings,
+                             persist_directory=CHROMA_PERSIST_DIRECTORY,
+                             collection_metadata=new_collection_metadata(
+                                 manifest["index"]["collection_metadata"]))
+        staging = TenantIndex(
+            manifest["tenant_id"], vectorstore,
+            self._open_quantized_index(
+                manifest["tenant_id"], vectorstore,
+                os.path.join(CHROMA_PERSIST_DIRECTORY,
+                             f"{name}.{QUANTIZED_INDEX_FILE}")))
+        try:
+            self._import_batches(staging, reader)
+            ids = vectorstore._collection.get(include=[])['ids']
+            if ids_digest(ids) != manifest["ids_sha256"]:
+                raise SnapshotError(
+                    f"Staged import of snapshot {manifest['snapshot_id']} "
+                    f"does not match it")
+        except BaseException:
+            self.client.delete_collection(name)
+            if staging.quantized_index is not None:
+                staging.quantized_index.delete()
+            raise
+        return staging
+
+    def _swap_in(self, tenant_id: str, staging: TenantIndex):
+        """Replace a tenant's collection and index with staged ones"""
+        name = collection_name(tenant_id)
+        staging_name = staging.vectorstore._collection.name
+        if staging.quantized_index is not None:
+            staging.quantized_index.close()
+        self._drop_tenant(tenant_id)
+        self.client.get_collection(staging_name).modify(name=name)
+        if staging.quantized_index is not None:
+            QuantizedIndex.move_files(staging.quantized_index.path,
+                                      quantized_index_path(tenant_id))
+
+    def sample_embeddings(self,
+                          tenant_id: str = DEFAULT_TENANT,
+                          limit: int = 50000,
+                          seed: int = 0) -> np.ndarray:
+        """Up to limit stored vectors chosen at random, for calibration"""
+        tenant = self._tenant(tenant_id)
+        if tenant.quantized_index is not None:
+            return tenant.quantized_index.sample(limit, seed)
+        collection = tenant.vectorstore._collection
+        ids = collection.get(include=[])['ids']
+        if len(ids) > limit:
+            ids = random.Random(seed).sample(ids, limit)
+        pages = []
+        for start in range(0, len(ids), SNAPSHOT_BATCH_SIZE):
+            page = collection.get(ids=ids[start:start + SNAPSHOT_BATCH_SIZE],
+                                  include=["embeddings"])
+            pages.append(np.asarray(page['embeddings'], dtype=np.float32))
+        if not pages:
+            return np.empty((0, EMBEDDING_DIMENSIONS
+                             or EMBEDDING_MODEL_DIMENSIONS),
+                            dtype=np.float32)
+        return np.concatenate(pages)
+
+    def list_collections(self) -> List[str]:
+        # Chroma 0.5 returns Collection objects, later versions names
+        return [
+            getattr(collection, "name", collection)
+            for collection in self.client.list_collections()
+        ]
+
+    def list_tenants(self) -> List[str]:
+        tenants = []
+        for name in self.list_collections():
+            if name == DEFAULT_COLLECTION:
+                tenants.append(DEFAULT_TENANT)
+            elif name.startswith("tenant-"):
+                tenants.append(name[len("tenant-"):])
+        return sorted(tenants)
+
+    def tenant_stats(self, tenant_id: str = DEFAULT_TENANT) -> Dict:
+        """Chunk count, quota, load and search statistics for a tenant"""
+        name = collection_name(tenant_id)
+        chunks = self.client.get_collection(name).count() \
+            if name in self.list_collections() else 0
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            stats = self._stats(tenant_id)
+        quantized = tenant.quantized_index if tenant is not None else None
+        return {
+            "tenant_id": tenant_id,
+            "chunks": chunks,
+            "quota": TENANT_MAX_CHUNKS or None,
+            "loaded": tenant is not None,
+            "loads": stats.loads,
+            "chunks_added": stats.chunks_added,
+            "searches": stats.searches,
+            "avg_search_ms": round(
+                stats.search_seconds / stats.searches * 1000, 2)
+            if stats.searches else 0.0,
+            "quantized_index_bytes":
+            quantized.memory_bytes if quantized is not None else 0,
+            "last_used": stats.last_used or None,
+        }
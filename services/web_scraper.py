@@ -1,34 +1,49 @@
 import requests
-from bs4 import BeautifulSoup
-from typing import Dict, Optional, List, Set
+from typing import Dict, Iterable, Optional, List, Set
 import re
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 import logging
 from datetime import datetime
-from queue import Queue
 import time
-
-def crawl_website(start_url: str, vector_store=None, llm_service=None) -> List[Dict]:
-    scraper = WebScraperService()
-    return scraper.crawl_website(start_url, vector_store, llm_service)
+from services.html_extraction import ExtractedPage, PAGE_REMOVED_TAGS, parse_html
+from services.crawl_frontier import (RobotsPolicy, canonicalize_url,
+                                     default_sitemap_url,
+                                     iter_sitemap_entries)
+from services.crawl_state import (BloomFilter, CrawlStateStore,
+                                  PersistentCrawlFrontier)
+from services.ingest_pipeline import IngestPipeline
+from services.tracing import Span, span
+from utils.constants import (CRAWL_CHECKPOINT_INTERVAL, CRAWL_MAX_PAGES,
+                             DEFAULT_TENANT)
+
+def crawl_website(start_url: str, vector_store=None, llm_service=None, crawl_id: Optional[str] = None, tenant_id: str = DEFAULT_TENANT, max_pages: int = CRAWL_MAX_PAGES) -> List[Dict]:
+    scraper = WebScraperService(max_pages=max_pages)
+    return scraper.crawl_website(start_url, vector_store, llm_service, crawl_id, tenant_id)
 
 
 class WebScraperService:
 
-    def __init__(self, max_pages: int = 100, rate_limit: float = 1.0):
+    def __init__(self,
+                 max_pages: int = CRAWL_MAX_PAGES,
+                 rate_limit: float = 1.0,
+                 use_sitemaps: bool = True,
+                 state_store: Optional[CrawlStateStore] = None):
         self.headers = {
             'User-Agent':
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.max_pages = max_pages
         self.rate_limit = rate_limit
-        self.visited_urls: Set[str] = set()
+        self.use_sitemaps = use_sitemaps
+        self.state_store = state_store
+        self.crawl_id = None
         self.domain = None
 
     def _validate_url(self, url: str) -> bool:
         """Validate if the URL is properly formatted"""
         try:
             result = urlparse(url)
+            result.port  # raises ValueError for a malformed port
             return all([result.scheme, result.netloc])
         except Exception:
             return False
@@ -41,40 +56,26 @@ class WebScraperService:
         text = re.sub(r'[^\w\s.,!?-]', '', text)
         return text.strip()
 
-    def _extract_metadata(self, soup: BeautifulSoup, url: str) -> Dict:
-        """Extract metadata from the webpage"""
-        metadata = {
+    def _extract_metadata(self, page: ExtractedPage, url: str) -> Dict:
+        """Build metadata for a parsed webpage"""
+        return {
             'url': url,
-            'title': '',
-            'description': '',
+            'title': page.title,
+            'description': page.description,
             'scraped_at': datetime.now().isoformat()
         }
 
-        # Extract title
-        title_tag = soup.find('title')
-        if title_tag:
-            metadata['title'] = title_tag.text.strip()
-
-        # Extract meta description
-        description_tag = soup.find('meta', attrs={'name': 'description'}) or \
-                         soup.find('meta', attrs={'property': 'og:description'})
-        if description_tag:
-            metadata['description'] = description_tag.get('content',
-                                                          '').strip()
-
-        return metadata
-
-    def _extract_links(self, soup: BeautifulSoup, base_url: str) -> Set[str]:
-        """Extract all valid links from the page"""
+    def _extract_links(self, hrefs: Iterable[str]) -> Set[str]:
+        """Filter absolute page links down to crawlable URLs"""
         links = set()
-        for anchor in soup.find_all('a', href=True):
-            href = anchor['href']
-            absolute_url = urljoin(base_url, href)
-
+        for href in hrefs:
             # Skip if not valid URL
-            if not self._validate_url(absolute_url):
+            if not self._validate_url(href):
                 continue
 
+            # Fragments, tracking parameters etc. are normalized away
+            absolute_url = canonicalize_url(href)
+
             # Skip if different domain
             if urlparse(absolute_url).netloc != self.domain:
                 continue
@@ -99,115 +100,202 @@ class WebScraperService:
             raise ValueError(f"Invalid URL format: {url}")
 
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            with span("fetch", url=url) as current:
+                response = requests.get(url, headers=self.headers, timeout=10)
+                current.set(status=response.status_code,
+                            bytes=len(response.content))
             response.raise_for_status()
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'footer',
-                                 'iframe']):
-                element.decompose()
-
-            # Extract main content
-            content = []
-
-            # Try to find main content area
-            main_content = soup.find('main') or soup.find(
-                'article') or soup.find(
-                    'div', class_=re.compile(r'content|main|article'))
-
-            if main_content:
-                paragraphs = main_content.find_all(
-                    ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-            else:
-                paragraphs = soup.find_all(
-                    ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+            # Single parse and walk yields content, links and metadata
+            with span("parse"):
+                page = parse_html(response.text,
+                                  base_url=url,
+                                  remove_tags=PAGE_REMOVED_TAGS,
+                                  collect_text=False)
 
-            for p in paragraphs:
-                text = p.get_text()
-                if len(text.split()) > 3:  # Only include if more than 3 words
-                    content.append(self._clean_text(text))
+            content = [
+                self._clean_text(text) for text in page.blocks
+                if len(text.split()) > 3  # Only include if more than 3 words
+            ]
 
             if not content:
                 return None
 
-            # Extract links for crawling
-            links = self._extract_links(soup, url)
-
             return {
                 'text': '\n\n'.join(content),
-                'metadata': self._extract_metadata(soup, url),
-                'links': links
+                'metadata': self._extract_metadata(page, url),
+                'links': self._extract_links(page.links)
             }
 
         except requests.RequestException as e:
             logging.error(f"Error scraping URL {url}: {str(e)}")
             return None
 
-    def crawl_website(self, start_url: str, vector_store=None, llm_service=None) -> List[Dict]:
+    def _seed_from_sitemaps(self, frontier: PersistentCrawlFrontier, robots: RobotsPolicy,
+                            start_url: str):
+        """Enqueue same-domain sitemap pages, scored by priority and lastmod"""
+        sitemap_urls = robots.sitemaps or [default_sitemap_url(start_url)]
+        seeded = 0
+        for entry in iter_sitemap_entries(sitemap_urls, self.headers):
+            if not self._validate_url(entry.url) or \
+                    urlparse(canonicalize_url(entry.url)).netloc != self.domain:
+                continue
+            if frontier.push(entry.url,
+                             depth=1,
+                             priority=entry.priority,
+                             lastmod=entry.lastmod):
+                seeded += 1
+        logging.info(f"Seeded {seeded} URLs from sitemaps")
+
+    def _index_page(self, result: Dict, pipeline: IngestPipeline,
+                    tenant_id: str):
+        # Chunked, embedded and written in the background while crawling
+        # continues; a tenant out of quota stops the crawl
+        pipeline.raise_for_quota()
+        pipeline.submit_text(result['metadata']['url'],
+                             result['text'],
+                             metadata={
+                                 "filename": result['metadata']['url'],
+                                 "file_type": "web",
+                                 "title": result['metadata']['title'],
+                                 "description":
+                                 result['metadata']['description'],
+                                 "created_at": time.time(),
+                                 "tenant_id": tenant_id
+                             },
+                             tenant_id=tenant_id)
+
+    def crawl_website(self, start_url: str, vector_store=None, llm_service=None, crawl_id: Optional[str] = None, tenant_id: str = DEFAULT_TENANT) -> List[Dict]:
         """
-        Recursively crawl a website starting from the given URL
-        Adds each page to vector store as it's crawled
-        Returns a list of scraped content from all crawled pages
+        Crawl a website starting from the given URL and its sitemaps
+        Honours robots.txt rules and crawl-delay, and visits each canonical
+        URL at most once, best-scored first
+        Progress is checkpointed to SQLite; pass crawl_id to resume a crawl
+        Each run (new or resumed) fetches at most max_pages pages
+        When a vector store is given each page is indexed as it's crawled
+        and only page metadata is returned, so memory stays bounded;
+        otherwise returns the scraped content of all crawled pages
         """
-        if not self._validate_url(start_url):
-            raise ValueError(f"Invalid start URL: {start_url}")
-
-        # Set domain for the crawl
-        self.domain = urlparse(start_url).netloc
+        with span("crawl", tenant_id=tenant_id) as current:
+            results = self._run_crawl(start_url, vector_store, llm_service,
+                                      crawl_id, tenant_id, current)
+            current.set(crawl_id=self.crawl_id, pages=len(results))
+            return results
+
+    def _run_crawl(self, start_url: str, vector_store, llm_service,
+                   crawl_id: Optional[str], tenant_id: str,
+                   current: Span) -> List[Dict]:
+        if self.state_store is None:
+            self.state_store = CrawlStateStore()
+
+        if crawl_id is not None:
+            state = self.state_store.get_crawl(crawl_id)
+            if state is None:
+                raise ValueError(f"Unknown crawl ID: {crawl_id}")
+            start_url = state['start_url']
+            self.domain = state['domain']
+            pages_crawled = state['pages_crawled']
+            seen = BloomFilter.from_bytes(
+                state['seen_filter']) if state['seen_filter'] else None
+            self.state_store.release_claims(crawl_id)
+            frontier = PersistentCrawlFrontier(self.state_store, crawl_id,
+                                               seen)
+            logging.info(f"Resuming crawl {crawl_id} at {pages_crawled} "
+                         f"pages with {len(frontier)} queued")
+        else:
+            if not self._validate_url(start_url):
+                raise ValueError(f"Invalid start URL: {start_url}")
+
+            # Set domain for the crawl
+            start_url = canonicalize_url(start_url)
+            self.domain = urlparse(start_url).netloc
+            crawl_id = self.state_store.create_crawl(start_url, self.domain)
+            pages_crawled = 0
+            frontier = PersistentCrawlFrontier(self.state_store, crawl_id)
+            frontier.push(start_url, depth=0, priority=1.0)
+
+        self.crawl_id = crawl_id
+        current.set(crawl_id=crawl_id, start_url=start_url)
+        robots = RobotsPolicy.fetch(start_url, self.headers)
+        delay = max(self.rate_limit, robots.crawl_delay)
+
+        if pages_crawled == 0 and self.use_sitemaps:
+            self._seed_from_sitemaps(frontier, robots, start_url)
+        self.state_store.checkpoint(crawl_id, pages_crawled, frontier.seen)
+
+        pipeline = IngestPipeline(
+            vector_store, llm_service) if vector_store is not None else None
+        try:
+            results = self._crawl(frontier, robots, delay, crawl_id,
+                                  pages_crawled, pipeline, tenant_id)
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+        if pipeline is not None:
+            pipeline.raise_for_quota()
+        return results
 
-        # Initialize crawling queue and results
-        url_queue = Queue()
-        url_queue.put(start_url)
+    def _crawl(self, frontier: PersistentCrawlFrontier, robots: RobotsPolicy,
+               delay: float, crawl_id: str, pages_crawled: int,
+               pipeline: Optional[IngestPipeline],
+               tenant_id: str) -> List[Dict]:
         results = []
-        pages_crawled = 0
-
-        while not url_queue.empty() and pages_crawled < self.max_pages:
-            current_url = url_queue.get()
-
-            # Skip if already visited
-            if current_url in self.visited_urls:
+        last_checkpoint = pages_crawled
+        # The budget is per run, so a crawl paused at it can be resumed
+        run_limit = pages_crawled + self.max_pages
+        while frontier and pages_crawled < run_limit:
+            current_url, depth = frontier.pop()
+
+            if not robots.can_fetch(current_url):
+                logging.info(f"Disallowed by robots.txt: {current_url}")
                 continue
 
-            # Mark as visited
-            self.visited_urls.add(current_url)
-
             # Scrape the page
             logging.info(f"Crawling: {current_url}")
-            result = self.scrape_url(current_url)
-
-            if result:
-                # Add to vector store immediately if provided
-                if vector_store is not None and result['text']:
-                    try:
-                        vector_store.add_documents(
-                            text=result['text'],
-                            metadata={
-                                "filename": result['metadata']['url'],
-                                "file_type": "web",
-                                "title": result['metadata']['title'],
-                                "description": result['metadata']['description'],
-                                "created_at": time.time()
-                            }
-                        )
-                        logging.info(f"Added to vector store: {result['metadata']['url']}")
-                    except Exception as e:
-                        logging.error(f"Error adding to vector store: {str(e)}")
-
-                results.append(result)
-                pages_crawled += 1
-
-                # Add new links to queue
-                for link in result['links']:
-                    if link not in self.visited_urls:
-                        url_queue.put(link)
-
-            # Respect rate limiting
-            time.sleep(self.rate_limit)
+            # A trace per page, so a long crawl does not fill the span
+            # buffer with one trace; crawl_id links them
+            with span("crawl.page",
+                      parent=None,
+                      crawl_id=crawl_id,
+                      url=current_url,
+                      depth=depth):
+                result = self.scrape_url(current_url)
+
+                if result:
+                    pages_crawled += 1
+
+                    # Add new links to the frontier (duplicates are ignored)
+                    for link in result['links']:
+                        frontier.push(link, depth + 1)
+
+                    # Stream pages to the vector store instead of keeping
+                    # them
+                    if pipeline is not None:
+                        if result['text']:
+                            self._index_page(result, pipeline, tenant_id)
+                        results.append(result['metadata'])
+                    else:
+                        results.append(result)
+
+            if pages_crawled - last_checkpoint >= CRAWL_CHECKPOINT_INTERVAL:
+                # Only checkpoint pages that are in the vector store, so a
+                # resumed crawl does not skip pages still in flight
+                if pipeline is not None:
+                    pipeline.wait()
+                self.state_store.checkpoint(crawl_id, pages_crawled,
+                                            frontier.seen)
+                last_checkpoint = pages_crawled
+
+            # Respect rate limiting and the site's crawl-delay
+            time.sleep(delay)
 
             logging.info(f"Pages crawled: {pages_crawled}")
 
+        if pipeline is not None:
+            pipeline.wait()
+        self.state_store.checkpoint(
+            crawl_id, pages_crawled, frontier.seen,
+            status='completed' if not frontier else 'paused')
         return results
 
     def scrape_multiple_urls(self, urls: List[str]) -> List[Dict]:
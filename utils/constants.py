@@ -1,17 +1,114 @@
+import os
+
 ALLOWED_EXTENSIONS = {
     'pdf', 'docx', 'jpg', 'jpeg', 'png',
     'json', 'xml', 'csv', 'zip', 'md',
     'txt', 'html', 'htm', 'rtf'
 }
 
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# API uploads (POST /ingest/file) are streamed to disk, so they can be large
+MAX_FILE_SIZE_MB = int(os.environ.get('MAX_FILE_SIZE_MB', '2048'))
+MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
+# The Streamlit uploader holds a whole file in memory, so it keeps
+# Streamlit's default limit; Streamlit reads the same variable
+UI_MAX_UPLOAD_MB = int(os.environ.get('STREAMLIT_SERVER_MAX_UPLOAD_SIZE',
+                                      '200'))
+
+# Large files: uploads above this size are spilled to a temporary file and
+# parsed from disk (PDFs by path, text formats memory-mapped and decoded a
+# block at a time)
+SPOOL_THRESHOLD_BYTES = 16 * 1024 * 1024
+SPOOL_DIRECTORY = os.environ.get('SPOOL_DIRECTORY') or None  # system default
+TEXT_BLOCK_SIZE = 4 * 1024 * 1024  # bytes decoded and chunked at a time
+
+# Chunking (sizes are in tokens of CHUNK_ENCODING, the embedding model's encoding)
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 50
+CHUNK_ENCODING = 'cl100k_base'
+PARALLEL_CHUNK_THRESHOLD = 1024 * 1024  # characters; smaller texts split in-process
+PARALLEL_CHUNK_SEGMENT_SIZE = 256 * 1024  # characters handed to each worker
+CHUNK_WORKERS = os.cpu_count() or 1
+INDEX_BATCH_SIZE = 256  # chunks per vector store write when streaming
+
+# Ingest pipeline (extract/chunk in CHUNK_WORKERS processes, then embed and
+# persist in threads); stages hand over through queues of this many items
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '8'))
+PIPELINE_EMBED_WORKERS = int(os.environ.get('PIPELINE_EMBED_WORKERS', '4'))
+# Smaller files are extracted in the stage thread: cheaper than shipping
+# them to a worker process
+PIPELINE_INLINE_EXTRACT_BYTES = 256 * 1024
+
+# Vector store: 'chroma' (local directory) or 'pgvector' (a chunks table in
+# the PGDATABASE that app nodes can share)
+VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'chroma')
+CHROMA_PERSIST_DIRECTORY = os.environ.get('CHROMA_PERSIST_DIRECTORY',
+                                          './chroma_store')
+# Memory for loaded Chroma indexes; least recently used ones are unloaded
+# beyond it, so memory is bounded by the active tenants rather than all of
+# them (0 = keep every loaded index in memory)
+CHROMA_SEGMENT_CACHE_BYTES = int(
+    os.environ.get('CHROMA_SEGMENT_CACHE_BYTES', str(1024 * 1024 * 1024)))
+
+# HNSW index parameters (0 = the backend's default: M 16, construction ef
+# 100 (pgvector 64), search ef 10 (pgvector 40)). M and construction ef
+# apply to indexes created afterwards, search ef to every query.
+# benchmarks/ann_calibration.py measures recall and latency to pick them.
+HNSW_M = int(os.environ.get('HNSW_M', '0'))
+HNSW_CONSTRUCTION_EF = int(os.environ.get('HNSW_CONSTRUCTION_EF', '0'))
+HNSW_SEARCH_EF = int(os.environ.get('HNSW_SEARCH_EF', '0'))
+
+# Tenants (one Chroma collection each)
+DEFAULT_TENANT = 'default'  # stored in the original 'langchain' collection
+TENANT_CACHE_SIZE = int(os.environ.get('TENANT_CACHE_SIZE', '32'))  # open tenant collections
+TENANT_MAX_CHUNKS = int(os.environ.get('TENANT_MAX_CHUNKS', '0'))  # 0 = unlimited
+
+# Embedding storage precision
+EMBEDDING_MODEL = 'text-embedding-3-small'
+# Reduced output dimensions (0 = model default, 1536). Changing it requires
+# clearing the vector store, since a collection has a single dimension.
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '0'))
+EMBEDDING_MODEL_DIMENSIONS = 1536
+# 'none', 'int8' (4x smaller) or 'binary' (32x smaller) vectors in memory.
+# Quantized collections keep only codes in memory and float32 vectors in a
+# memory-mapped file for rescoring; applies to collections created afterwards
+EMBEDDING_QUANTIZATION = os.environ.get('EMBEDDING_QUANTIZATION', 'none')
+QUANTIZED_RESCORE_FACTOR = 4  # candidates per result rescored at full precision
+QUANTIZED_INDEX_FILE = 'quantized_index.npz'  # inside the Chroma directory
+
+# Vector store snapshots: chunks per archive part and per import write
+SNAPSHOT_BATCH_SIZE = 4096
+
+# Context packing for answers
+CONTEXT_CANDIDATES = 20  # chunks retrieved before selection
+CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_MMR_LAMBDA = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+
+# Cross-encoder reranking for queries routed to it (services.reranker).
+# Needs onnxruntime and tokenizers, and an exported model directory with
+# model.onnx and tokenizer.json; unset = no reranking.
+RERANKER_MODEL_DIR = os.environ.get('RERANKER_MODEL_DIR', '')
+RERANK_CANDIDATES = int(os.environ.get('RERANK_CANDIDATES', '50'))  # chunks retrieved for reranking
+RERANK_TOP_N = int(os.environ.get('RERANK_TOP_N', '8'))  # chunks kept for the context
+RERANKER_BATCH_SIZE = 16  # query/chunk pairs per model call
+RERANKER_MAX_LENGTH = 512  # tokens per query/chunk pair
+RERANKER_THREADS = int(os.environ.get('RERANKER_THREADS', '0'))  # 0 = ONNX Runtime default
+RERANKER_CACHE_SIZE = 10000  # cached (query, chunk) scores
+# Candidates still unscored after this keep their retrieval order (0 = no limit)
+RERANKER_LATENCY_BUDGET_MS = int(os.environ.get('RERANKER_LATENCY_BUDGET_MS', '300'))
 
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+# Document summaries (map-reduce at ingest)
+SUMMARY_CHUNK_TOKENS = 3000  # input tokens per map/reduce call
+SUMMARY_MAX_INPUT_TOKENS = 200000  # larger documents are sampled evenly
+SUMMARY_MAX_WORKERS = 8
+
+# CSV ingestion
+CSV_READ_CHUNKSIZE = 10000  # rows read from disk at a time
+CSV_ROWS_PER_CHUNK = 25  # rows per emitted chunk (header is repeated)
+CSV_TYPE_COLUMNS = True  # annotate the header with inferred column types
 
 ERROR_MESSAGES = {
     'file_type': 'Unsupported file type. Please upload a supported file.',
-    'file_size': 'File too large. Maximum size is 10MB.',
+    'file_size': f'File too large. Maximum size is {MAX_FILE_SIZE_MB}MB.',
     'processing': 'Error processing file. Please try again.',
     'url_invalid': 'Invalid URL format.',
     'url_unreachable': 'Unable to access the URL.',
@@ -22,3 +119,76 @@ ERROR_MESSAGES = {
 MAX_URLS_PER_BATCH = 10
 REQUEST_TIMEOUT = 10  # seconds
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# LLM call metrics
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))  # 0 disables /metrics
+METRICS_EXPORT_PATH = os.environ.get('METRICS_EXPORT_PATH', '')
+METRICS_EXPORT_INTERVAL = 15  # seconds between file exports
+METRICS_SAMPLE_WINDOW = 1000  # recent samples kept for percentiles
+
+# OpenAI rate governor (shared by all LLM and embedding calls in a process)
+OPENAI_RPM_LIMIT = int(os.environ.get('OPENAI_RPM_LIMIT', '500'))
+OPENAI_TPM_LIMIT = int(os.environ.get('OPENAI_TPM_LIMIT', '200000'))
+OPENAI_MAX_CONCURRENCY = 16
+OPENAI_MAX_RETRIES = 6
+OPENAI_BACKOFF_BASE = 0.5  # seconds, doubled per retry and jittered
+OPENAI_BACKOFF_MAX = 60.0
+# Rough token cost of a high-detail image when budgeting vision calls
+IMAGE_TOKEN_ESTIMATE = 1000
+# Output tokens reserved per chat call when budgeting
+COMPLETION_TOKEN_ESTIMATE = 512
+
+# USD per million tokens (input, output)
+MODEL_PRICING = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'text-embedding-3-small': (0.02, 0.0),
+}
+
+# Crawl frontier
+# Pages fetched per crawl run; a resumed crawl gets a fresh budget
+CRAWL_MAX_PAGES = int(os.environ.get('CRAWL_MAX_PAGES', '100'))
+CRAWL_DEPTH_WEIGHT = 1.0  # score added per link hop from the start page
+SITEMAP_PRIORITY_WEIGHT = 1.0  # score removed per unit of sitemap <priority>
+SITEMAP_RECENCY_WEIGHT = 0.5  # bonus for recently modified sitemap entries
+SITEMAP_MAX_URLS = 10000
+SITEMAP_MAX_FILES = 20  # sitemap and sitemap index files fetched per crawl
+TRACKING_PARAMS = {'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga',
+                   'ref', 'ref_src'}
+
+# Crawl checkpoints
+CRAWL_STATE_PATH = os.environ.get('CRAWL_STATE_PATH', './crawl_state.db')
+CRAWL_CHECKPOINT_INTERVAL = 10  # pages between checkpoints
+CRAWL_BLOOM_CAPACITY = 1000000  # URLs per crawl before the error rate rises
+CRAWL_BLOOM_ERROR_RATE = 0.001
+
+# API service background ingest jobs
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', './jobs.db')
+INGEST_JOB_WORKERS = int(os.environ.get('INGEST_JOB_WORKERS', '2'))  # per API worker process
+
+# Tracing (services.tracing): finished spans are kept in memory for the
+# Diagnostics tab, and with TRACE_FILE set also appended to it as JSON
+# lines by a background thread. '{pid}' in the path is replaced by the
+# process ID, which gives each API worker process a file of its own.
+TRACE_FILE = os.environ.get('TRACE_FILE', '')  # e.g. ./traces-{pid}.jsonl
+TRACE_FILE_MAX_BYTES = 64 * 1024 * 1024  # then rotated to TRACE_FILE.1
+TRACE_BUFFER_SPANS = 10000  # recent spans kept in memory
+TRACE_QUEUE_SPANS = 10000  # spans awaiting export; more are dropped
+# Sampling profiler: traces slower than this write a collapsed-stack
+# flamegraph to TRACE_PROFILE_DIR (0 = profiler off)
+TRACE_PROFILE_SLOW_MS = int(os.environ.get('TRACE_PROFILE_SLOW_MS', '0'))
+TRACE_PROFILE_INTERVAL_MS = 10
+TRACE_PROFILE_DIR = os.environ.get('TRACE_PROFILE_DIR', './profiles')
+
+# Ingest idempotency: a file whose contents a tenant has already indexed is
+# not extracted or embedded again. Clearing the tenant resets its entries.
+INGEST_DEDUPLICATION = os.environ.get('INGEST_DEDUPLICATION',
+                                      'true').lower() == 'true'
+# SQLite registry for the Chroma backend; pgvector keeps it in PostgreSQL
+INGEST_REGISTRY_PATH = os.environ.get('INGEST_REGISTRY_PATH', './ingested.db')
+
+# Async PostgreSQL pool (API service)
+PG_POOL_MIN_SIZE = int(os.environ.get('PG_POOL_MIN_SIZE', '1'))
+PG_POOL_MAX_SIZE = int(os.environ.get('PG_POOL_MAX_SIZE', '10'))
+# Server-side prepared statements; disable behind transaction-mode PgBouncer
+PG_PREPARE_STATEMENTS = os.environ.get('PG_PREPARE_STATEMENTS',
+                                       'true').lower() == 'true'
@@ -1,5 +1,5 @@
 from typing import BinaryIO
-from utils.constants import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+from utils.constants import ALLOWED_EXTENSIONS, ERROR_MESSAGES, MAX_FILE_SIZE
 from urllib.parse import urlparse
 import re
 
@@ -14,10 +14,17 @@ def validate_file(file: BinaryIO) -> tuple[bool, str]:
     file.seek(0)  # Reset file pointer
     
     if size > MAX_FILE_SIZE:
-        return False, "File too large"
+        return False, ERROR_MESSAGES['file_size']
 
     return True, ""
 
+def validate_tenant_id(tenant_id: str) -> tuple[bool, str]:
+    # Tenant IDs become part of Chroma collection names
+    if not re.fullmatch(r'[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?',
+                        tenant_id or ''):
+        return False, "Tenant ID must be 1-48 letters, digits, '-' or '_'"
+    return True, ""
+
 def validate_query(query: str) -> tuple[bool, str]:
     if not query.strip():
         return False, "Query cannot be empty"